@@ -26,9 +26,14 @@ import certifi
 from pymongo import MongoClient
 from extensions import mongo, login_manager, flask_session
 from blueprints.auth import auth_bp
-from translations import trans
+from translations import trans, flush_missing, available_languages, preload_translations
 from scheduler_setup import init_scheduler
-from models import create_user, get_user_by_email
+from usage_sink import init_usage_sink
+from db_indexes import reconcile_indexes, SESSION_INDEX_MANIFEST
+from migrations import migrate_user_ids, migrate_financial_health_assessments
+from tool_usage_store import ensure_tool_usage_collection
+from cli import register_cli
+from models import create_user, get_user_by_email, create_courses_many
 import json
 from functools import wraps
 from werkzeug.security import generate_password_hash
@@ -40,6 +45,7 @@ from itsdangerous import URLSafeTimedSerializer
 import smtplib
 from email.mime.text import MIMEText
 from session_utils import create_anonymous_session
+from session_policy import install_session_policy, is_sessionless_request
 
 # Load environment variables
 load_dotenv()
@@ -210,57 +216,22 @@ def initialize_database(app):
             logger.error(f"MongoDB client is closed before database operations: {str(e)}")
             raise RuntimeError("MongoDB client is closed")
         logger.info(f"MongoDB database: {db.name}")
-        existing_indexes = db.users.index_information()
-        if 'email_1' not in existing_indexes:
-            db.users.create_index('email', unique=True)
-        if 'referral_code_1' not in existing_indexes:
-            db.users.create_index('referral_code', unique=True)
-        existing_indexes = db.courses.index_information()
-        if 'id_1' not in existing_indexes:
-            db.courses.create_index('id', unique=True)
-        existing_indexes = db.content_metadata.index_information()
-        if 'course_id_1_lesson_id_1' not in existing_indexes:
-            db.content_metadata.create_index([('course_id', 1), ('lesson_id', 1)], unique=True)
-        for collection in ['financial_health', 'budgets', 'bills', 'net_worth', 'emergency_funds']:
-            existing_indexes = db[collection].index_information()
-            if 'session_id_1' not in existing_indexes:
-                db[collection].create_index('session_id')
-            if 'user_id_1' not in existing_indexes:
-                db[collection].create_index('user_id')
-        existing_indexes = db.learning_progress.index_information()
-        if 'user_id_1_course_id_1' not in existing_indexes:
-            db.learning_progress.create_index([('user_id', 1), ('course_id', 1)], unique=True)
-        if 'session_id_1_course_id_1' not in existing_indexes:
-            db.learning_progress.create_index([('session_id', 1), ('course_id', 1)], unique=True)
-        if 'session_id_1' not in existing_indexes:
-            db.learning_progress.create_index('session_id')
-        if 'user_id_1' not in existing_indexes:
-            db.learning_progress.create_index('user_id')
-        for collection in ['quiz_results', 'feedback', 'tool_usage']:
-            existing_indexes = db[collection].index_information()
-            if 'session_id_1' not in existing_indexes:
-                db[collection].create_index('session_id')
-            if 'user_id_1' not in existing_indexes:
-                db[collection].create_index('user_id')
-        existing_indexes = db.tool_usage.index_information()
-        if 'tool_name_1' not in existing_indexes:
-            db.tool_usage.create_index('tool_name')
-        existing_indexes = db.bills.index_information()
-        if 'user_email_1' not in existing_indexes:
-            db.bills.create_index('user_email')
-        if 'status_1' not in existing_indexes:
-            db.bills.create_index('status')
-        if 'due_date_1' not in existing_indexes:
-            db.bills.create_index('due_date')
-        existing_indexes = db.reset_tokens.index_information()
-        if 'token_1' not in existing_indexes:
-            db.reset_tokens.create_index('token', unique=True)
+        # get_user only looks up string ids, so legacy integer ids are converted
+        # on every boot, before the unique id index is built; a no-op once done
+        migrate_user_ids(db)
+        if os.environ.get('INDEX_RECONCILE_ON_STARTUP', 'true').lower() == 'true':
+            migrate_financial_health_assessments(db)
+            # Created before its indexes, which would otherwise make it a regular collection
+            ensure_tool_usage_collection(db)
+            reconcile_indexes(db, include_usage=False)
+            if app.config.get('SESSION_TYPE') == 'mongodb':
+                session_db = app.config['SESSION_MONGODB'][app.config['SESSION_MONGODB_DB']]
+                reconcile_indexes(session_db, include_usage=False, manifest=SESSION_INDEX_MANIFEST)
         logger.info("MongoDB indexes created or verified")
         courses_collection = db.courses
         if courses_collection.count_documents({}) == 0:
-            for course in SAMPLE_COURSES:
-                courses_collection.insert_one(course)
-            logger.info("Initialized courses in MongoDB")
+            result = create_courses_many(db, SAMPLE_COURSES)
+            logger.info(f"Initialized {result['inserted']} courses in MongoDB")
         app.config['COURSES'] = list(courses_collection.find({}, {'_id': 0}))
     except Exception as e:
         logger.error(f"Failed to initialize database indexes/courses: {str(e)}", exc_info=True)
@@ -412,6 +383,7 @@ def create_app():
             return str(value)
     init_email_config(app, logger)
     setup_session(app)
+    install_session_policy(app)
     app.config['BASE_URL'] = os.environ.get('BASE_URL', 'http://localhost:5000')
     csrf.init_app(app)
     with app.app_context():
@@ -437,6 +409,11 @@ def create_app():
                 logger.info(f"Admin user already exists with email: {admin_email}")
         else:
             logger.warning("ADMIN_EMAIL or ADMIN_PASSWORD not set in environment variables.")
+    try:
+        usage_sink = init_usage_sink(app, mongo)
+        atexit.register(usage_sink.shutdown)
+    except Exception as e:
+        logger.error(f"Failed to initialize tool usage sink, falling back to direct writes: {str(e)}", exc_info=True)
     try:
         scheduler = init_scheduler(app, mongo)
         app.config['SCHEDULER'] = scheduler
@@ -449,8 +426,10 @@ def create_app():
             except Exception as e:
                 logger.error(f"Error shutting down scheduler on app exit: {str(e)}", exc_info=True)
         atexit.register(shutdown_scheduler)
+        atexit.register(flush_missing)
     except Exception as e:
         logger.error(f"Failed to initialize scheduler: {str(e)}", exc_info=True)
+    register_cli(app)
     @app.teardown_appcontext
     def teardown_appcontext(exception=None):
         logger.info("Teardown completed without closing MongoDB connection")
@@ -473,24 +452,17 @@ def create_app():
     app.register_blueprint(auth_bp, template_folder='templates/auth')
     app.register_blueprint(admin_bp, template_folder='templates/admin')
     def translate(key, lang='en', logger=logger, **kwargs):
-        translation = trans(key, lang=lang, **kwargs)
-        if translation == key:
-            logger.warning(f"Missing translation for key='{key}' in lang='{lang}'")
-            return key
-        return translation
-    app.jinja_env.filters['trans'] = lambda key, **kwargs: translate(
-        key,
-        lang=kwargs.get('lang', session.get('lang', 'en')),
-        logger=g.get('logger', logger),
-        **{k: v for k, v in kwargs.items() if k != 'lang'}
-    )
+        return trans(key, lang=lang, **kwargs)
+    app.jinja_env.filters['trans'] = trans
+    if os.environ.get('TRANSLATIONS_PRELOAD', 'false').lower() == 'true':
+        preload_translations()
     @app.context_processor
     def inject_google_client_id():
         return {'google_client_id': app.config.get('GOOGLE_CLIENT_ID', '')}
     @app.before_request
     def setup_session_and_language():
-        if request.path.startswith('/static/'):
-            logger.info(f"Skipping session setup for static file request: {request.path}")
+        if is_sessionless_request():
+            logger.debug(f"Skipping session setup for sessionless request: {request.method} {request.path}")
             return
         logger.info(f"Starting before_request for path: {request.path}")
         try:
@@ -499,7 +471,7 @@ def create_app():
                 session['is_anonymous'] = not current_user.is_authenticated
                 logger.info(f"Session ID set: {session['sid']}, is_anonymous: {session['is_anonymous']}")
             if 'lang' not in session:
-                session['lang'] = request.accept_languages.best_match(['en', 'ha'], 'en')
+                session['lang'] = request.accept_languages.best_match(available_languages(), 'en')
                 logger.info(f"Set default language to {session['lang']}")
             g.logger = logger
             logger.info(f"Request processed for path: {request.path}")
@@ -509,14 +481,8 @@ def create_app():
     @app.context_processor
     def inject_translations():
         lang = session.get('lang', 'en')
-        def context_trans(key, **kwargs):
-            used_lang = kwargs.pop('lang', lang)
-            return translate(
-                key,
-                lang=used_lang,
-                logger=g.get('logger', logger) if has_request_context() else logger,
-                **kwargs
-            )
+        def context_trans(key, lang=lang, **kwargs):
+            return trans(key, lang=lang, **kwargs)
         return {
             'trans': context_trans,
             'current_year': datetime.now().year,
@@ -567,7 +533,7 @@ def create_app():
             return render_template('error.html', t=translate, lang=lang, error=str(e)), 500
     @app.route('/set_language/<lang>')
     def set_language(lang):
-        valid_langs = ['en', 'ha']
+        valid_langs = available_languages()
         new_lang = lang if lang in valid_langs else 'en'
         try:
             session['lang'] = new_lang
@@ -603,13 +569,7 @@ def create_app():
         data = {}
         try:
             from models import (
-                get_financial_health, 
-                get_budgets, 
-                get_bills, 
-                get_net_worth, 
-                get_emergency_funds, 
-                get_learning_progress, 
-                get_quiz_results, 
+                get_dashboard_records, 
                 to_dict_financial_health, 
                 to_dict_budget, 
                 to_dict_bill, 
@@ -619,27 +579,22 @@ def create_app():
                 to_dict_quiz_result
             )
             filter_kwargs = {'user_id': current_user.id} if current_user.is_authenticated else {'session_id': session.get('sid', 'no-session-id')}
-            fh_records = get_financial_health(mongo, filter_kwargs)
-            fh_records = [to_dict_financial_health(fh) for fh in fh_records]
+            records = get_dashboard_records(mongo, filter_kwargs)
+            fh_records = [to_dict_financial_health(fh) for fh in records['financial_health']]
             data['financial_health'] = fh_records[0] if fh_records else {'score': None, 'status': None}
-            budget_records = get_budgets(mongo, filter_kwargs)
-            budget_records = [to_dict_budget(b) for b in budget_records]
+            budget_records = [to_dict_budget(b) for b in records['budget']]
             data['budget'] = budget_records[0] if budget_records else {'surplus_deficit': None, 'savings_goal': None}
-            bills = get_bills(mongo, filter_kwargs)
-            bills = [to_dict_bill(b) for b in bills]
+            bills = [to_dict_bill(b) for b in records['bills']]
             total_amount = sum(bill['amount'] for bill in bills if bill['amount'] is not None) if bills else 0
             unpaid_amount = sum(bill['amount'] for bill in bills if bill['amount'] is not None and bill['status'].lower() != 'paid') if bills else 0
             data['bills'] = {'bills': bills, 'total_amount': total_amount, 'unpaid_amount': unpaid_amount}
-            nw_records = get_net_worth(mongo, filter_kwargs)
-            nw_records = [to_dict_net_worth(nw) for nw in nw_records]
+            nw_records = [to_dict_net_worth(nw) for nw in records['net_worth']]
             data['net_worth'] = nw_records[0] if nw_records else {'net_worth': None, 'total_assets': None}
-            ef_records = get_emergency_funds(mongo, filter_kwargs)
-            ef_records = [to_dict_emergency_fund(ef) for ef in ef_records]
+            ef_records = [to_dict_emergency_fund(ef) for ef in records['emergency_fund']]
             data['emergency_fund'] = ef_records[0] if ef_records else {'target_amount': None, 'savings_gap': None}
-            lp_records = get_learning_progress(mongo, filter_kwargs)
+            lp_records = records['learning_progress']
             data['learning_progress'] = {lp['course_id']: to_dict_learning_progress(lp) for lp in lp_records} if lp_records else {}
-            quiz_records = get_quiz_results(mongo, filter_kwargs)
-            quiz_records = [to_dict_quiz_result(qr) for qr in quiz_records]
+            quiz_records = [to_dict_quiz_result(qr) for qr in records['quiz']]
             data['quiz'] = quiz_records[0] if quiz_records else {'personality': None, 'score': None}
             logger.info(f"Retrieved data for session {session.get('sid', 'no-session-id')}")
             return render_template('general_dashboard.html', data=data, t=translate, lang=lang)
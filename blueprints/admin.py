@@ -1,12 +1,13 @@
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify, Response
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify, Response, stream_with_context
 from flask_login import current_user
 from datetime import datetime, timedelta
 from app import admin_required, trans, logger as app_logger, custom_login_required
-from models import get_user, get_tool_usage, get_feedback, to_dict_tool_usage, to_dict_feedback
+from translations import missing_translations
+from models import get_user, get_tool_usage, get_feedback, to_dict_tool_usage, to_dict_feedback, tool_usage_filters, page_events
 import logging
-import csv
-from io import StringIO
 from extensions import mongo  # Import mongo from extensions
+from exports import export_tool_usage, EXPORT_FORMATS
+from rollups import overview_metrics, action_facets
 
 # Configure logging with SessionAdapter
 logger = logging.getLogger('ficore_app.admin')  # Namespaced logger
@@ -21,6 +22,19 @@ VALID_TOOLS = [
     'emergency_fund', 'learning_hub', 'quiz'
 ]
 
+# Usage log rows per page and the fields they show
+USAGE_LOGS_PAGE_SIZE = 100
+USAGE_LOG_FIELDS = ['meta', 'tool_name', 'action', 'user_id', 'session_id']
+
+def request_usage_filters(tool_name, action, start_date_str, end_date_str):
+    """Build the tool_usage query for the filter fields of the admin pages."""
+    return tool_usage_filters(
+        tool_name=tool_name if tool_name in VALID_TOOLS[3:] else None,
+        action=action,
+        start=datetime.strptime(start_date_str, '%Y-%m-%d') if start_date_str else None,
+        end=datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1) if end_date_str else None
+    )
+
 @admin_bp.route('/')
 @custom_login_required
 @admin_required
@@ -36,56 +50,31 @@ def overview():
         # Use mongo.db directly without reassignment
         db = mongo.db
 
-        # User Stats
-        total_users = db.users.count_documents({})
+        # Totals come from the rollups kept by the usage_rollups job; the
+        # last-24h counts are indexed range counts on users.created_at
+        rollup = overview_metrics(db)
+        total_users = rollup['total_users']
         last_day = datetime.utcnow() - timedelta(days=1)
         new_users_last_24h = db.users.count_documents({'created_at': {'$gte': last_day}})
 
         # Referral Stats
-        total_referrals = db.users.count_documents({'referred_by_id': {'$ne': None}})
+        total_referrals = rollup['total_referrals']
         new_referrals_last_24h = db.users.count_documents({
             'referred_by_id': {'$ne': None},
             'created_at': {'$gte': last_day}
         })
         referral_conversion_rate = (total_referrals / total_users * 100) if total_users else 0.0
 
-        # Tool Usage Stats
-        tool_usage_total = db.tool_usage.count_documents({})
-        usage_by_tool = list(db.tool_usage.aggregate([
-            {'$group': {'_id': '$tool_name', 'count': {'$sum': 1}}},
-            {'$project': {'tool_name': '$_id', 'count': 1, '_id': 0}}
-        ]))
-        top_tools = sorted(usage_by_tool, key=lambda x: x['count'], reverse=True)[:3]
-
-        # Action Breakdown for Top Tools
-        action_breakdown = {}
-        for tool in [t['tool_name'] for t in top_tools]:
-            actions = list(db.tool_usage.aggregate([
-                {'$match': {'tool_name': tool}},
-                {'$group': {'_id': '$action', 'count': {'$sum': 1}}},
-                {'$project': {'action': '$_id', 'count': 1, '_id': 0}},
-                {'$sort': {'count': -1}},
-                {'$limit': 5}
-            ]))
-            action_breakdown[tool] = [(a['action'], a['count']) for a in actions] if actions else []
-
-        # Feedback
-        avg_feedback = list(db.feedback.aggregate([
-            {'$group': {'_id': None, 'avg_rating': {'$avg': '$rating'}}},
-            {'$project': {'avg_rating': 1, '_id': 0}}
-        ]))
-        avg_feedback = avg_feedback[0]['avg_rating'] if avg_feedback else 0.0
-
         metrics = {
             'total_users': total_users,
             'new_users_last_24h': new_users_last_24h,
             'total_referrals': total_referrals,
             'new_referrals_last_24h': new_referrals_last_24h,
             'referral_conversion_rate': round(referral_conversion_rate, 2),
-            'tool_usage_total': tool_usage_total,
-            'top_tools': [(t['tool_name'], t['count']) for t in top_tools],
-            'action_breakdown': action_breakdown,
-            'avg_feedback_rating': round(avg_feedback, 2)
+            'tool_usage_total': rollup['tool_usage_total'],
+            'top_tools': rollup['top_tools'],
+            'action_breakdown': rollup['action_breakdown'],
+            'avg_feedback_rating': round(rollup['avg_feedback_rating'], 2)
         }
 
         # Log metrics for debugging
@@ -124,30 +113,20 @@ def tool_usage():
         end_date_str = request.args.get('end_date')
         action = request.args.get('action')
 
-        filters = {}
-        if tool_name and tool_name in VALID_TOOLS[3:]:
-            filters['tool_name'] = tool_name
-        if action:
-            filters['action'] = action
-        if start_date_str:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-            filters['created_at'] = filters.get('created_at', {})
-            filters['created_at']['$gte'] = start_date
-        else:
-            start_date = datetime.utcnow() - timedelta(days=30)
-        if end_date_str:
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1)
-            filters['created_at'] = filters.get('created_at', {})
-            filters['created_at']['$lt'] = end_date
-        else:
-            end_date = datetime.utcnow()
-
-        usage_logs = list(db.tool_usage.find(filters, {'_id': False}).sort('created_at', -1).limit(100))
+        filters = request_usage_filters(tool_name, action, start_date_str, end_date_str)
+
+        # Keyset pagination: 'after' is the token of the last row of the previous page
+        after = request.args.get('after')
+        try:
+            usage_logs, next_page = page_events(db, 'tool_usage', filters, fields=USAGE_LOG_FIELDS, limit=USAGE_LOGS_PAGE_SIZE, after=after)
+        except ValueError:
+            logger.warning(f"Ignoring invalid tool usage page token: {after}", extra={'session_id': session_id})
+            after = None
+            usage_logs, next_page = page_events(db, 'tool_usage', filters, fields=USAGE_LOG_FIELDS, limit=USAGE_LOGS_PAGE_SIZE)
         usage_logs = [to_dict_tool_usage(log) for log in usage_logs]
 
-        # Available actions for the selected tool
-        available_actions = db.tool_usage.distinct('action', {'tool_name': tool_name} if tool_name else {})
-        available_actions = [a for a in available_actions if a]
+        # Available actions for the selected tool, from the cached facet catalog
+        available_actions = action_facets(db, tool_name)
 
         logger.info(f"Tool usage analytics accessed by {current_user.username if current_user.is_authenticated else 'anonymous'}, tool={tool_name}, action={action}, start={start_date_str}, end={end_date_str}", extra={'session_id': session_id})
         return render_template(
@@ -159,7 +138,9 @@ def tool_usage():
             start_date=start_date_str,
             end_date=end_date_str,
             action=action,
-            available_actions=available_actions
+            available_actions=available_actions,
+            next_page=next_page,
+            is_first_page=not after
         )
     except Exception as e:
         logger.error(f"Error in tool usage analytics: {str(e)}", extra={'session_id': session_id})
@@ -170,7 +151,7 @@ def tool_usage():
 @custom_login_required
 @admin_required
 def export_csv():
-    """Export filtered tool usage logs as CSV."""
+    """Export filtered tool usage logs as a streamed CSV, NDJSON or Parquet file, optionally gzipped."""
     if 'sid' not in session:
         session['sid'] = str(uuid.uuid4())
         session.permanent = True
@@ -178,52 +159,47 @@ def export_csv():
     lang = session.get('lang', 'en')
     session_id = session.get('sid', 'no-session-id')
     try:
-        db = mongo.db
         tool_name = request.args.get('tool_name')
         start_date_str = request.args.get('start_date')
         end_date_str = request.args.get('end_date')
         action = request.args.get('action')
-
-        filters = {}
-        if tool_name and tool_name in VALID_TOOLS[3:]:
-            filters['tool_name'] = tool_name
-        if action:
-            filters['action'] = action
-        if start_date_str:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-            filters['created_at'] = filters.get('created_at', {})
-            filters['created_at']['$gte'] = start_date
-        if end_date_str:
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1)
-            filters['created_at'] = filters.get('created_at', {})
-            filters['created_at']['$lt'] = end_date
-
-        usage_logs = list(db.tool_usage.find(filters, {'_id': False}))
-        usage_logs = [to_dict_tool_usage(log) for log in usage_logs]
-
-        si = StringIO()
-        cw = csv.writer(si)
-        cw.writerow(['ID', 'User ID', 'Session ID', 'Tool Name', 'Action', 'Created At'])
-        for log in usage_logs:
-            cw.writerow([
-                log['id'],
-                log['user_id'] or 'anonymous',
-                log['session_id'],
-                log['tool_name'],
-                log['action'] or 'N/A',
-                log['created_at'] or 'N/A'
-            ])
-
-        output = si.getvalue()
-        si.close()
-
-        logger.info(f"CSV export generated by {current_user.username if current_user.is_authenticated else 'anonymous'}, tool={tool_name}, action={action}, start={start_date_str}, end={end_date_str}", extra={'session_id': session_id})
+        export_format = request.args.get('format', 'csv').lower()
+        compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+        filters = request_usage_filters(tool_name, action, start_date_str, end_date_str)
+
+        chunks = export_tool_usage(mongo, filters, export_format, compress)
+        mimetype, extension = EXPORT_FORMATS[export_format]
+        filename = f"tool_usage_export.{extension}"
+        if compress:
+            mimetype, filename = 'application/gzip', f"{filename}.gz"
+
+        def generate():
+            try:
+                yield from chunks
+            except Exception as e:
+                # Headers are already sent; the client sees a truncated file
+                logger.error(f"Tool usage export stream failed: {str(e)}", extra={'session_id': session_id})
+                raise
+
+        logger.info(f"{export_format.upper()} export started by {current_user.username if current_user.is_authenticated else 'anonymous'}, tool={tool_name}, action={action}, start={start_date_str}, end={end_date_str}, gzip={compress}", extra={'session_id': session_id})
         return Response(
-            output,
-            mimetype='text/csv',
-            headers={'Content-Disposition': 'attachment; filename=tool_usage_export.csv'}
+            stream_with_context(generate()),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
         )
     except Exception as e:
-        logger.error(f"Error in CSV export: {str(e)}", extra={'session_id': session_id})
+        logger.error(f"Error in tool usage export: {str(e)}", extra={'session_id': session_id})
         flash(trans('admin_export_error', default='Error exporting CSV.', lang=lang), 'error')
         return redirect(url_for('index'))
+
+@admin_bp.route('/missing_translations', methods=['GET'])
+@custom_login_required
+@admin_required
+def missing_translations_view():
+    """List translation keys missing in this worker, with hit counts."""
+    session_id = session.get('sid', 'no-session-id')
+    lang = request.args.get('lang')
+    items = [item for item in missing_translations() if not lang or item['lang'] == lang]
+    logger.info(f"Missing translations listed by {current_user.username if current_user.is_authenticated else 'anonymous'}: {len(items)} keys", extra={'session_id': session_id})
+    return jsonify({'missing': items, 'total': len(items)})
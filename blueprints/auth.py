@@ -545,11 +545,8 @@ def google_callback():
         if not user:
             user = get_user_by_email(mongo, email)
             if user:
-                mongo.db.users.update_one(
-                    {'_id': user._id},
-                    {'$set': {'google_id': google_id}}
-                )
-                user = get_user(mongo, str(user._id))
+                update_user(mongo, user.id, {'google_id': google_id})
+                user = get_user(mongo, user.id)
             else:
                 user_data = {
                     'username': username,
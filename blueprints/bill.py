@@ -3,15 +3,17 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, FloatField, SelectField, BooleanField, IntegerField, HiddenField
 from wtforms.validators import DataRequired, NumberRange, Email, Optional
 from flask_login import current_user
-from mailersend_email import send_email, EMAIL_CONFIG
+from mailersend_email import EMAIL_CONFIG
+from email_outbox import queue_email
 from datetime import datetime, date, timedelta
 import uuid
 from translations import trans
 from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
 from extensions import mongo
-from models import log_tool_usage
+from models import log_tool_usage, to_due_date, parse_due_date
 from session_utils import create_anonymous_session
+from wizard_drafts import get_step, save_step, save_steps, clear_draft
 from app import custom_login_required
 
 
@@ -118,7 +120,7 @@ def form_step1():
         session['sid'] = str(uuid.uuid4())
         session.permanent = True
     lang = session.get('lang', 'en')
-    bill_data = session.get('bill_step1', {})
+    bill_data = get_step('bill', 'step1')
     if current_user.is_authenticated:
         bill_data['email'] = bill_data.get('email', current_user.email)
         bill_data['first_name'] = bill_data.get('first_name', current_user.username)
@@ -145,14 +147,8 @@ def form_step1():
                 current_app.logger.error("Invalid due date format in bill.form_step1")
                 return redirect(url_for('bill.form_step1'))
 
-            session['bill_step1'] = {
-                'first_name': form.first_name.data,
-                'email': form.email.data,
-                'bill_name': form.bill_name.data,
-                'amount': form.amount.data,
-                'due_date': form.due_date.data
-            }
-            current_app.logger.info(f"Step 1 session data saved: {session['bill_step1']}")
+            step1_data = save_step('bill', 'step1', form.data)
+            current_app.logger.info(f"Step 1 draft data saved: {step1_data}")
             return redirect(url_for('bill.form_step2'))
         log_tool_usage(
             mongo,
@@ -173,8 +169,8 @@ def form_step2():
         session['sid'] = str(uuid.uuid4())
         session.permanent = True
     lang = session.get('lang', 'en')
-    bill_step2_data = session.get('bill_step2', {})
-    bill_step1_data = session.get('bill_step1', {})
+    bill_step2_data = get_step('bill', 'step2')
+    bill_step1_data = get_step('bill', 'step1')
     form = BillFormStep2(data=bill_step2_data)
     current_app.logger.info(f"BillFormStep2 initialized with data: {bill_step2_data}")
 
@@ -204,14 +200,14 @@ def form_step2():
                     return render_template('BILL/bill_form_step2.html', form=form, trans=trans, lang=lang)
 
                 if not bill_step1_data:
-                    current_app.logger.error("Session data missing for bill_step1")
+                    current_app.logger.error("Draft data missing for bill step1")
                     flash(trans('bill_session_expired', lang) or 'Session expired, please start over', 'danger')
                     return redirect(url_for('bill.form_step1'))
 
                 try:
                     due_date = datetime.strptime(bill_step1_data['due_date'], '%Y-%m-%d').date()
                 except ValueError:
-                    current_app.logger.error("Invalid due date format in session data")
+                    current_app.logger.error("Invalid due date format in draft data")
                     flash(trans('bill_due_date_format_invalid', lang) or 'Invalid due date format', 'danger')
                     return redirect(url_for('bill.form_step1'))
 
@@ -226,7 +222,7 @@ def form_step2():
                 if status not in ['paid', 'pending'] and due_date < date.today():
                     status = 'overdue'
 
-                bill_id = session.get('bill_id')
+                bill_id = get_step('bill', 'edit').get('bill_id')
                 filter_kwargs = {'user_id': current_user.id} if current_user.is_authenticated else {'session_id': session['sid']}
                 bill_data = {
                     'user_id': current_user.id if current_user.is_authenticated else None,
@@ -235,7 +231,7 @@ def form_step2():
                     'first_name': bill_step1_data['first_name'],
                     'bill_name': bill_step1_data['bill_name'],
                     'amount': float(bill_step1_data['amount']),
-                    'due_date': due_date.isoformat(),  # Convert datetime.date to ISO string
+                    'due_date': to_due_date(due_date),
                     'frequency': form.frequency.data,
                     'category': form.category.data,
                     'status': status,
@@ -267,19 +263,16 @@ def form_step2():
                     try:
                         config = EMAIL_CONFIG['bill_reminder']
                         subject = trans(config['subject_key'], lang=lang)
-                        template = config['template']
-                        send_email(
-                            app=current_app,
-                            logger=current_app.logger,
+                        queue_email(
                             to_email=bill_step1_data['email'],
                             subject=subject,
-                            template_name=template,
+                            template_key="bill_reminder",
                             data={
                                 'first_name': bill_step1_data['first_name'],
                                 'bills': [{
                                     'bill_name': bill_step1_data['bill_name'],
                                     'amount': bill_step1_data['amount'],
-                                    'due_date': bill_step1_data['due_date'],  # Use session string format for email
+                                    'due_date': bill_step1_data['due_date'],  # Use draft string format for email
                                     'category': trans(f'bill_category_{form.category.data}', lang=lang),
                                     'status': trans(f'bill_status_{status}', lang=lang)
                                 }],
@@ -288,14 +281,12 @@ def form_step2():
                             },
                             lang=lang
                         )
-                        current_app.logger.info(f"Email sent to {bill_step1_data['email']}")
+                        current_app.logger.info(f"Email queued for {bill_step1_data['email']}")
                     except Exception as e:
                         current_app.logger.error(f"Failed to send email: {str(e)}")
                         flash(trans('email_send_failed', lang) or 'Failed to send email reminder', 'warning')
 
-                session.pop('bill_step1', None)
-                session.pop('bill_id', None)
-                session.pop('bill_step2', None)
+                clear_draft('bill')
 
                 action = form_data.get('action')
                 if action == 'save_and_continue':
@@ -389,7 +380,8 @@ def dashboard():
                 pending_count += 1
 
             try:
-                bill_due_date = datetime.strptime(bill['due_date'], '%Y-%m-%d').date()  # Parse string to datetime.date
+                bill_due_date = parse_due_date(bill['due_date'])
+                bill['due_date'] = bill_due_date.strftime('%Y-%m-%d')
                 if bill_due_date == today:
                     due_today.append((b_id, bill))
                 if today <= bill_due_date <= (today + timedelta(days=7)):
@@ -398,7 +390,7 @@ def dashboard():
                     due_month.append((b_id, bill))
                 if today < bill_due_date:
                     upcoming_bills.append((b_id, bill))
-            except ValueError:
+            except (ValueError, TypeError):
                 current_app.logger.warning(f"Skipping invalid bill record {b_id}: invalid due_date {bill.get('due_date')}")
                 continue
 
@@ -467,11 +459,10 @@ def view_edit():
         bills_data = []
         for bill in bills:
             try:
-                due_date = bill['due_date']
-                if isinstance(due_date, str):
-                    due_date = datetime.strptime(due_date, '%Y-%m-%d').date()
-            except ValueError:
-                current_app.logger.warning(f"Invalid due_date format for bill {bill['_id']}: {due_date}")
+                due_date = parse_due_date(bill['due_date'])
+                bill['due_date'] = due_date.strftime('%Y-%m-%d')
+            except (ValueError, TypeError):
+                current_app.logger.warning(f"Invalid due_date format for bill {bill['_id']}: {bill.get('due_date')}")
                 due_date = None
             form = BillFormStep2(
                 data={
@@ -535,28 +526,29 @@ def view_edit():
                     action='edit_bill'
                 )
                 try:
-                    due_date = bill['due_date']
-                    if isinstance(due_date, str):
-                        due_date = datetime.strptime(due_date, '%Y-%m-%d').date()
-                except ValueError:
+                    due_date = parse_due_date(bill['due_date'])
+                except (ValueError, TypeError):
                     current_app.logger.error(f"Invalid due_date format for bill {bill_id}: {bill['due_date']}")
                     flash(trans('bill_due_date_format_invalid', lang) or 'Invalid due date format', 'danger')
                     return redirect(url_for('bill.view_edit'))
-                session['bill_step1'] = {
-                    'first_name': bill['first_name'],
-                    'email': bill['user_email'],
-                    'bill_name': bill['bill_name'],
-                    'amount': bill['amount'],
-                    'due_date': due_date.strftime('%Y-%m-%d')
-                }
-                session['bill_step2'] = {
-                    'frequency': bill['frequency'],
-                    'category': bill['category'],
-                    'status': bill['status'],
-                    'send_email': bill['send_email'],
-                    'reminder_days': bill['reminder_days']
-                }
-                session['bill_id'] = str(bill['_id'])
+                clear_draft('bill')
+                save_steps('bill', {
+                    'step1': {
+                        'first_name': bill['first_name'],
+                        'email': bill['user_email'],
+                        'bill_name': bill['bill_name'],
+                        'amount': bill['amount'],
+                        'due_date': due_date.strftime('%Y-%m-%d')
+                    },
+                    'step2': {
+                        'frequency': bill['frequency'],
+                        'category': bill['category'],
+                        'status': bill['status'],
+                        'send_email': bill['send_email'],
+                        'reminder_days': bill['reminder_days']
+                    },
+                    'edit': {'bill_id': str(bill['_id'])}
+                })
                 current_app.logger.info(f"Redirecting to edit bill: {bill_id}, category={bill['category']}, frequency={bill['frequency']}")
                 return redirect(url_for('bill.form_step1'))
 
@@ -596,10 +588,8 @@ def view_edit():
                     flash(trans('bill_bill_status_toggled_success', lang) or 'Bill status updated', 'success')
                     if new_status == 'paid' and bill['frequency'] != 'one-time':
                         try:
-                            due_date = bill['due_date']
-                            if isinstance(due_date, str):
-                                due_date = datetime.strptime(due_date, '%Y-%m-%d').date()
-                        except ValueError:
+                            due_date = parse_due_date(bill['due_date'])
+                        except (ValueError, TypeError):
                             current_app.logger.error(f"Invalid due_date format for bill {bill_id}: {bill['due_date']}")
                             flash(trans('bill_due_date_format_invalid', lang) or 'Invalid due date format', 'danger')
                             return redirect(url_for('bill.view_edit'))
@@ -612,7 +602,7 @@ def view_edit():
                             'first_name': bill['first_name'],
                             'bill_name': bill['bill_name'],
                             'amount': bill['amount'],
-                            'due_date': new_due_date.isoformat(),  # Convert to ISO string
+                            'due_date': to_due_date(new_due_date),
                             'frequency': bill['frequency'],
                             'category': bill['category'],
                             'status': 'unpaid',
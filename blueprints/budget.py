@@ -3,17 +3,26 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, FloatField, BooleanField, SubmitField
 from wtforms.validators import DataRequired, NumberRange, Optional, Email, ValidationError
 from flask_login import current_user
-from mailersend_email import send_email, EMAIL_CONFIG
+from mailersend_email import EMAIL_CONFIG
+from email_outbox import queue_email
 from datetime import datetime
 import uuid
 import re
 from translations import trans
 from extensions import mongo
 from bson import ObjectId
-from models import log_tool_usage
+from models import log_tool_usage, find_records
 from session_utils import create_anonymous_session
+from wizard_drafts import get_step, has_steps, save_step, compact_step, clear_draft
 from app import custom_login_required
 
+# Budget fields rendered by the dashboard
+DASHBOARD_FIELDS = [
+    'user_id', 'session_id', 'user_email', 'income', 'fixed_expenses', 'variable_expenses',
+    'savings_goal', 'surplus_deficit', 'housing', 'food', 'transport', 'dependents',
+    'miscellaneous', 'others'
+]
+
 budget_bp = Blueprint(
     'budget',
     __name__,
@@ -149,13 +158,10 @@ def step1():
     if 'sid' not in session:
         session['sid'] = str(uuid.uuid4())
         current_app.logger.info(f"New session ID generated: {session['sid']} {'(anonymous)' if session.get('is_anonymous') else ''}")
-        session.pop('budget_step1', None)
-        session.pop('budget_step2', None)
-        session.pop('budget_step3', None)
-        session.pop('budget_step4', None)
+        clear_draft('budget')
     session.permanent = True
     lang = session.get('lang', 'en')
-    form_data = session.get('budget_step1', {})
+    form_data = get_step('budget', 'step1')
     if current_user.is_authenticated:
         form_data['email'] = form_data.get('email', current_user.email)
         form_data['first_name'] = form_data.get('first_name', current_user.username)
@@ -174,7 +180,7 @@ def step1():
                     session_id=session['sid'],
                     action='step1_submit'
                 )
-                session['budget_step1'] = form.data
+                save_step('budget', 'step1', form.data)
                 current_app.logger.info(f"Budget step1 form validated successfully for session {session['sid']}: {form.data}")
                 return redirect(url_for('budget.step2'))
             else:
@@ -204,7 +210,7 @@ def step2():
     lang = session.get('lang', 'en')
     form = Step2Form()
     try:
-        if 'budget_step1' not in session:
+        if not has_steps('budget', 'step1'):
             current_app.logger.warning(f"Missing budget_step1 data for session {session['sid']}")
             flash(trans("budget_missing_previous_steps") or "Please complete previous steps", "danger")
             return redirect(url_for('budget.step1'))
@@ -218,7 +224,7 @@ def step2():
                     session_id=session['sid'],
                     action='step2_submit'
                 )
-                session['budget_step2'] = form.data
+                save_step('budget', 'step2', form.data)
                 current_app.logger.info(f"Budget step2 form validated successfully for session {session['sid']}: {form.data}")
                 return redirect(url_for('budget.step3'))
             else:
@@ -248,7 +254,7 @@ def step3():
     lang = session.get('lang', 'en')
     form = Step3Form()
     try:
-        if any(k not in session for k in ['budget_step1', 'budget_step2']):
+        if not has_steps('budget', 'step1', 'step2'):
             current_app.logger.warning(f"Missing budget_step1 or budget_step2 data for session {session['sid']}")
             flash(trans("budget_missing_previous_steps") or "Please complete previous steps", "danger")
             return redirect(url_for('budget.step1'))
@@ -262,7 +268,7 @@ def step3():
                     session_id=session['sid'],
                     action='step3_submit'
                 )
-                session['budget_step3'] = form.data
+                save_step('budget', 'step3', form.data)
                 current_app.logger.info(f"Budget step3 form validated successfully for session {session['sid']}: {form.data}")
                 return redirect(url_for('budget.step4'))
             else:
@@ -293,8 +299,8 @@ def step4():
     form = Step4Form()
 
     try:
-        session_keys = ['budget_step1', 'budget_step2', 'budget_step3']
-        missing_keys = [k for k in session_keys if k not in session]
+        draft_steps = ['step1', 'step2', 'step3']
+        missing_keys = [k for k in draft_steps if not has_steps('budget', k)]
         current_app.logger.info(f"Session check for {session['sid']} {'(anonymous)' if session.get('is_anonymous') else ''}: Missing keys: {missing_keys}")
 
         if missing_keys:
@@ -312,13 +318,12 @@ def step4():
                     session_id=session['sid'],
                     action='step4_submit'
                 )
-                session['budget_step4'] = form.data
                 current_app.logger.info(f"Budget step4 form validated successfully for session {session['sid']}: {form.data}")
 
-                step1_data = session.get('budget_step1', {})
-                step2_data = session.get('budget_step2', {})
-                step3_data = session.get('budget_step3', {})
-                step4_data = session.get('budget_step4', {})
+                step1_data = get_step('budget', 'step1')
+                step2_data = get_step('budget', 'step2')
+                step3_data = get_step('budget', 'step3')
+                step4_data = compact_step('budget', 'step4', form.data)
 
                 income = step2_data.get('income', 0)
                 expenses = sum([
@@ -365,13 +370,10 @@ def step4():
                     try:
                         config = EMAIL_CONFIG["budget"]
                         subject = trans(config["subject_key"], lang=lang)
-                        template = config["template"]
-                        send_email(
-                            app=current_app,
-                            logger=current_app.logger,
+                        queue_email(
                             to_email=email,
                             subject=subject,
-                            template_name=template,
+                            template_key="budget",
                             data={
                                 "first_name": step1_data.get('first_name', ''),
                                 "income": income,
@@ -393,11 +395,8 @@ def step4():
                         current_app.logger.error(f"Failed to send email: {str(e)}")
                         flash(trans("email_send_failed", lang=lang), "warning")
 
-                session.pop('budget_step1', None)
-                session.pop('budget_step2', None)
-                session.pop('budget_step3', None)
-                session.pop('budget_step4', None)
-                current_app.logger.info(f"Session data cleared for session {session['sid']}")
+                clear_draft('budget')
+                current_app.logger.info(f"Draft data cleared for session {session['sid']}")
 
                 flash(trans("budget_budget_completed_success") or "Budget created successfully", "success")
                 current_app.logger.info(f"Redirecting to dashboard for session {session['sid']}")
@@ -442,8 +441,7 @@ def dashboard():
         )
 
         filter_criteria = {'user_id': current_user.id} if current_user.is_authenticated else {'session_id': session['sid']}
-        budgets = list(mongo.db.budgets.find(filter_criteria).sort('created_at', -1))
-        current_app.logger.info(f"Read {len(budgets)} records from MongoDB budgets collection [session: {session['sid']}]")
+        budgets = find_records(mongo, 'budgets', filter_criteria, fields=DASHBOARD_FIELDS)
 
         budgets_dict = {}
         latest_budget = None
@@ -467,8 +465,10 @@ def dashboard():
                 'created_at': budget.get('created_at').strftime('%Y-%m-%dT%H:%M:%S.%fZ') if budget.get('created_at') else ''
             }
             budgets_dict[budget_data['id']] = budget_data
-            if not latest_budget or budget.get('created_at') > datetime.strptime(latest_budget['created_at'], '%Y-%m-%dT%H:%M:%S.%fZ'):
+            # Records arrive newest first
+            if not latest_budget:
                 latest_budget = budget_data
+        current_app.logger.info(f"Read {len(budgets_dict)} records from MongoDB budgets collection [session: {session['sid']}]")
 
         if not latest_budget:
             latest_budget = {
@@ -3,16 +3,18 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, FloatField, IntegerField, SelectField, BooleanField, SubmitField
 from wtforms.validators import DataRequired, Optional, Email, NumberRange
 from flask_login import current_user
-from mailersend_email import send_email, EMAIL_CONFIG
+from mailersend_email import EMAIL_CONFIG
+from email_outbox import queue_email
 from datetime import datetime
 import uuid
 import json
 from translations import trans
 from extensions import mongo
 from bson import ObjectId
-from models import log_tool_usage
+from models import log_tool_usage, latest_one
 import os
 from session_utils import create_anonymous_session
+from wizard_drafts import get_step, has_steps, save_step, clear_draft
 from app import custom_login_required
 
 
@@ -118,10 +120,9 @@ class Step4Form(FlaskForm):
 def step1():
     if 'sid' not in session:
         session['sid'] = str(uuid.uuid4())
-        session['permanent'] = True
-        session['modified'] = True
+        session.permanent = True
     lang = session.get('lang', 'en')
-    form_data = session.get('emergency_fund_data', {})
+    form_data = get_step('emergency_fund', 'step1')
     if current_user.is_authenticated:
         form_data['email'] = form_data.get('email', '') or current_user.email
         form_data['first_name'] = form_data.get('first_name', '') or current_user.username
@@ -153,15 +154,8 @@ def step1():
                 current_app.logger.error(f"Failed to log tool usage (POST): {str(e)}")
             current_app.logger.info(f"Step1 POST data: {request.form.to_dict()}")
             if form.validate_on_submit():
-                session['emergency_fund_data'] = {
-                    'step1_data': {
-                        'first_name': form.first_name.data,
-                        'email': form.email.data,
-                        'email_opt_in': form.email_opt_in.data
-                    }
-                }
-                session['modified'] = True
-                current_app.logger.info(f"Step1 data saved: {session['emergency_fund_data']}")
+                step1_data = save_step('emergency_fund', 'step1', form.data)
+                current_app.logger.info(f"Step1 data saved: {step1_data}")
                 return redirect(url_for('emergency_fund.step2'))
             else:
                 current_app.logger.warning(f"Step1 form validation failed: {form.errors}")
@@ -179,10 +173,9 @@ def step1():
 def step2():
     if 'sid' not in session:
         session['sid'] = str(uuid.uuid4())
-        session['permanent'] = True
-        session['modified'] = True
+        session.permanent = True
     lang = session.get('lang', 'en')
-    if 'emergency_fund_data' not in session:
+    if not has_steps('emergency_fund', 'step1'):
         flash(trans('emergency_fund_missing_step1', default='Please, complete step 1 first.', lang=lang), 'danger')
         return redirect(url_for('emergency_fund.step1'))
     form = Step2Form()
@@ -205,12 +198,11 @@ def step2():
             )
             current_app.logger.info(f"Step2 POST data: {request.form.to_dict()}")
             if form.validate_on_submit():
-                session['emergency_fund_step2'] = {
+                step2_data = save_step('emergency_fund', 'step2', {
                     'monthly_expenses': float(form.monthly_expenses.data),
                     'monthly_income': float(form.monthly_income.data) if form.monthly_income.data else None
-                }
-                session['modified'] = True
-                current_app.logger.info(f"Step2 data saved successfully to session: {session['emergency_fund_step2']}")
+                })
+                current_app.logger.info(f"Step2 data saved successfully to draft: {step2_data}")
                 return redirect(url_for('emergency_fund.step3'))
             else:
                 current_app.logger.warning(f"Step2 form validation failed: {form.errors}")
@@ -228,10 +220,9 @@ def step2():
 def step3():
     if 'sid' not in session:
         session['sid'] = str(uuid.uuid4())
-        session['permanent'] = True
-        session['modified'] = True
+        session.permanent = True
     lang = session.get('lang', 'en')
-    if 'emergency_fund_step2' not in session:
+    if not has_steps('emergency_fund', 'step2'):
         flash(trans('emergency_fund_missing_step2', default='Please complete previous steps first.', lang=lang), 'danger')
         return redirect(url_for('emergency_fund.step1'))
     form = Step3Form()
@@ -254,13 +245,12 @@ def step3():
             )
             current_app.logger.info(f"Step3 POST data: {request.form.to_dict()}")
             if form.validate_on_submit():
-                session['emergency_fund_step3'] = {
+                step3_data = save_step('emergency_fund', 'step3', {
                     'current_savings': float(form.current_savings.data) if form.current_savings.data else 0,
                     'risk_tolerance_level': form.risk_tolerance_level.data,
                     'dependents': int(form.dependents.data) if form.dependents.data else 0
-                }
-                session['modified'] = True
-                current_app.logger.info(f"Step3 data saved to session: {session['emergency_fund_step3']}")
+                })
+                current_app.logger.info(f"Step3 data saved to draft: {step3_data}")
                 return redirect(url_for('emergency_fund.step4'))
             else:
                 current_app.logger.warning(f"Step3 form errors: {form.errors}")
@@ -278,10 +268,9 @@ def step3():
 def step4():
     if 'sid' not in session:
         session['sid'] = str(uuid.uuid4())
-        session['permanent'] = True
-        session['modified'] = True
+        session.permanent = True
     lang = session.get('lang', 'en')
-    if 'emergency_fund_step3' not in session:
+    if not has_steps('emergency_fund', 'step3'):
         flash(trans('emergency_fund_missing_step3', default='Please complete previous steps first.', lang=lang), 'danger')
         return redirect(url_for('emergency_fund.step1'))
     form = Step4Form(lang=lang)
@@ -304,9 +293,9 @@ def step4():
             )
             current_app.logger.info(f"Step4 POST data: {request.form.to_dict()}")
             if form.validate_on_submit():
-                step1_data = session['emergency_fund_data']['step1_data']
-                step2_data = session['emergency_fund_step2']
-                step3_data = session['emergency_fund_step3']
+                step1_data = get_step('emergency_fund', 'step1')
+                step2_data = get_step('emergency_fund', 'step2')
+                step3_data = get_step('emergency_fund', 'step3')
                 months = int(form.timeline.data)
                 base_target = step2_data['monthly_expenses'] * months
                 recommended_months = months
@@ -361,13 +350,10 @@ def step4():
                     try:
                         config = EMAIL_CONFIG["emergency_fund"]
                         subject = trans(config["subject_key"], lang=lang)
-                        template = config["template"]
-                        send_email(
-                            app=current_app,
-                            logger=current_app.logger,
+                        queue_email(
                             to_email=step1_data['email'],
                             subject=subject,
-                            template_name=template,
+                            template_key="emergency_fund",
                             data={
                                 'first_name': step1_data['first_name'],
                                 'lang': lang,
@@ -393,9 +379,7 @@ def step4():
                         current_app.logger.error(f"Failed to send email: {str(e)}")
                         flash(trans("email_send_failed", lang=lang), "danger")
 
-                for key in ['emergency_fund_data', 'emergency_fund_step2', 'emergency_fund_step3']:
-                    session.pop(key, None)
-                session['modified'] = True
+                clear_draft('emergency_fund')
 
                 flash(trans('emergency_fund_completed_successfully', default='Emergency fund calculation completed successfully!'), 'success')
                 return redirect(url_for('emergency_fund.dashboard'))
@@ -415,8 +399,7 @@ def step4():
 def dashboard():
     if 'sid' not in session:
         session['sid'] = str(uuid.uuid4())
-        session['permanent'] = True
-        session['modified'] = True
+        session.permanent = True
     lang = session.get('lang', 'en')
     template_path = 'EMERGENCYFUND/emergency_fund_dashboard.html'
     try:
@@ -456,10 +439,8 @@ def dashboard():
 
         cross_tool_insights = []
         filter_kwargs_budget = {'user_id': current_user.id} if current_user.is_authenticated else {'session_id': session['sid']}
-        budget_data = mongo.db.budgets.find(filter_kwargs_budget).sort('created_at', -1)
-        budget_data = list(budget_data)
-        if budget_data and latest_record and latest_record.get('savings_gap', 0) > 0:
-            latest_budget = budget_data[0]
+        latest_budget = latest_one(mongo, 'budgets', filter_kwargs_budget, fields=['income', 'fixed_expenses'])
+        if latest_budget and latest_record and latest_record.get('savings_gap', 0) > 0:
             if latest_budget.get('income') and latest_budget.get('fixed_expenses'):
                 savings_possible = latest_budget['income'] - latest_budget['fixed_expenses']
                 if savings_possible > 0:
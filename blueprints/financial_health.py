@@ -3,13 +3,17 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, FloatField, SelectField, BooleanField, SubmitField
 from wtforms.validators import DataRequired, NumberRange, Optional, Email, ValidationError
 from flask_login import current_user
+from pymongo import ReturnDocument
 from datetime import datetime
 import uuid
 import json
-from mailersend_email import send_email, EMAIL_CONFIG
+from mailersend_email import EMAIL_CONFIG
+from email_outbox import queue_email
 from translations import trans
 from extensions import mongo
-from models import log_tool_usage
+from health_scoring import score_assessment
+from models import log_tool_usage, get_score_distribution, update_score_distribution, score_rank
+from wizard_drafts import WIZARD_DRAFT_TTL
 from session_utils import create_anonymous_session
 from app import custom_login_required
 
@@ -21,10 +25,55 @@ financial_health_bp = Blueprint(
     url_prefix='/HEALTHSCORE'
 )
 
+# Name of the stored score histogram used for dashboard comparisons
+SCORE_DISTRIBUTION = 'financial_health'
+
+# Session key holding the id of the assessment in progress
+ASSESSMENT_SESSION_KEY = 'health_assessment_id'
+
 # MongoDB client setup using Flask-PyMongo
 def get_mongo_collection():
     return mongo.db['financial_health_scores']
 
+# Each attempt is one document in financial_health_scores with the answers of
+# each step under step1/step2/step3; completed attempts also carry the score
+# at the top level, and the newest completed attempt per user is flagged
+# 'latest' so the score histogram counts every user once. Attempts in progress
+# carry expires_at like wizard drafts and are removed by its TTL index if
+# abandoned; completing an attempt clears it.
+def load_assessment():
+    """Return the assessment in progress for this session, or None."""
+    assessment_id = session.get(ASSESSMENT_SESSION_KEY)
+    if not assessment_id:
+        return None
+    return get_mongo_collection().find_one({'_id': assessment_id})
+
+def save_assessment_step(assessment_id, step, step_data):
+    """Set one step of an assessment with a single upsert and return the updated document."""
+    now = datetime.utcnow()
+    return get_mongo_collection().find_one_and_update(
+        {'_id': assessment_id},
+        {
+            '$set': {
+                'user_id': current_user.id if current_user.is_authenticated else None,
+                'session_id': session['sid'],
+                step: step_data,
+                'updated_at': now,
+                'expires_at': now + WIZARD_DRAFT_TTL
+            },
+            '$setOnInsert': {'created_at': now, 'state': 'in_progress'}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+def assessment_record(assessment):
+    """Flatten an assessment into the record shape used by the dashboard templates."""
+    record = {**assessment.get('step1', {}), **assessment.get('step2', {}), **assessment.get('step3', {})}
+    record['_id'] = assessment['_id']
+    record['created_at'] = assessment.get('completed_at') or assessment.get('created_at')
+    return record
+
 class Step1Form(FlaskForm):
     first_name = StringField()
     email = StringField()
@@ -131,7 +180,9 @@ def step1():
         session['sid'] = str(uuid.uuid4())
         session.permanent = True
     lang = session.get('lang', 'en')
-    form_data = session.get('health_step1', {})
+    # Only a GET prefills the form; a POST goes straight to the upsert
+    assessment = (load_assessment() if request.method == 'GET' else None) or {}
+    form_data = dict(assessment.get('step1', {}))
     if current_user.is_authenticated:
         form_data['email'] = form_data.get('email', current_user.email)
         form_data['first_name'] = form_data.get('first_name', current_user.username)
@@ -159,31 +210,15 @@ def step1():
                 current_app.logger.error(f"Invalid email type: {type(form_data['email'])}")
                 raise ValueError(trans("financial_health_email_must_be_string", lang=lang))
 
-            collection = get_mongo_collection()
-            filter_criteria = {'user_id': current_user.id} if current_user.is_authenticated else {'session_id': session['sid']}
-            record = collection.find_one({**filter_criteria, 'step': 1})
-            record_data = {
-                'user_id': current_user.id if current_user.is_authenticated else None,
-                'session_id': session['sid'],
-                'step': 1,
+            # The session only ever holds an attempt in progress; step3 forgets it on completion
+            document_id = session.get(ASSESSMENT_SESSION_KEY) or str(uuid.uuid4())
+            save_assessment_step(document_id, 'step1', {
                 'first_name': form_data['first_name'],
                 'email': form_data['email'],
                 'user_type': form_data['user_type'],
-                'send_email': form_data['send_email'],
-                'created_at': datetime.utcnow()
-            }
-            document_id = None
-            if record:
-                record_data['_id'] = record['_id']
-                collection.update_one(
-                    {'_id': record['_id']},
-                    {'$set': {k: v for k, v in record_data.items() if k != '_id'}}
-                )
-                document_id = record['_id']
-            else:
-                record_data['_id'] = str(uuid.uuid4())
-                collection.insert_one(record_data)
-                document_id = record_data['_id']
+                'send_email': form_data['send_email']
+            })
+            session[ASSESSMENT_SESSION_KEY] = document_id
 
             current_app.logger.info(f"Step1 data updated/saved to MongoDB with ID {document_id} for session {session['sid']}")
             log_tool_usage(
@@ -194,8 +229,6 @@ def step1():
                 action='step1_submit'
             )
 
-            session['health_step1'] = form_data
-            session.modified = True
             return redirect(url_for('financial_health.step2'))
         
         return render_template('HEALTHSCORE/health_score_step1.html', form=form, trans=trans, lang=lang)
@@ -212,7 +245,12 @@ def step2():
         session['sid'] = str(uuid.uuid4())
         session.permanent = True
     lang = session.get('lang', 'en')
-    if 'health_step1' not in session:
+    # A POST checks for step 1 on the document returned by its upsert instead of reading it first
+    if request.method == 'GET':
+        has_step1 = 'step1' in (load_assessment() or {})
+    else:
+        has_step1 = bool(session.get(ASSESSMENT_SESSION_KEY))
+    if not has_step1:
         flash(trans('financial_health_missing_step1', lang=lang, default='Please complete step 1 first.'), 'danger')
         return redirect(url_for('financial_health.step1'))
     form = Step2Form()
@@ -231,29 +269,15 @@ def step2():
                 flash(trans("financial_health_form_errors", lang=lang), "danger")
                 return render_template('HEALTHSCORE/health_score_step2.html', form=form, trans=trans, lang=lang)
 
-            collection = get_mongo_collection()
-            filter_criteria = {'user_id': current_user.id} if current_user.is_authenticated else {'session_id': session['sid']}
-            record = collection.find_one({**filter_criteria, 'step': 2})
-            record_data = {
-                'user_id': current_user.id if current_user.is_authenticated else None,
-                'session_id': session['sid'],
-                'step': 2,
+            document_id = session[ASSESSMENT_SESSION_KEY]
+            saved = save_assessment_step(document_id, 'step2', {
                 'income': float(form.income.data),
-                'expenses': float(form.expenses.data),
-                'created_at': datetime.utcnow()
-            }
-            document_id = None
-            if record:
-                record_data['_id'] = record['_id']
-                collection.update_one(
-                    {'_id': record['_id']},
-                    {'$set': {k: v for k, v in record_data.items() if k != '_id'}}
-                )
-                document_id = record['_id']
-            else:
-                record_data['_id'] = str(uuid.uuid4())
-                collection.insert_one(record_data)
-                document_id = record_data['_id']
+                'expenses': float(form.expenses.data)
+            })
+            if 'step1' not in saved:
+                # The attempt expired; the orphaned step expires with it
+                flash(trans('financial_health_missing_step1', lang=lang, default='Please complete step 1 first.'), 'danger')
+                return redirect(url_for('financial_health.step1'))
 
             current_app.logger.info(f"Step2 data updated/saved to MongoDB with ID {document_id} for session {session['sid']}")
             log_tool_usage(
@@ -264,11 +288,6 @@ def step2():
                 action='step2_submit'
             )
 
-            session['health_step2'] = {
-                'income': float(form.income.data),
-                'expenses': float(form.expenses.data),
-            }
-            session.modified = True
             return redirect(url_for('financial_health.step3'))
         
         return render_template('HEALTHSCORE/health_score_step2.html', form=form, trans=trans, lang=lang)
@@ -285,7 +304,8 @@ def step3():
         session['sid'] = str(uuid.uuid4())
         session.permanent = True
     lang = session.get('lang', 'en')
-    if 'health_step2' not in session:
+    assessment = load_assessment()
+    if not assessment or 'step2' not in assessment:
         flash(trans('financial_health_missing_step2', lang=lang, default='Please complete step 2 first.'), 'danger')
         return redirect(url_for('financial_health.step2'))
     form = Step3Form()
@@ -304,8 +324,8 @@ def step3():
                 flash(trans("financial_health_form_errors", lang=lang), "danger")
                 return render_template('HEALTHSCORE/health_score_step3.html', form=form, trans=trans, lang=lang)
 
-            step1_data = session.get('health_step1', {})
-            step2_data = session.get('health_step2', {})
+            step1_data = assessment.get('step1', {})
+            step2_data = assessment.get('step2', {})
             debt = float(form.debt.data) if form.debt.data else 0
             interest_rate = float(form.interest_rate.data) if form.interest_rate.data else 0
             income = step2_data.get('income', 0)
@@ -316,78 +336,67 @@ def step3():
                 flash(trans("financial_health_income_zero_error", lang=lang), "danger")
                 return render_template('HEALTHSCORE/health_score_step3.html', form=form, trans=trans, lang=lang), 500
 
-            debt_to_income = (debt / income * 100) if income > 0 else 0
-            savings_rate = ((income - expenses) / income * 100) if income > 0 else 0
-            interest_burden = ((interest_rate * debt / 100) / 12) / income * 100 if debt > 0 and income > 0 else 0
-
-            score = 100
-            if debt_to_income > 0:
-                score -= min(debt_to_income / 50, 50)
-            if savings_rate < 0:
-                score -= min(abs(savings_rate), 30)
-            elif savings_rate > 0:
-                score += min(savings_rate / 2, 20)
-            score -= min(interest_burden, 20)
-            score = max(0, min(100, round(score)))
-
-            if score >= 80:
-                status_key = "excellent"
-                status = trans("financial_health_status_excellent", lang=lang)
-            elif score >= 60:
-                status_key = "good"
-                status = trans("financial_health_status_good", lang=lang)
-            else:
-                status_key = "needs_improvement"
-                status = trans("financial_health_status_needs_improvement", lang=lang)
-
-            badges = []
-            if score >= 80:
-                badges.append(trans("financial_health_badge_financial_star", lang=lang))
-            if debt_to_income < 20:
-                badges.append(trans("financial_health_badge_debt_manager", lang=lang))
-            if savings_rate >= 20:
-                badges.append(trans("financial_health_badge_savings_pro", lang=lang))
-            if interest_burden == 0 and debt > 0:
-                badges.append(trans("financial_health_badge_interest_free", lang=lang))
+            result = score_assessment(income, expenses, debt, interest_rate)
+            debt_to_income = result['debt_to_income']
+            savings_rate = result['savings_rate']
+            interest_burden = result['interest_burden']
+            score = result['score']
+            status_key = result['status_key']
+            status = trans(f"financial_health_status_{status_key}", lang=lang)
+            badges = [trans(badge_key, lang=lang) for badge_key in result['badge_keys']]
 
             collection = get_mongo_collection()
             filter_criteria = {'user_id': current_user.id} if current_user.is_authenticated else {'session_id': session['sid']}
-            record = collection.find_one({**filter_criteria, 'step': 3})
-            record_data = {
-                'user_id': current_user.id if current_user.is_authenticated else None,
-                'session_id': session['sid'],
-                'step': 3,
-                'first_name': step1_data.get('first_name', ''),
-                'email': step1_data.get('email', ''),
-                'user_type': step1_data.get('user_type', 'individual'),
-                'income': income,
-                'expenses': expenses,
-                'debt': debt,
-                'interest_rate': interest_rate,
-                'debt_to_income': debt_to_income,
-                'savings_rate': savings_rate,
-                'interest_burden': interest_burden,
-                'score': score,
-                'status': status,
-                'status_key': status_key,
-                'badges': badges,
-                'send_email': step1_data.get('send_email', False),
-                'created_at': datetime.utcnow()
-            }
-            document_id = None
-            if record:
-                record_data['_id'] = record['_id']
-                collection.update_one(
-                    {'_id': record['_id']},
-                    {'$set': {k: v for k, v in record_data.items() if k != '_id'}}
+            document_id = assessment['_id']
+            now = datetime.utcnow()
+            previous = collection.find_one_and_update(
+                {'_id': document_id},
+                {'$set': {
+                    'user_id': current_user.id if current_user.is_authenticated else None,
+                    'session_id': session['sid'],
+                    'step3': {
+                        'debt': debt,
+                        'interest_rate': interest_rate,
+                        'debt_to_income': debt_to_income,
+                        'savings_rate': savings_rate,
+                        'interest_burden': interest_burden,
+                        'score': score,
+                        'status': status,
+                        'status_key': status_key,
+                        'badges': badges
+                    },
+                    'score': score,
+                    'scoring_version': result['scoring_version'],
+                    'lang': lang,
+                    'state': 'completed',
+                    'latest': True,
+                    'completed_at': now,
+                    'updated_at': now
+                }, '$unset': {'expires_at': ''}},
+                return_document=ReturnDocument.BEFORE
+            )
+            if previous is None:
+                # The attempt expired between loading it and saving step 3; nothing was stored
+                current_app.logger.warning(f"Assessment {document_id} expired before step3 was saved for session {session['sid']}")
+                flash(trans('financial_health_missing_step1', lang=lang, default='Please complete step 1 first.'), 'danger')
+                return redirect(url_for('financial_health.step1'))
+            session.pop(ASSESSMENT_SESSION_KEY, None)
+            # The user's previous score leaves the histogram: either this attempt
+            # resubmitted, or the attempt that was latest until now
+            previous_score = previous.get('score') if previous and previous.get('latest') else None
+            if previous_score is None:
+                replaced = collection.find_one_and_update(
+                    {**filter_criteria, 'latest': True, '_id': {'$ne': document_id}},
+                    {'$unset': {'latest': ''}},
+                    projection={'score': 1}
                 )
-                document_id = record['_id']
-            else:
-                record_data['_id'] = str(uuid.uuid4())
-                collection.insert_one(record_data)
-                document_id = record_data['_id']
+                previous_score = replaced.get('score') if replaced else None
 
             current_app.logger.info(f"Step3 data updated/saved to MongoDB with ID {document_id} for session {session['sid']}")
+            try:
+                update_score_distribution(mongo, SCORE_DISTRIBUTION, score, previous_score if isinstance(previous_score, (int, float)) else None)
+            except Exception as e:
+                current_app.logger.warning(f"Score distribution not updated for session {session['sid']}: {str(e)}")
             log_tool_usage(
                 mongo,
                 tool_name='financial_health',
@@ -400,13 +409,10 @@ def step3():
                 try:
                     config = EMAIL_CONFIG["financial_health"]
                     subject = trans(config["subject_key"], lang=lang)
-                    template = config["template"]
-                    send_email(
-                        app=current_app,
-                        logger=current_app.logger,
+                    queue_email(
                         to_email=step1_data['email'],
                         subject=subject,
-                        template_name=template,
+                        template_key="financial_health",
                         data={
                             "first_name": step1_data['first_name'],
                             "score": score,
@@ -428,9 +434,6 @@ def step3():
                     current_app.logger.error(f"Failed to send email: {str(e)}")
                     flash(trans("financial_health_email_failed", lang=lang), "warning")
 
-            session.pop('health_step1', None)
-            session.pop('health_step2', None)
-            session.modified = True
             flash(trans("financial_health_health_completed_success", lang=lang), "success")
             return redirect(url_for('financial_health.dashboard'))
         
@@ -459,7 +462,7 @@ def dashboard():
     try:
         collection = get_mongo_collection()
         filter_criteria = {'user_id': current_user.id} if current_user.is_authenticated else {'session_id': session['sid']}
-        stored_records = list(collection.find({**filter_criteria, 'step': 3}).sort('created_at', -1))
+        stored_records = [assessment_record(doc) for doc in collection.find({**filter_criteria, 'state': 'completed'}).sort('completed_at', -1)]
         if not stored_records:
             latest_record = {}
             records = []
@@ -467,17 +470,9 @@ def dashboard():
             latest_record = stored_records[0]
             records = [(record['_id'], record) for record in stored_records]
 
-        all_records = list(collection.find({'step': 3}))
-        all_scores_for_comparison = [record['score'] for record in all_records if record.get('score') is not None]
-
-        total_users = len(all_scores_for_comparison)
-        rank = 0
-        average_score = 0
-        if all_scores_for_comparison:
-            all_scores_for_comparison.sort(reverse=True)
-            user_score = latest_record.get("score", 0)
-            rank = sum(1 for s in all_scores_for_comparison if s > user_score) + 1
-            average_score = sum(all_scores_for_comparison) / total_users
+        distribution = get_score_distribution(mongo, SCORE_DISTRIBUTION, 'financial_health_scores', {'latest': True})
+        total_users = distribution['total']
+        rank, percentile, average_score = score_rank(distribution, latest_record.get("score") or 0)
 
         insights = []
         tips = [
@@ -516,6 +511,7 @@ def dashboard():
             rank=rank,
             total_users=total_users,
             average_score=average_score,
+            percentile=percentile,
             trans=trans,
             lang=lang
         )
@@ -536,6 +532,7 @@ def dashboard():
             rank=0,
             total_users=0,
             average_score=0,
+            percentile=0,
             trans=trans,
             lang=lang
         ), 500
@@ -5,7 +5,8 @@ from wtforms.validators import DataRequired, Email, Optional
 from flask_wtf.csrf import CSRFProtect, CSRFError
 from flask_login import current_user
 from datetime import datetime
-from mailersend_email import send_email, EMAIL_CONFIG
+from mailersend_email import EMAIL_CONFIG
+from email_outbox import queue_email
 import uuid
 import json
 import os
@@ -520,14 +521,11 @@ def lesson(course_id, lesson_id):
                 if profile.get('send_email') and profile.get('email'):
                     config = EMAIL_CONFIG.get("learning_hub_lesson_completed", {})
                     subject = trans(config.get("subject_key", ""), lang=lang)
-                    template = config.get("template", "")
                     try:
-                        send_email(
-                            app=current_app,
-                            logger=current_app.logger,
+                        queue_email(
                             to_email=profile['email'],
                             subject=subject,
-                            template_name=template,
+                            template_key="learning_hub_lesson_completed",
                             data={
                                 "first_name": profile.get('first_name', ''),
                                 "course_title": trans(course['title_key'], lang=lang),
@@ -538,7 +536,7 @@ def lesson(course_id, lesson_id):
                             },
                             lang=lang
                         )
-                        current_app.logger.info(f"Sent completion email to {profile['email']} for lesson {lesson_id}", extra={'session_id': session.get('sid', 'no-session-id')})
+                        current_app.logger.info(f"Queued completion email to {profile['email']} for lesson {lesson_id}", extra={'session_id': session.get('sid', 'no-session-id')})
                     except Exception as e:
                         current_app.logger.error(f"Failed to send email for lesson {lesson_id}: {str(e)}", extra={'session_id': session.get('sid', 'no-session-id')})
                         flash(trans("email_send_failed", default="Failed to send email notification", lang=lang), "warning")
@@ -4,13 +4,15 @@ from wtforms import StringField, FloatField, BooleanField, SubmitField
 from wtforms.validators import DataRequired, NumberRange, Optional, Email, ValidationError
 from flask_login import current_user
 from translations import trans
-from mailersend_email import send_email, EMAIL_CONFIG
+from mailersend_email import EMAIL_CONFIG
+from email_outbox import queue_email
 from datetime import datetime
 import uuid
 import json
 from models import log_tool_usage  # Import log_tool_usage
 from extensions import mongo
 from session_utils import create_anonymous_session
+from wizard_drafts import get_step, has_steps, save_step, clear_draft
 from app import custom_login_required
 
 net_worth_bp = Blueprint(
@@ -119,7 +121,7 @@ def step1():
         create_anonymous_session()
         logger.debug(f"New anonymous session created with sid: {session['sid']}", extra={'session_id': session['sid']})
     lang = session.get('lang', 'en')
-    form_data = session.get('networth_step1_data', {})
+    form_data = get_step('net_worth', 'step1')
     if current_user.is_authenticated:
         form_data['email'] = form_data.get('email', current_user.email)
         form_data['first_name'] = form_data.get('first_name', current_user.username)
@@ -134,9 +136,7 @@ def step1():
                 mongo=mongo
             )
             if form.validate_on_submit():
-                form_data = form.data.copy()
-                session['networth_step1_data'] = form_data
-                session.modified = True
+                form_data = save_step('net_worth', 'step1', form.data)
                 current_app.logger.info(f"Net worth step1 form data saved for session {session['sid']}: {form_data}")
                 return redirect(url_for('net_worth.step2'))
             else:
@@ -163,7 +163,7 @@ def step2():
         create_anonymous_session()
         logger.debug(f"New anonymous session created with sid: {session['sid']}", extra={'session_id': session['sid']})
     lang = session.get('lang', 'en')
-    if 'networth_step1_data' not in session:
+    if not has_steps('net_worth', 'step1'):
         flash(trans('net_worth_missing_step1', lang=lang, default='Please complete step 1 first.'), 'danger')
         return redirect(url_for('net_worth.step1'))
     form = Step2Form()
@@ -177,14 +177,11 @@ def step2():
                 mongo=mongo
             )
             if form.validate_on_submit():
-                form_data = {
+                form_data = save_step('net_worth', 'step2', {
                     'cash_savings': float(form.cash_savings.data),
                     'investments': float(form.investments.data),
-                    'property': float(form.property.data),
-                    'submit': form.submit.data
-                }
-                session['networth_step2_data'] = form_data
-                session.modified = True
+                    'property': float(form.property.data)
+                })
                 current_app.logger.info(f"Net worth step2 form data saved for session {session['sid']}: {form_data}")
                 return redirect(url_for('net_worth.step3'))
             else:
@@ -211,7 +208,7 @@ def step3():
         create_anonymous_session()
         logger.debug(f"New anonymous session created with sid: {session['sid']}", extra={'session_id': session['sid']})
     lang = session.get('lang', 'en')
-    if 'networth_step2_data' not in session:
+    if not has_steps('net_worth', 'step2'):
         flash(trans('net_worth_missing_step2', lang=lang, default='Please complete step 2 first.'), 'danger')
         return redirect(url_for('net_worth.step1'))
     form = Step3Form()
@@ -225,13 +222,12 @@ def step3():
                 mongo=mongo
             )
             if form.validate_on_submit():
-                step1_data = session.get('networth_step1_data', {})
-                step2_data = session.get('networth_step2_data', {})
+                step1_data = get_step('net_worth', 'step1')
+                step2_data = get_step('net_worth', 'step2')
                 form_data = form.data.copy()
 
-                session['networth_step3_data'] = {'loans': form_data.get('loans', 0) or 0}
-                session.modified = True
-                current_app.logger.info(f"Net worth step3 form data saved for session {session['sid']}: {session['networth_step3_data']}")
+                step3_data = save_step('net_worth', 'step3', {'loans': form_data.get('loans', 0) or 0})
+                current_app.logger.info(f"Net worth step3 form data saved for session {session['sid']}: {step3_data}")
 
                 cash_savings = step2_data.get('cash_savings', 0)
                 investments = step2_data.get('investments', 0)
@@ -281,13 +277,10 @@ def step3():
                     try:
                         config = EMAIL_CONFIG["net_worth"]
                         subject = trans(config["subject_key"], lang=lang)
-                        template = config["template"]
-                        send_email(
-                            app=current_app,
-                            logger=current_app.logger,
+                        queue_email(
                             to_email=email,
                             subject=subject,
-                            template_name=template,
+                            template_key="net_worth",
                             data={
                                 "first_name": net_worth_record['first_name'],
                                 "cash_savings": net_worth_record['cash_savings'],
@@ -361,9 +354,9 @@ def dashboard():
 
         # Reconstruct from session data if no records found
         if not user_data:
-            step1_data = session.get('networth_step1_data', {})
-            step2_data = session.get('networth_step2_data', {})
-            step3_data = session.get('networth_step3_data', {})
+            step1_data = get_step('net_worth', 'step1')
+            step2_data = get_step('net_worth', 'step2')
+            step3_data = get_step('net_worth', 'step3')
 
             if step1_data and step2_data:
                 current_app.logger.info(f"Constructing record from session data for session {session['sid']}")
@@ -428,10 +421,7 @@ def dashboard():
                 insights.append(trans("net_worth_insight_negative_net_worth", lang=lang))
 
         if user_data:
-            session.pop('networth_step1_data', None)
-            session.pop('networth_step2_data', None)
-            session.pop('networth_step3_data', None)
-            session.modified = True
+            clear_draft('net_worth')
 
         current_app.logger.info(f"Dashboard rendering with {len(records)} records for session {session['sid']}")
         return render_template(
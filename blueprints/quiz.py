@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from flask_wtf import FlaskForm
 from wtforms import StringField, SelectField, BooleanField, SubmitField, RadioField
 from wtforms.validators import DataRequired, Email, Optional
@@ -7,11 +7,13 @@ from uuid import uuid4
 from datetime import datetime
 import json
 import logging
-from translations import trans
-from mailersend_email import send_email, EMAIL_CONFIG
+from translations import trans, available_languages
+from mailersend_email import EMAIL_CONFIG
+from email_outbox import queue_email
 from extensions import mongo
 from models import log_tool_usage
 from session_utils import create_anonymous_session
+from wizard_drafts import get_step, has_steps, save_step, clear_draft
 from app import custom_login_required
 
 # Configure logging
@@ -44,8 +46,8 @@ class QuizStep1Form(FlaskForm):
         self.send_email.label.text = trans('core_send_email', default='Send Email', lang=lang)
         self.submit.label.text = trans('quiz_start_quiz', default='Start Quiz', lang=lang)
         self.lang.choices = [
-            ('en', trans('core_language_en', default='English', lang=lang)),
-            ('ha', trans('core_language_ha', default='Hausa', lang=lang))
+            (code, trans(f'core_language_{code}', lang=lang))
+            for code in available_languages()
         ]
 
 # Form for Step 2a: Questions 1-5
@@ -105,6 +107,10 @@ class QuizStep2bForm(FlaskForm):
         self.back.label.text = trans('core_back', default='Back', lang=lang)
 
 # Helper Functions
+def get_quiz_data():
+    """Merge the stored quiz draft steps (personal info and answers) into one dict."""
+    return {**get_step('quiz', 'step1'), **get_step('quiz', 'step2a'), **get_step('quiz', 'step2b')}
+
 def calculate_score(answers):
     score = 0
     positive_questions = ['question_1', 'question_2', 'question_3', 'question_4', 'question_5', 'question_7', 'question_8', 'question_9', 'question_10']
@@ -188,7 +194,7 @@ def step1():
         logger.debug(f"New anonymous session created with sid: {session['sid']}", extra={'session_id': session['sid']})
     lang = session.get('lang', 'en')
     course_id = request.args.get('course_id', 'financial_quiz')
-    form_data = session.get('quiz_data', {})
+    form_data = get_step('quiz', 'step1')
     if current_user.is_authenticated:
         form_data['email'] = form_data.get('email', current_user.email)
         form_data['first_name'] = form_data.get('first_name', current_user.username)
@@ -211,12 +217,13 @@ def step1():
                 action='step1_submit'
             )
             if form.validate_on_submit():
-                session['quiz_data'] = {
+                clear_draft('quiz')
+                save_step('quiz', 'step1', {
                     'first_name': form.first_name.data,
                     'email': form.email.data,
                     'lang': form.lang.data or 'en',
                     'send_email': form.send_email.data
-                }
+                })
                 session['lang'] = form.lang.data or 'en'
                 session.modified = True
                 logger.info(f"Quiz step 1 validated successfully for session {session['sid']}", extra={'session_id': session['sid']})
@@ -241,12 +248,13 @@ def step1():
 @custom_login_required
 def step2a():
     """Handle quiz step 2a form (questions 1-5)."""
-    if 'sid' not in session or 'quiz_data' not in session:
-        logger.warning(f"Session expired or missing quiz_data for session {session.get('sid', 'unknown')}", extra={'session_id': session.get('sid', 'unknown')})
+    if 'sid' not in session or not has_steps('quiz', 'step1'):
+        logger.warning(f"Session expired or missing quiz draft for session {session.get('sid', 'unknown')}", extra={'session_id': session.get('sid', 'unknown')})
         flash(trans('session_expired', default='Session expired. Please start again.', lang=session.get('lang', 'en')), 'danger')
         return redirect(url_for('quiz.step1', course_id=request.args.get('course_id', 'financial_quiz')))
     
-    lang = session['quiz_data'].get('lang', 'en')
+    quiz_data = get_quiz_data()
+    lang = quiz_data.get('lang', 'en')
     course_id = request.args.get('course_id', 'financial_quiz')
     form = QuizStep2aForm(lang=lang, formdata=request.form if request.method == 'POST' else None)
     
@@ -278,14 +286,7 @@ def step2a():
             if form.back.data:
                 return redirect(url_for('quiz.step1', course_id=course_id))
             if form.validate_on_submit():
-                session['quiz_data'].update({
-                    'question_1': form.question_1.data,
-                    'question_2': form.question_2.data,
-                    'question_3': form.question_3.data,
-                    'question_4': form.question_4.data,
-                    'question_5': form.question_5.data,
-                })
-                session.modified = True
+                save_step('quiz', 'step2a', form.data)
                 logger.info(f"Quiz step 2a validated successfully for session {session['sid']}", extra={'session_id': session['sid']})
                 return redirect(url_for('quiz.step2b', course_id=course_id))
             else:
@@ -294,8 +295,8 @@ def step2a():
         
         # Pre-fill form with session data if available
         for q in questions:
-            if q['id'] in session.get('quiz_data', {}):
-                getattr(form, q['id']).data = session['quiz_data'][q['id']]
+            if q['id'] in quiz_data:
+                getattr(form, q['id']).data = quiz_data[q['id']]
         
         return render_template(
             'QUIZ/quiz_step.html',
@@ -315,12 +316,13 @@ def step2a():
 @custom_login_required
 def step2b():
     """Handle quiz step 2b form (questions 6-10) and store results in MongoDB."""
-    if 'sid' not in session or 'quiz_data' not in session:
-        logger.warning(f"Session expired or missing quiz_data for session {session.get('sid', 'unknown')}", extra={'session_id': session.get('sid', 'unknown')})
+    if 'sid' not in session or not has_steps('quiz', 'step1'):
+        logger.warning(f"Session expired or missing quiz draft for session {session.get('sid', 'unknown')}", extra={'session_id': session.get('sid', 'unknown')})
         flash(trans('session_expired', default='Session expired. Please start again.', lang=session.get('lang', 'en')), 'danger')
         return redirect(url_for('quiz.step1', course_id=request.args.get('course_id', 'financial_quiz')))
     
-    lang = session['quiz_data'].get('lang', 'en')
+    quiz_data = get_quiz_data()
+    lang = quiz_data.get('lang', 'en')
     course_id = request.args.get('course_id', 'financial_quiz')
     form = QuizStep2bForm(lang=lang, formdata=request.form if request.method == 'POST' else None)
     
@@ -352,18 +354,11 @@ def step2b():
             if form.back.data:
                 return redirect(url_for('quiz.step2a', course_id=course_id))
             if form.validate_on_submit():
-                session['quiz_data'].update({
-                    'question_6': form.question_6.data,
-                    'question_7': form.question_7.data,
-                    'question_8': form.question_8.data,
-                    'question_9': form.question_9.data,
-                    'question_10': form.question_10.data,
-                })
-                session.modified = True
+                quiz_data.update(save_step('quiz', 'step2b', form.data))
                 logger.info(f"Quiz step 2b validated successfully for session {session['sid']}", extra={'session_id': session['sid']})
                 
                 # Calculate results
-                answers = [session['quiz_data'].get(f'question_{i}') for i in range(1, 11)]
+                answers = [quiz_data.get(f'question_{i}') for i in range(1, 11)]
                 score = calculate_score(answers)
                 personality = assign_personality(score, lang)
                 badges = assign_badges(score, lang)
@@ -375,9 +370,9 @@ def step2b():
                     'user_id': current_user.id if current_user.is_authenticated else None,
                     'session_id': session['sid'],
                     'created_at': created_at,
-                    'first_name': session['quiz_data'].get('first_name', ''),
-                    'email': session['quiz_data'].get('email', ''),
-                    'send_email': session['quiz_data'].get('send_email', False),
+                    'first_name': quiz_data.get('first_name', ''),
+                    'email': quiz_data.get('email', ''),
+                    'send_email': quiz_data.get('send_email', False),
                     'personality': personality['name'],
                     'score': score,
                     'badges': badges,
@@ -395,17 +390,14 @@ def step2b():
                 results['created_at'] = datetime.fromisoformat(created_at)  # Convert here to ensure datetime for session and email
                 
                 # Send email if user opted in
-                if session['quiz_data'].get('send_email') and session['quiz_data'].get('email'):
+                if quiz_data.get('send_email') and quiz_data.get('email'):
                     try:
                         config = EMAIL_CONFIG["quiz"]
                         subject = trans(config["subject_key"], default='Your Financial Quiz Results', lang=lang)
-                        template = config["template"]
-                        send_email(
-                            app=current_app,
-                            logger=current_app.logger,
-                            to_email=session['quiz_data']['email'],
+                        queue_email(
+                            to_email=quiz_data['email'],
                             subject=subject,
-                            template_name=template,
+                            template_key="quiz",
                             data={
                                 "first_name": results['first_name'],
                                 "score": results['score'],
@@ -423,9 +415,8 @@ def step2b():
                         logger.error(f"Failed to send quiz results email: {str(e)}", extra={'session_id': session['sid']})
                         flash(trans("email_send_failed", default="Failed to send email.", lang=lang), "warning")
                 
-                # Store results in session for immediate display
-                session['quiz_results'] = results
-                session.modified = True
+                # The result is stored, so the draft answers are no longer needed
+                clear_draft('quiz')
                 
                 return redirect(url_for('quiz.results', course_id=course_id))
             else:
@@ -434,8 +425,8 @@ def step2b():
         
         # Pre-fill form with session data if available
         for q in questions:
-            if q['id'] in session.get('quiz_data', {}):
-                getattr(form, q['id']).data = session['quiz_data'][q['id']]
+            if q['id'] in quiz_data:
+                getattr(form, q['id']).data = quiz_data[q['id']]
         
         return render_template(
             'QUIZ/quiz_step.html',
@@ -470,35 +461,33 @@ def results():
             session_id=session['sid'],
             action='results_view'
         )
-        # Try to fetch results from session first
-        results = session.get('quiz_results')
-        result_source = 'session' if results else 'none'
+        results = None
+        result_source = 'none'
         
+        # Fetch from MongoDB using quiz_result_id or user_id
+        if 'quiz_result_id' in session:
+            quiz_result = mongo.db.quiz_responses.find_one({'_id': session['quiz_result_id']})
+            if quiz_result:
+                results = quiz_result
+                result_source = 'quiz_result_id'
         if not results:
-            # Fetch from MongoDB using quiz_result_id or user_id
-            if 'quiz_result_id' in session:
-                quiz_result = mongo.db.quiz_responses.find_one({'_id': session['quiz_result_id']})
-                if quiz_result:
-                    results = quiz_result
-                    result_source = 'quiz_result_id'
-            if not results:
-                # Fallback to latest result by user_id
-                quiz_result = mongo.db.quiz_responses.find_one(
-                    {'user_id': current_user.id} if current_user.is_authenticated else {'session_id': session['sid']},
-                    sort=[('created_at', -1)]
-                )
-                if quiz_result:
-                    results = quiz_result
-                    result_source = 'user_id' if current_user.is_authenticated else 'session_id'
-            if not results and current_user.is_authenticated and current_user.email:
-                # Fallback to email for authenticated users
-                quiz_result = mongo.db.quiz_responses.find_one(
-                    {'email': current_user.email},
-                    sort=[('created_at', -1)]
-                )
-                if quiz_result:
-                    results = quiz_result
-                    result_source = 'email'
+            # Fallback to latest result by user_id
+            quiz_result = mongo.db.quiz_responses.find_one(
+                {'user_id': current_user.id} if current_user.is_authenticated else {'session_id': session['sid']},
+                sort=[('created_at', -1)]
+            )
+            if quiz_result:
+                results = quiz_result
+                result_source = 'user_id' if current_user.is_authenticated else 'session_id'
+        if not results and current_user.is_authenticated and current_user.email:
+            # Fallback to email for authenticated users
+            quiz_result = mongo.db.quiz_responses.find_one(
+                {'email': current_user.email},
+                sort=[('created_at', -1)]
+            )
+            if quiz_result:
+                results = quiz_result
+                result_source = 'email'
         
         if not results:
             logger.warning(f"No quiz results found for session {session['sid']}", extra={'session_id': session['sid']})
@@ -523,8 +512,7 @@ def results():
             results['created_at'] = None
         
         # Clear session data
-        session.pop('quiz_data', None)
-        session.pop('quiz_results', None)
+        clear_draft('quiz')
         session.pop('quiz_result_id', None)
         session.modified = True
         logger.info(f"Displaying quiz results for session {session['sid']} from {result_source}, session data cleared", extra={'session_id': session['sid']})
@@ -0,0 +1,95 @@
+import click
+from flask import current_app
+from extensions import mongo
+from db_indexes import reconcile_indexes, INDEX_MANIFEST, SESSION_INDEX_MANIFEST
+from migrations import (
+    migrate_bill_due_dates, migrate_user_ids, migrate_financial_health_assessments,
+    rescore_financial_health, migrate_json_fields, migrate_tool_usage_timeseries,
+    RESCORE_CHUNK_SIZE, MIGRATION_BATCH_SIZE
+)
+from health_scoring import FORMULA_VERSION
+from models import rebuild_score_distribution
+from rollups import refresh_rollups
+from tool_usage_store import archive_tool_usage
+
+def register_cli(app):
+    """Register maintenance commands on the Flask CLI (flask --app app <command>)."""
+
+    @app.cli.command('indexes')
+    @click.option('--dry-run', is_flag=True, help='Only report, do not create missing indexes.')
+    @click.option('--drop-unmanaged', is_flag=True, help='Drop indexes that are not in the manifest.')
+    def indexes(dry_run, drop_unmanaged):
+        """Reconcile MongoDB indexes with the index manifest."""
+        report = reconcile_indexes(mongo.db, create=not dry_run, drop_unmanaged=drop_unmanaged and not dry_run)
+        if current_app.config.get('SESSION_TYPE') == 'mongodb':
+            session_db = current_app.config['SESSION_MONGODB'][current_app.config['SESSION_MONGODB_DB']]
+            report.update(reconcile_indexes(session_db, create=not dry_run, drop_unmanaged=drop_unmanaged and not dry_run, manifest=SESSION_INDEX_MANIFEST))
+        for collection_name, result in report.items():
+            lines = [f"  {label}: {', '.join(names)}" for label, names in result.items() if names]
+            if lines:
+                click.echo(collection_name)
+                click.echo('\n'.join(lines))
+        click.echo('Index reconciliation complete')
+
+    @app.cli.command('migrate-bill-due-dates')
+    def migrate_bill_due_dates_command():
+        """Convert string bill due dates to BSON dates."""
+        converted = migrate_bill_due_dates(mongo.db)
+        click.echo(f"Converted {converted} bill due dates")
+
+    @app.cli.command('migrate-user-ids')
+    def migrate_user_ids_command():
+        """Convert numeric user ids to strings and enforce a unique id index."""
+        converted = migrate_user_ids(mongo.db)
+        report = reconcile_indexes(mongo.db, include_usage=False, manifest={'users': INDEX_MANIFEST['users']})
+        click.echo(f"Converted {converted} user ids")
+        if report['users']['conflicting']:
+            click.echo(f"Conflicting users indexes: {', '.join(report['users']['conflicting'])}")
+
+    @app.cli.command('migrate-financial-health')
+    @click.option('--force', is_flag=True, help='Run again even if the migration was recorded as done.')
+    def migrate_financial_health_command(force):
+        """Fold per-step financial health records into assessment documents."""
+        converted = migrate_financial_health_assessments(mongo.db, force=force)
+        click.echo(f"Converted {converted} financial health records")
+
+    @app.cli.command('rescore-financial-health')
+    @click.option('--version', 'version', type=int, default=FORMULA_VERSION, show_default=True, help='Scoring formula version to apply.')
+    @click.option('--chunk-size', type=int, default=RESCORE_CHUNK_SIZE, show_default=True, help='Assessments per read and bulk write.')
+    def rescore_financial_health_command(version, chunk_size):
+        """Re-score completed financial health assessments with a formula version."""
+        counts = rescore_financial_health(mongo.db, version=version, chunk_size=chunk_size)
+        if counts['rescored']:
+            rebuild_score_distribution(mongo, 'financial_health', 'financial_health_scores', {'latest': True})
+        click.echo(f"Re-scored {counts['rescored']} financial health assessments with formula v{version}, skipped {counts['skipped']} without income")
+
+    @app.cli.command('migrate-json-fields')
+    @click.option('--batch-size', type=int, default=MIGRATION_BATCH_SIZE, show_default=True, help='Documents per read and bulk write.')
+    def migrate_json_fields_command(batch_size):
+        """Convert JSON string badges, insights, tips and progress fields to native values."""
+        converted = migrate_json_fields(mongo.db, batch_size=batch_size)
+        for collection_name, count in converted.items():
+            click.echo(f"{collection_name}: converted {count} documents")
+
+    @app.cli.command('rollups')
+    @click.option('--rebuild', is_flag=True, help='Recompute all rollups from the raw collections.')
+    def rollups_command(rebuild):
+        """Refresh the admin overview usage rollups."""
+        since = refresh_rollups(mongo.db, rebuild=rebuild)
+        click.echo(f"Rollups refreshed from {since.isoformat() if since else 'the beginning'}")
+
+    @app.cli.command('migrate-tool-usage-timeseries')
+    @click.option('--batch-size', type=int, default=MIGRATION_BATCH_SIZE, show_default=True, help='Events per read and insert.')
+    def migrate_tool_usage_timeseries_command(batch_size):
+        """Convert tool_usage to a time-series collection, archiving events past retention."""
+        copied = migrate_tool_usage_timeseries(mongo.db, batch_size=batch_size)
+        report = reconcile_indexes(mongo.db, include_usage=False, manifest={'tool_usage': INDEX_MANIFEST['tool_usage']})
+        click.echo(f"Copied {copied} tool usage events")
+        if report['tool_usage']['created']:
+            click.echo(f"Created tool_usage indexes: {', '.join(report['tool_usage']['created'])}")
+
+    @app.cli.command('archive-tool-usage')
+    def archive_tool_usage_command():
+        """Archive tool usage days that are about to expire to gzipped NDJSON files."""
+        written = archive_tool_usage(mongo.db)
+        click.echo(f"Wrote {len(written)} tool usage archives")
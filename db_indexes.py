@@ -0,0 +1,237 @@
+import os
+import logging
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Set up logging
+logger = logging.getLogger('ficore_app')
+
+# Retention for ephemeral collections, enforced by TTL indexes
+DAY_SECONDS = 24 * 60 * 60
+EMAIL_OUTBOX_SENT_RETENTION = int(os.environ.get('EMAIL_OUTBOX_SENT_RETENTION_DAYS', 7)) * DAY_SECONDS
+EMAIL_OUTBOX_DEAD_RETENTION = int(os.environ.get('EMAIL_OUTBOX_DEAD_RETENTION_DAYS', 30)) * DAY_SECONDS
+BILL_REMINDER_RETENTION = int(os.environ.get('BILL_REMINDER_RETENTION_DAYS', 90)) * DAY_SECONDS
+
+# Every index the app relies on, keyed by collection. Key order follows the
+# equality fields first and the sort field last so dashboards can read the
+# newest records straight from the index.
+INDEX_MANIFEST = {
+    'users': [
+        {'keys': [('email', ASCENDING)], 'unique': True},
+        {'keys': [('referral_code', ASCENDING)], 'unique': True},
+        {'keys': [('id', ASCENDING)], 'unique': True},
+        {'keys': [('username', ASCENDING)]},
+        {'keys': [('google_id', ASCENDING)], 'sparse': True},
+        {'keys': [('referred_by_id', ASCENDING)]},
+        {'keys': [('created_at', DESCENDING)]}
+    ],
+    'reset_tokens': [
+        {'keys': [('token', ASCENDING)], 'unique': True},
+        {'keys': [('expires_at', ASCENDING)], 'expireAfterSeconds': 0}
+    ],
+    'courses': [
+        {'keys': [('id', ASCENDING)], 'unique': True}
+    ],
+    'content_metadata': [
+        {'keys': [('course_id', ASCENDING), ('lesson_id', ASCENDING)], 'unique': True}
+    ],
+    'financial_health_scores': [
+        {'keys': [('user_id', ASCENDING), ('state', ASCENDING), ('completed_at', DESCENDING)]},
+        {'keys': [('session_id', ASCENDING), ('state', ASCENDING), ('completed_at', DESCENDING)]},
+        # Only attempts in progress carry expires_at
+        {'keys': [('expires_at', ASCENDING)], 'expireAfterSeconds': 0}
+    ],
+    'budgets': [
+        {'keys': [('user_id', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('session_id', ASCENDING), ('created_at', DESCENDING)]}
+    ],
+    'bills': [
+        {'keys': [('user_id', ASCENDING)]},
+        {'keys': [('session_id', ASCENDING)]},
+        {'keys': [('user_email', ASCENDING)]},
+        {'keys': [('status', ASCENDING), ('due_date', ASCENDING)]},
+        {'keys': [('due_date', ASCENDING)]},
+        {'keys': [('send_email', ASCENDING), ('user_email', ASCENDING)]}
+    ],
+    'email_outbox': [
+        {'keys': [('status', ASCENDING), ('next_attempt_at', ASCENDING)]},
+        {'keys': [('status', ASCENDING), ('locked_at', ASCENDING)]},
+        {'keys': [('sent_at', ASCENDING)], 'expireAfterSeconds': EMAIL_OUTBOX_SENT_RETENTION},
+        {'keys': [('dead_at', ASCENDING)], 'expireAfterSeconds': EMAIL_OUTBOX_DEAD_RETENTION}
+    ],
+    'bill_reminders': [
+        {'keys': [('email', ASCENDING), ('sent_at', DESCENDING)]},
+        {'keys': [('sent_at', ASCENDING)], 'expireAfterSeconds': BILL_REMINDER_RETENTION}
+    ],
+    'net_worth_data': [
+        {'keys': [('user_id', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('session_id', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('email', ASCENDING), ('created_at', DESCENDING)]}
+    ],
+    'emergency_funds': [
+        {'keys': [('user_id', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('session_id', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('email', ASCENDING), ('created_at', DESCENDING)]}
+    ],
+    'quiz_responses': [
+        {'keys': [('user_id', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('session_id', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('email', ASCENDING), ('created_at', DESCENDING)]}
+    ],
+    'learning_materials': [
+        {'keys': [('user_id', ASCENDING), ('course_id', ASCENDING)]},
+        {'keys': [('session_id', ASCENDING), ('course_id', ASCENDING)]},
+        {'keys': [('type', ASCENDING)]}
+    ],
+    # Collections written through the models helpers and read by the general dashboard
+    'financial_health': [
+        {'keys': [('user_id', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('session_id', ASCENDING), ('created_at', DESCENDING)]}
+    ],
+    'net_worth': [
+        {'keys': [('user_id', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('session_id', ASCENDING), ('created_at', DESCENDING)]}
+    ],
+    'quiz_results': [
+        {'keys': [('user_id', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('session_id', ASCENDING), ('created_at', DESCENDING)]}
+    ],
+    'learning_progress': [
+        {'keys': [('user_id', ASCENDING), ('course_id', ASCENDING)], 'unique': True},
+        {'keys': [('session_id', ASCENDING), ('course_id', ASCENDING)], 'unique': True}
+    ],
+    'wizard_drafts': [
+        {'keys': [('expires_at', ASCENDING)], 'expireAfterSeconds': 0}
+    ],
+    'feedback': [
+        {'keys': [('user_id', ASCENDING)]},
+        {'keys': [('session_id', ASCENDING)]}
+    ],
+    # Time-series collection (see tool_usage_store); indexes on the
+    # user_id/session_id measurement fields need MongoDB 6.0+
+    'tool_usage': [
+        {'keys': [('meta.tool_name', ASCENDING), ('meta.action', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('meta.tool_name', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('created_at', DESCENDING)]},
+        {'keys': [('user_id', ASCENDING)]},
+        {'keys': [('session_id', ASCENDING)]}
+    ],
+    'usage_rollups': [
+        {'keys': [('tool_name', ASCENDING), ('hour', DESCENDING)]},
+        {'keys': [('hour', DESCENDING)]}
+    ]
+}
+
+# Flask-Session documents live in the session database (SESSION_MONGODB_DB);
+# MongoDB removes them once 'expiration' passes
+SESSION_INDEX_MANIFEST = {
+    'sessions': [
+        {'keys': [('id', ASCENDING)]},
+        {'keys': [('expiration', ASCENDING)], 'expireAfterSeconds': 0}
+    ]
+}
+
+# Options compared when deciding whether an existing index matches the manifest
+INDEX_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+def index_model(spec):
+    """Build a pymongo IndexModel from a manifest entry."""
+    options = {k: v for k, v in spec.items() if k != 'keys'}
+    return IndexModel(spec['keys'], **options)
+
+def index_key(key):
+    """Normalize an index key specification so it can be compared."""
+    return tuple((field, int(direction) if isinstance(direction, float) else direction) for field, direction in key)
+
+def index_options(info):
+    """Extract the options that matter for matching from an index document."""
+    # Compare by identity so an expireAfterSeconds of 0 is not mistaken for False
+    return {k: info[k] for k in INDEX_OPTIONS if info.get(k) is not None and info.get(k) is not False}
+
+def ttl_only_differs(info, wanted):
+    """True when an existing TTL index differs from the wanted one only in expireAfterSeconds."""
+    if 'expireAfterSeconds' not in info or 'expireAfterSeconds' not in wanted:
+        return False
+    existing = {k: v for k, v in index_options(info).items() if k != 'expireAfterSeconds'}
+    target = {k: v for k, v in index_options(wanted).items() if k != 'expireAfterSeconds'}
+    return existing == target
+
+def unused_indexes(collection):
+    """Return names of indexes with no recorded accesses since the server started."""
+    try:
+        return [
+            stat['name'] for stat in collection.aggregate([{'$indexStats': {}}])
+            if stat['name'] != '_id_' and stat.get('accesses', {}).get('ops', 0) == 0
+        ]
+    except OperationFailure as e:
+        logger.warning(f"Index usage statistics unavailable for {collection.name}: {str(e)}")
+        return []
+
+def reconcile_indexes(db, create=True, drop_unmanaged=False, include_usage=True, manifest=None):
+    """
+    Compare the indexes in the database with the manifest.
+
+    Args:
+        db: pymongo Database
+        create (bool): Create indexes that are missing
+        drop_unmanaged (bool): Drop indexes that are not in the manifest
+        include_usage (bool): Report indexes unused since server start ($indexStats)
+        manifest (dict): Collection name to index specs, defaults to INDEX_MANIFEST
+
+    Returns:
+        dict: Per-collection lists of 'missing', 'created', 'failed', 'updated',
+        'conflicting', 'unmanaged', 'dropped' and 'unused' index names
+    """
+    manifest = manifest or INDEX_MANIFEST
+    report = {}
+    for collection_name, specs in manifest.items():
+        collection = db[collection_name]
+        existing = collection.index_information()
+        existing_by_key = {index_key(info['key']): (name, info) for name, info in existing.items()}
+        result = {'missing': [], 'created': [], 'failed': [], 'updated': [], 'conflicting': [], 'unmanaged': [], 'dropped': [], 'unused': []}
+        managed = {'_id_'}
+        to_create = []
+        for spec in specs:
+            model = index_model(spec)
+            wanted = model.document
+            key = index_key(wanted['key'].items())
+            if key in existing_by_key:
+                name, info = existing_by_key[key]
+                managed.add(name)
+                if index_options(info) != index_options(wanted):
+                    if create and ttl_only_differs(info, wanted):
+                        # Retention changed: adjust the TTL in place instead of rebuilding
+                        db.command('collMod', collection_name, index={'name': name, 'expireAfterSeconds': wanted['expireAfterSeconds']})
+                        result['updated'].append(name)
+                    else:
+                        result['conflicting'].append(name)
+                continue
+            result['missing'].append(wanted['name'])
+            managed.add(wanted['name'])
+            to_create.append(model)
+        if create and to_create:
+            try:
+                result['created'] = collection.create_indexes(to_create)
+            except OperationFailure as e:
+                # createIndexes is all or nothing; retry one by one so a spec the
+                # server rejects (e.g. a time-series index it does not support)
+                # does not hold back the others
+                logger.warning(f"Creating indexes on {collection_name} together failed, retrying one at a time: {str(e)}")
+                for model in to_create:
+                    name = model.document['name']
+                    try:
+                        result['created'] += collection.create_indexes([model])
+                    except OperationFailure as e:
+                        logger.error(f"Failed to create index {name} on {collection_name}: {str(e)}")
+                        result['failed'].append(name)
+        result['unmanaged'] = [name for name in existing if name not in managed]
+        if drop_unmanaged:
+            for name in result['unmanaged']:
+                collection.drop_index(name)
+                result['dropped'].append(name)
+        if include_usage:
+            result['unused'] = [name for name in unused_indexes(collection) if name not in result['created'] + result['dropped']]
+        report[collection_name] = result
+        if result['missing'] or result['updated'] or result['conflicting'] or result['unmanaged']:
+            logger.info(f"Indexes on {collection_name}: missing={result['missing']}, created={result['created']}, failed={result['failed']}, updated={result['updated']}, conflicting={result['conflicting']}, unmanaged={result['unmanaged']}, dropped={result['dropped']}")
+    return report
@@ -0,0 +1,145 @@
+import os
+import uuid
+import random
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from pymongo import ReturnDocument
+from extensions import mongo
+from mailersend_email import send_email, EMAIL_CONFIG, email_batch
+
+# Set up logging
+logger = logging.getLogger('ficore_app')
+
+# Dispatch settings
+OUTBOX_CONCURRENCY = int(os.environ.get('EMAIL_OUTBOX_CONCURRENCY', 4))
+OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 20))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+OUTBOX_BACKOFF_SECONDS = int(os.environ.get('EMAIL_OUTBOX_BACKOFF_SECONDS', 30))
+OUTBOX_MAX_BACKOFF_SECONDS = 3600
+OUTBOX_LOCK_TIMEOUT = timedelta(minutes=10)
+
+def queue_email(to_email, subject, template_key, data=None, lang='en'):
+    """
+    Add an email to the outbox; the dispatcher job sends it in the background.
+
+    Args:
+        to_email (str): Recipient's email address
+        subject (str): Email subject
+        template_key (str): Key in EMAIL_CONFIG (e.g., 'budget', 'quiz')
+        data (dict): Template data, must be storable in MongoDB
+        lang (str): Language code
+
+    Returns:
+        str: ID of the queued message
+    """
+    if template_key not in EMAIL_CONFIG:
+        raise ValueError(f"Template key '{template_key}' not found in EMAIL_CONFIG. Valid keys: {list(EMAIL_CONFIG.keys())}")
+    if not to_email:
+        raise ValueError("Missing required field: to_email")
+    now = datetime.utcnow()
+    message = {
+        '_id': str(uuid.uuid4()),
+        'to_email': to_email,
+        'subject': subject,
+        'template_key': template_key,
+        'data': data or {},
+        'lang': lang,
+        'status': 'pending',
+        'attempts': 0,
+        'next_attempt_at': now,
+        'created_at': now,
+        'last_error': None
+    }
+    try:
+        mongo.db.email_outbox.insert_one(message)
+        current_app.logger.info(f"Queued {template_key} email to {to_email}", extra={'outbox_id': message['_id']})
+        return message['_id']
+    except Exception as e:
+        current_app.logger.error(f"Failed to queue {template_key} email to {to_email}: {str(e)}")
+        raise
+
+def claim_message(db, now):
+    """Atomically take the next due message, including ones left locked by a crashed run."""
+    return db.email_outbox.find_one_and_update(
+        {'$or': [
+            {'status': 'pending', 'next_attempt_at': {'$lte': now}},
+            {'status': 'sending', 'locked_at': {'$lt': now - OUTBOX_LOCK_TIMEOUT}}
+        ]},
+        {'$set': {'status': 'sending', 'locked_at': now}},
+        sort=[('next_attempt_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def backoff_delay(attempts):
+    """Exponential backoff with jitter for the given number of failed attempts."""
+    delay = min(OUTBOX_BACKOFF_SECONDS * (2 ** (attempts - 1)), OUTBOX_MAX_BACKOFF_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.9, 1.1))
+
+def deliver(app, message):
+    """Render and send one outbox message; returns the error or None."""
+    try:
+        with app.test_request_context(base_url=app.config.get('BASE_URL', 'http://localhost:5000')):
+            send_email(
+                app=app,
+                logger=app.logger,
+                to_email=message['to_email'],
+                subject=message['subject'],
+                template_key=message['template_key'],
+                data=message.get('data') or {},
+                lang=message.get('lang', 'en'),
+                job_id=f"outbox-{message['_id']}"
+            )
+        return None
+    except Exception as e:
+        return e
+
+def record_result(db, message, error):
+    """Mark a message sent, schedule a retry, or dead-letter it after the last attempt."""
+    now = datetime.utcnow()
+    if error is None:
+        db.email_outbox.update_one(
+            {'_id': message['_id']},
+            {'$set': {'status': 'sent', 'sent_at': now, 'last_error': None}, '$unset': {'locked_at': ''}}
+        )
+        return 'sent'
+    attempts = message.get('attempts', 0) + 1
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        db.email_outbox.update_one(
+            {'_id': message['_id']},
+            {'$set': {'status': 'dead', 'attempts': attempts, 'dead_at': now, 'last_error': str(error)}, '$unset': {'locked_at': ''}}
+        )
+        logger.error(f"Email {message['_id']} to {message['to_email']} dead-lettered after {attempts} attempts: {str(error)}")
+        return 'dead'
+    db.email_outbox.update_one(
+        {'_id': message['_id']},
+        {'$set': {'status': 'pending', 'attempts': attempts, 'next_attempt_at': now + backoff_delay(attempts), 'last_error': str(error)}, '$unset': {'locked_at': ''}}
+    )
+    logger.warning(f"Email {message['_id']} to {message['to_email']} failed (attempt {attempts}), retrying later: {str(error)}")
+    return 'retry'
+
+def dispatch_outbox():
+    """Drain due outbox messages with bounded parallelism."""
+    app = current_app._get_current_object()
+    db = mongo.db
+    counts = {'sent': 0, 'retry': 0, 'dead': 0}
+    with email_batch(), ThreadPoolExecutor(max_workers=OUTBOX_CONCURRENCY) as executor:
+        while True:
+            now = datetime.utcnow()
+            batch = []
+            while len(batch) < OUTBOX_BATCH_SIZE:
+                message = claim_message(db, now)
+                if message is None:
+                    break
+                batch.append(message)
+            if not batch:
+                break
+            errors = executor.map(lambda message: deliver(app, message), batch)
+            for message, error in zip(batch, errors):
+                counts[record_result(db, message, error)] += 1
+            if len(batch) < OUTBOX_BATCH_SIZE:
+                break
+    if any(counts.values()):
+        logger.info(f"Email outbox dispatched: sent={counts['sent']}, retry={counts['retry']}, dead={counts['dead']}")
+    return counts
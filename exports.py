@@ -0,0 +1,164 @@
+import io
+import os
+import csv
+import json
+import zlib
+import logging
+from models import get_db, to_dict_tool_usage
+
+# Set up logging
+logger = logging.getLogger('ficore_app')
+
+# Exports are read from the cursor and written out this many rows at a time,
+# so memory use stays flat however many rows match
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 2000))
+
+# Tool usage export columns: (field, CSV header)
+TOOL_USAGE_COLUMNS = [
+    ('id', 'ID'),
+    ('user_id', 'User ID'),
+    ('session_id', 'Session ID'),
+    ('tool_name', 'Tool Name'),
+    ('action', 'Action'),
+    ('created_at', 'Created At')
+]
+
+# Supported formats: (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
+def iter_tool_usage_batches(mongo, filters, batch_size=EXPORT_BATCH_SIZE, collection='tool_usage'):
+    """Yield lists of raw tool usage documents from a batched, projected cursor."""
+    # 'meta' holds tool_name and action; older documents keep them at the top level
+    projection = {field: 1 for field, _ in TOOL_USAGE_COLUMNS}
+    projection.update({'meta': 1, '_id': 0})
+    cursor = get_db(mongo)[collection].find(filters, projection).sort('created_at', 1).batch_size(batch_size)
+    batch = []
+    for record in cursor:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def csv_chunks(batches):
+    """Encode batches of tool usage documents as CSV, one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for _, header in TOOL_USAGE_COLUMNS])
+    for batch in batches:
+        for record in batch:
+            log = to_dict_tool_usage(record)
+            writer.writerow([
+                log['id'],
+                log['user_id'] or 'anonymous',
+                log['session_id'],
+                log['tool_name'],
+                log['action'] or 'N/A',
+                log['created_at'] or 'N/A'
+            ])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    # Only the header is left when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def ndjson_chunks(batches):
+    """Encode batches of tool usage documents as newline-delimited JSON."""
+    for batch in batches:
+        yield ''.join(json.dumps(to_dict_tool_usage(record)) + '\n' for record in batch).encode('utf-8')
+
+def flat_tool_usage(record):
+    """Tool usage document as one flat row, keeping created_at a datetime."""
+    meta = record.get('meta') or {}
+    return {
+        'id': record.get('id'),
+        'user_id': record.get('user_id'),
+        'session_id': record.get('session_id'),
+        'tool_name': meta.get('tool_name', record.get('tool_name')),
+        'action': meta.get('action', record.get('action')),
+        'created_at': record.get('created_at')
+    }
+
+class StreamBuffer(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def parquet_chunks(batches):
+    """
+    Encode batches of tool usage documents as a Parquet file with one row group
+    per batch. Each batch goes through a pandas DataFrame with a fixed schema.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = [field for field, _ in TOOL_USAGE_COLUMNS]
+    schema = pa.schema([(field, pa.string()) for field in columns[:-1]] + [('created_at', pa.timestamp('ms'))])
+    sink = StreamBuffer()
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for batch in batches:
+            frame = pd.DataFrame.from_records((flat_tool_usage(record) for record in batch), columns=columns)
+            frame['action'] = frame['action'].fillna('unknown')
+            frame['created_at'] = pd.to_datetime(frame['created_at'], errors='coerce')
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of byte chunks into a single gzip stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_tool_usage(mongo, filters, export_format='csv', compress=False):
+    """
+    Stream filtered tool usage as CSV, NDJSON or Parquet bytes.
+
+    Args:
+        mongo: PyMongo instance (or its Database)
+        filters (dict): tool_usage query filters
+        export_format (str): Key of EXPORT_FORMATS
+        compress (bool): Gzip the output
+
+    Returns:
+        generator: Byte chunks of the export
+    """
+    encoders = {'csv': csv_chunks, 'ndjson': ndjson_chunks, 'parquet': parquet_chunks}
+    if export_format not in encoders:
+        raise ValueError(f"Unsupported export format: {export_format}. Valid formats: {list(EXPORT_FORMATS)}")
+    if export_format == 'parquet':
+        # Fail before the response starts rather than halfway through the stream
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow to be installed")
+    chunks = encoders[export_format](iter_tool_usage_batches(mongo, filters))
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,115 @@
+import os
+import logging
+from itsdangerous import BadSignature
+from flask import request
+from flask.sessions import SessionInterface, SecureCookieSessionInterface
+
+# Set up logging
+logger = logging.getLogger('ficore_app')
+
+# Cookie that carries small anonymous sessions; the payload is signed and
+# zlib-compressed by itsdangerous when that makes it shorter
+GUEST_SESSION_COOKIE_NAME = os.environ.get('GUEST_SESSION_COOKIE_NAME', 'guest_session')
+# Browsers cap a cookie at about 4KB including its name and attributes
+GUEST_SESSION_COOKIE_BUDGET = int(os.environ.get('GUEST_SESSION_COOKIE_BUDGET', 3800))
+SID_KEY = '_sid'
+
+class GuestCookieSigner(SecureCookieSessionInterface):
+    """Provides the signing serializer for guest session cookies."""
+    salt = 'guest-session'
+
+class HybridSessionInterface(SessionInterface):
+    """
+    Keeps anonymous sessions in a signed cookie and only falls back to the
+    server-side store (Flask-Session) when the payload grows past the cookie
+    budget or the user signs in. Requests carrying the server-side session
+    cookie always use the server-side store.
+    """
+
+    def __init__(self, base, cookie_name=GUEST_SESSION_COOKIE_NAME, budget=GUEST_SESSION_COOKIE_BUDGET):
+        self.base = base
+        self.cookie_name = cookie_name
+        self.budget = budget
+        self.signer = GuestCookieSigner()
+
+    def __getattr__(self, name):
+        return getattr(self.base, name)
+
+    def load_guest_payload(self, app, req):
+        value = req.cookies.get(self.cookie_name)
+        if not value:
+            return None
+        serializer = self.signer.get_signing_serializer(app)
+        try:
+            return serializer.loads(value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+        except BadSignature:
+            return None
+
+    def open_session(self, app, req):
+        # With no server-side cookie this only generates a fresh sid, no store read
+        session = self.base.open_session(app, req)
+        if session is None or req.cookies.get(self.base.get_cookie_name(app)):
+            return session
+        payload = self.load_guest_payload(app, req)
+        if payload:
+            sid = payload.pop(SID_KEY, None)
+            session.update(payload)
+            if sid:
+                session.sid = sid
+            session.modified = False
+        session.guest = True
+        return session
+
+    def should_promote(self, session):
+        """Signed-in sessions always move to the server-side store."""
+        return '_user_id' in session or session.get('is_anonymous') is False
+
+    def guest_cookie_value(self, app, session):
+        serializer = self.signer.get_signing_serializer(app)
+        try:
+            value = serializer.dumps({**dict(session), SID_KEY: session.sid})
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Guest session is not cookie serializable, moving it server-side: {str(e)}")
+            return None
+        if len(value) > self.budget:
+            logger.info(f"Guest session of {len(value)} bytes exceeds the cookie budget, moving it server-side")
+            return None
+        return value
+
+    def save_session(self, app, session, response):
+        if not getattr(session, 'guest', False):
+            if self.cookie_name in request.cookies:
+                self.delete_guest_cookie(app, response)
+            return self.base.save_session(app, session, response)
+        if not session:
+            if self.cookie_name in request.cookies:
+                self.delete_guest_cookie(app, response)
+            return
+        value = None if self.should_promote(session) else self.guest_cookie_value(app, session)
+        if value is None:
+            # Promote: persist server-side and drop the guest cookie
+            if self.cookie_name in request.cookies:
+                self.delete_guest_cookie(app, response)
+            session.modified = True
+            return self.base.save_session(app, session, response)
+        response.set_cookie(
+            self.cookie_name,
+            value,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+        response.vary.add('Cookie')
+
+    def delete_guest_cookie(self, app, response):
+        response.delete_cookie(
+            self.cookie_name,
+            domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+            httponly=self.get_cookie_httponly(app)
+        )
@@ -0,0 +1,103 @@
+import numpy as np
+
+# Version of the financial health formula; stored on every scored assessment
+# as 'scoring_version' so records scored by an older formula can be found and
+# re-scored. Bump it whenever score_v* or the thresholds change.
+FORMULA_VERSION = 1
+
+# Score thresholds for the status labels, highest first
+STATUS_THRESHOLDS = ((80, 'excellent'), (60, 'good'))
+DEFAULT_STATUS = 'needs_improvement'
+
+# Badge keys in display order; their rules live in score_v1
+BADGE_KEYS = (
+    'financial_health_badge_financial_star',
+    'financial_health_badge_debt_manager',
+    'financial_health_badge_savings_pro',
+    'financial_health_badge_interest_free'
+)
+
+def _ratio(numerator, denominator, mask):
+    """numerator / denominator * 100 where mask holds, 0 elsewhere, without divide warnings."""
+    out = np.zeros_like(numerator)
+    np.divide(numerator, denominator, out=out, where=mask)
+    return out * 100
+
+def score_v1(income, expenses, debt, interest_rate):
+    """
+    Original formula: start at 100, subtract debt-to-income and interest
+    penalties, add or subtract up to 20/30 points for the savings rate.
+
+    All arguments are float64 arrays of equal length. Rows with income <= 0
+    cannot be scored and come back with valid=False.
+    """
+    valid = income > 0
+    debt_to_income = _ratio(debt, income, valid)
+    savings_rate = _ratio(income - expenses, income, valid)
+    interest_burden = _ratio(interest_rate * debt / 100 / 12, income, valid & (debt > 0))
+
+    score = np.full(income.shape, 100.0)
+    score -= np.where(debt_to_income > 0, np.minimum(debt_to_income / 50, 50), 0)
+    score -= np.where(savings_rate < 0, np.minimum(np.abs(savings_rate), 30), 0)
+    score += np.where(savings_rate > 0, np.minimum(savings_rate / 2, 20), 0)
+    score -= np.minimum(interest_burden, 20)
+    # np.round rounds half to even, matching Python's round()
+    score = np.clip(np.round(score), 0, 100).astype(np.int64)
+
+    badges = np.stack([
+        score >= 80,
+        debt_to_income < 20,
+        savings_rate >= 20,
+        (interest_burden == 0) & (debt > 0)
+    ], axis=1)
+    return {
+        'valid': valid,
+        'debt_to_income': debt_to_income,
+        'savings_rate': savings_rate,
+        'interest_burden': interest_burden,
+        'score': score,
+        'badges': badges
+    }
+
+SCORING_FORMULAS = {
+    1: score_v1
+}
+
+def status_keys(scores):
+    """Map an array of scores to status keys ('excellent', 'good', 'needs_improvement')."""
+    keys = np.full(scores.shape, DEFAULT_STATUS, dtype=object)
+    for threshold, key in reversed(STATUS_THRESHOLDS):
+        keys[scores >= threshold] = key
+    return keys
+
+def score_batch(income, expenses, debt, interest_rate, version=FORMULA_VERSION):
+    """
+    Score whole columns of assessments at once.
+
+    Args:
+        income, expenses, debt, interest_rate: Sequences or arrays of numbers
+        version (int): Formula version from SCORING_FORMULAS
+
+    Returns:
+        dict: Arrays 'valid', 'debt_to_income', 'savings_rate', 'interest_burden',
+        'score', 'status_key' and a boolean 'badges' matrix with one column per BADGE_KEYS entry
+    """
+    if version not in SCORING_FORMULAS:
+        raise ValueError(f"Unknown scoring formula version: {version}")
+    columns = [np.asarray(column, dtype=np.float64) for column in (income, expenses, debt, interest_rate)]
+    result = SCORING_FORMULAS[version](*columns)
+    result['status_key'] = status_keys(result['score'])
+    return result
+
+def score_assessment(income, expenses, debt, interest_rate, version=FORMULA_VERSION):
+    """Score a single assessment; returns plain Python values and the list of badge keys."""
+    result = score_batch([income], [expenses], [debt], [interest_rate], version)
+    return {
+        'debt_to_income': float(result['debt_to_income'][0]),
+        'savings_rate': float(result['savings_rate'][0]),
+        'interest_burden': float(result['interest_burden'][0]),
+        'score': int(result['score'][0]),
+        'status_key': result['status_key'][0],
+        'badge_keys': [key for key, earned in zip(BADGE_KEYS, result['badges'][0]) if earned],
+        'scoring_version': version
+    }
@@ -1,11 +1,16 @@
+import atexit
 import logging
 import os
+import time
+import threading
 import smtplib
 import requests
+from contextlib import contextmanager
 from email.mime.text import MIMEText
+from requests.adapters import HTTPAdapter
 from flask import Flask, render_template, current_app
 from typing import Dict, Optional
-from translations import trans
+from translations import trans, available_languages
 
 # Email configuration dictionary with provider-specific templates
 EMAIL_CONFIG = {
@@ -60,6 +65,122 @@ EMAIL_CONFIG = {
     }
 }
 
+class MailerSendTransport:
+    """Keeps one keep-alive requests.Session per process for the MailerSend API."""
+
+    url = "https://api.mailersend.com/v1/email"
+
+    def __init__(self, pool_size: int = 4):
+        self.pool_size = pool_size
+        self.session = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def get_session(self) -> requests.Session:
+        with self.lock:
+            # A session inherited from a parent process must not be shared after fork
+            if self.session is None or self.pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                self.session = session
+                self.pid = os.getpid()
+            return self.session
+
+    def send(self, api_token: str, payload: Dict, timeout: int = 10) -> requests.Response:
+        headers = {
+            "Authorization": f"Bearer {api_token}",
+            "Content-Type": "application/json"
+        }
+        return self.get_session().post(self.url, json=payload, headers=headers, timeout=timeout)
+
+    def close(self):
+        with self.lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+
+class SMTPTransport:
+    """Pool of authenticated SMTP_SSL connections reused across messages."""
+
+    def __init__(self, host: str, port: int, pool_size: int = 4, idle_timeout: int = 60):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self, user: str, password: str) -> smtplib.SMTP_SSL:
+        now = time.monotonic()
+        with self.lock:
+            while self.idle:
+                conn, conn_user, released_at, pid = self.idle.pop()
+                if conn_user == user and pid == os.getpid() and now - released_at < self.idle_timeout:
+                    return conn
+                self.quit(conn)
+        conn = smtplib.SMTP_SSL(self.host, self.port, timeout=30)
+        conn.login(user, password)
+        return conn
+
+    def release(self, conn: smtplib.SMTP_SSL, user: str):
+        with self.lock:
+            if len(self.idle) < self.pool_size:
+                self.idle.append((conn, user, time.monotonic(), os.getpid()))
+                return
+        self.quit(conn)
+
+    def quit(self, conn: smtplib.SMTP_SSL):
+        try:
+            conn.quit()
+        except Exception:
+            pass
+
+    def send(self, user: str, password: str, msg: MIMEText):
+        conn = self.acquire(user, password)
+        try:
+            conn.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Pooled connection was dropped by the server; retry once on a fresh one
+            self.quit(conn)
+            conn = self.acquire(user, password)
+            try:
+                conn.send_message(msg)
+            except Exception:
+                self.quit(conn)
+                raise
+        except Exception:
+            self.quit(conn)
+            raise
+        self.release(conn, user)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn, _, _, _ in idle:
+            self.quit(conn)
+
+mailersend_transport = MailerSendTransport(pool_size=int(os.getenv('EMAIL_POOL_SIZE', 4)))
+smtp_transport = SMTPTransport(
+    'smtp.gmail.com',
+    465,
+    pool_size=int(os.getenv('EMAIL_POOL_SIZE', 4)),
+    idle_timeout=int(os.getenv('SMTP_IDLE_TIMEOUT', 60))
+)
+
+@contextmanager
+def email_batch():
+    """Reuse provider connections for every send inside the block, then close idle ones."""
+    try:
+        yield
+    finally:
+        smtp_transport.close()
+
+def close_email_transports():
+    """Close pooled provider connections on shutdown."""
+    smtp_transport.close()
+    mailersend_transport.close()
+
 def init_email_config(app: Flask, logger: logging.LoggerAdapter):
     """Validate email provider configuration at startup."""
     mailersend_enabled = bool(os.getenv('MAILERSEND_API_TOKEN') and os.getenv('MAILERSEND_FROM_EMAIL'))
@@ -68,6 +189,7 @@ def init_email_config(app: Flask, logger: logging.LoggerAdapter):
         logger.warning("No email providers configured: Missing MailerSend or Gmail credentials")
     else:
         logger.info(f"Email providers configured: MailerSend={mailersend_enabled}, Gmail={gmail_enabled}")
+    atexit.register(close_email_transports)
 
 def send_email(
     app: Flask,
@@ -89,7 +211,7 @@ def send_email(
         subject: Email subject.
         template_key: Key in EMAIL_CONFIG (e.g., 'budget', 'quiz').
         data: Data to pass to the template for rendering. Defaults to empty dict if None.
-        lang: Language code ('en' or 'ha'). Defaults to 'en'.
+        lang: Language code (see translations.available_languages()). Defaults to 'en'.
         job_id: Optional job ID for scheduled tasks to replace session ID in logs.
 
     Raises:
@@ -108,7 +230,7 @@ def send_email(
     logger.info(f"send_email called with: to_email={to_email}, subject={subject}, template_key={template_key}, data_type={type(data)}, data={data}, lang={lang}", extra={'session_id': session_id})
 
     # Validate language
-    if lang not in ['en', 'ha']:
+    if lang not in available_languages():
         logger.warning(f"Invalid language '{lang}', falling back to 'en'", extra={'session_id': session_id})
         lang = 'en'
 
@@ -162,12 +284,12 @@ def send_email(
             # Render email template
             with app.app_context():
                 try:
-                    html_content = render_template(template_name, **data, lang=lang)
+                    html_content = render_template(template_name, **{**data, 'lang': lang})
                     logger.info(f"Template {template_name} rendered successfully, content length: {len(html_content)}", extra={'session_id': session_id})
                 except KeyError as e:
                     logger.warning(f"Missing key {e} in data for template {template_name}, using empty string", extra={'session_id': session_id})
                     data[str(e)] = ""
-                    html_content = render_template(template_name, **data, lang=lang)
+                    html_content = render_template(template_name, **{**data, 'lang': lang})
                 except Exception as e:
                     logger.error(f"Cannot render email template {template_name}: {str(e)}", extra={'session_id': session_id})
                     raise RuntimeError(f"Cannot render email template {template_name}: {str(e)}")
@@ -175,11 +297,6 @@ def send_email(
             if provider == 'mailersend':
                 api_token = os.getenv('MAILERSEND_API_TOKEN')
                 from_email = os.getenv('MAILERSEND_FROM_EMAIL')
-                url = "https://api.mailersend.com/v1/email"
-                headers = {
-                    "Authorization": f"Bearer {api_token}",
-                    "Content-Type": "application/json"
-                }
                 payload = {
                     "from": {"email": from_email, "name": "FiCore Africa"},
                     "to": [{"email": to_email}],
@@ -190,7 +307,7 @@ def send_email(
                 max_retries = 3
                 for attempt in range(1, max_retries + 1):
                     try:
-                        response = requests.post(url, json=payload, headers=headers, timeout=10)
+                        response = mailersend_transport.send(api_token, payload, timeout=10)
                         if 200 <= response.status_code < 300:
                             logger.info(f"Email sent successfully to {to_email} via {provider}", extra={'session_id': session_id, 'provider': provider})
                             return
@@ -199,7 +316,8 @@ def send_email(
                     except requests.RequestException as e:
                         if attempt < max_retries:
                             delay = 2 ** attempt
-                            logger.warning(f"Network error sending email to {to_email} via {provider}: {str(e)}. Retrying... (attempt {attempt})", extra={'session_id': session_id, 'provider': provider})
+                            logger.warning(f"Network error sending email to {to_email} via {provider}: {str(e)}. Retrying in {delay}s... (attempt {attempt})", extra={'session_id': session_id, 'provider': provider})
+                            time.sleep(delay)
                             continue
                         raise
 
@@ -214,15 +332,14 @@ def send_email(
                 max_retries = 3
                 for attempt in range(1, max_retries + 1):
                     try:
-                        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-                            server.login(smtp_user, smtp_password)
-                            server.send_message(msg)
+                        smtp_transport.send(smtp_user, smtp_password, msg)
                         logger.info(f"Email sent successfully to {to_email} via {provider}", extra={'session_id': session_id, 'provider': provider})
                         return
                     except smtplib.SMTPException as e:
                         if attempt < max_retries:
                             delay = 2 ** attempt
-                            logger.warning(f"Gmail SMTP error sending email to {to_email}: {str(e)}. Retrying... (attempt {attempt})", extra={'session_id': session_id, 'provider': provider})
+                            logger.warning(f"Gmail SMTP error sending email to {to_email}: {str(e)}. Retrying in {delay}s... (attempt {attempt})", extra={'session_id': session_id, 'provider': provider})
+                            time.sleep(delay)
                             continue
                         raise RuntimeError(f"Gmail SMTP error: {str(e)}")
 
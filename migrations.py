@@ -0,0 +1,354 @@
+import os
+import logging
+import numpy as np
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import CollectionInvalid
+from health_scoring import FORMULA_VERSION, BADGE_KEYS, score_batch
+from translations import trans
+from models import decode_json_field
+from wizard_drafts import WIZARD_DRAFT_TTL
+from rollups import refresh_rollups
+from tool_usage_store import (
+    TOOL_USAGE_COLLECTION, is_timeseries, create_tool_usage_collection, archive_tool_usage,
+    archive_cutoff, retention_seconds
+)
+
+# Set up logging
+logger = logging.getLogger('ficore_app')
+
+# Assessments read and bulk-written per round trip when re-scoring
+RESCORE_CHUNK_SIZE = int(os.environ.get('RESCORE_CHUNK_SIZE', 5000))
+# Documents read and bulk-written per round trip by batched migrations
+MIGRATION_BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', 1000))
+
+# Fields once stored as JSON strings, with the value used for empty or invalid ones
+JSON_FIELDS = {
+    'financial_health': {'badges': list},
+    'net_worth': {'badges': list},
+    'emergency_funds': {'badges': list},
+    'quiz_results': {'badges': list, 'insights': list, 'tips': list},
+    'learning_progress': {'lessons_completed': list, 'quiz_scores': dict}
+}
+
+def migrate_bill_due_dates(db):
+    """
+    Convert legacy 'YYYY-MM-DD' string due dates on bills to BSON dates.
+
+    Runs as a single server-side pipeline update; strings that do not parse
+    are left unchanged. Safe to run repeatedly.
+
+    Returns:
+        int: Number of bills converted
+    """
+    result = db.bills.update_many(
+        {'due_date': {'$type': 'string'}},
+        [{'$set': {'due_date': {'$dateFromString': {
+            'dateString': '$due_date',
+            'format': '%Y-%m-%d',
+            'onError': '$due_date'
+        }}}}]
+    )
+    if result.modified_count:
+        logger.info(f"Converted {result.modified_count} bill due dates from strings to dates")
+    return result.modified_count
+
+def migrate_user_ids(db):
+    """
+    Normalize users.id and users.referred_by_id to strings so lookups need a
+    single query on the unique id index and referral counts match the
+    referrer's id. Older accounts were created with integer ids. Both updates
+    only match numeric values, so once done a run costs two index lookups.
+
+    Returns:
+        int: Number of users converted
+    """
+    result = db.users.update_many(
+        {'id': {'$type': 'number'}},
+        [{'$set': {'id': {'$toString': {'$toLong': '$id'}}}}]
+    )
+    if result.modified_count:
+        logger.info(f"Converted {result.modified_count} user ids from numbers to strings")
+    referrals = db.users.update_many(
+        {'referred_by_id': {'$type': 'number'}},
+        [{'$set': {'referred_by_id': {'$toString': {'$toLong': '$referred_by_id'}}}}]
+    )
+    if referrals.modified_count:
+        logger.info(f"Converted {referrals.modified_count} referrer ids from numbers to strings")
+    # Replace the old non-unique id index; reconcile_indexes creates the unique one
+    for name, info in db.users.index_information().items():
+        if list(info['key']) == [('id', 1)] and not info.get('unique'):
+            db.users.drop_index(name)
+            logger.info(f"Dropped non-unique users index {name}")
+    return result.modified_count
+
+# job_state entry recording that the per-step records have been folded
+FINANCIAL_HEALTH_MIGRATION_ID = 'financial_health_assessments'
+
+def migrate_financial_health_assessments(db, force=False):
+    """
+    Fold legacy per-step financial_health_scores records into assessment
+    documents. Each step-3 record becomes a completed assessment with its
+    answers under step1/step2/step3; the partial step-1 and step-2 records
+    it superseded are removed. Attempts left in progress without an
+    expires_at are given one, so the TTL index removes them if abandoned.
+
+    No index covers the legacy 'step' field, so completion is recorded in
+    job_state and later runs return straight away unless forced.
+
+    Returns:
+        int: Number of step-3 records converted
+    """
+    if not force and db.job_state.find_one({'_id': FINANCIAL_HEALTH_MIGRATION_ID}, {'_id': 1}):
+        return 0
+    result = db.financial_health_scores.update_many(
+        {'step': 3},
+        [
+            {'$set': {
+                'step1': {
+                    'first_name': '$first_name',
+                    'email': '$email',
+                    'user_type': '$user_type',
+                    'send_email': '$send_email'
+                },
+                'step2': {'income': '$income', 'expenses': '$expenses'},
+                'step3': {
+                    'debt': '$debt',
+                    'interest_rate': '$interest_rate',
+                    'debt_to_income': '$debt_to_income',
+                    'savings_rate': '$savings_rate',
+                    'interest_burden': '$interest_burden',
+                    'score': '$score',
+                    'status': '$status',
+                    'status_key': '$status_key',
+                    'badges': '$badges'
+                },
+                'state': 'completed',
+                # Legacy records were overwritten on every attempt, so each is its owner's latest
+                'latest': True,
+                'completed_at': '$created_at',
+                'updated_at': '$created_at'
+            }},
+            {'$unset': [
+                'step', 'first_name', 'email', 'user_type', 'send_email', 'income', 'expenses',
+                'debt', 'interest_rate', 'debt_to_income', 'savings_rate', 'interest_burden',
+                'status', 'status_key', 'badges'
+            ]}
+        ]
+    )
+    removed = db.financial_health_scores.delete_many({'step': {'$in': [1, 2]}})
+    if result.modified_count or removed.deleted_count:
+        logger.info(f"Converted {result.modified_count} financial health records to assessments, removed {removed.deleted_count} partial step records")
+    expiring = db.financial_health_scores.update_many(
+        {'state': 'in_progress', 'expires_at': {'$exists': False}},
+        {'$set': {'expires_at': datetime.utcnow() + WIZARD_DRAFT_TTL}}
+    )
+    if expiring.modified_count:
+        logger.info(f"Set expires_at on {expiring.modified_count} financial health assessments in progress")
+    db.job_state.update_one(
+        {'_id': FINANCIAL_HEALTH_MIGRATION_ID},
+        {'$set': {'completed_at': datetime.utcnow(), 'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+    return result.modified_count
+
+def rescore_financial_health(db, version=FORMULA_VERSION, chunk_size=RESCORE_CHUNK_SIZE):
+    """
+    Re-score completed financial health assessments with the given formula
+    version. Assessments are read in _id order in chunks with only the scoring
+    inputs projected, scored a whole chunk at a time by score_batch, and written
+    back with one unordered bulk write per chunk. Assessments already tagged
+    with the version are skipped, so an interrupted run can simply be restarted.
+    Status and badge labels are re-translated in each assessment's language,
+    English for records saved before the language was stored.
+
+    Returns:
+        dict: Counts of 'rescored' assessments and 'skipped' ones with no usable income
+    """
+    collection = db.financial_health_scores
+    query = {'state': 'completed', 'scoring_version': {'$ne': version}}
+    projection = {'step2.income': 1, 'step2.expenses': 1, 'step3.debt': 1, 'step3.interest_rate': 1, 'lang': 1}
+    labels = {}
+    counts = {'rescored': 0, 'skipped': 0}
+    last_id = None
+    while True:
+        chunk_query = {**query, '_id': {'$gt': last_id}} if last_id is not None else query
+        docs = list(collection.find(chunk_query, projection).sort('_id', 1).limit(chunk_size))
+        if not docs:
+            break
+        last_id = docs[-1]['_id']
+
+        def column(step, field):
+            return np.fromiter(
+                ((doc.get(step) or {}).get(field) or 0 for doc in docs),
+                dtype=np.float64,
+                count=len(docs)
+            )
+
+        result = score_batch(
+            column('step2', 'income'),
+            column('step2', 'expenses'),
+            column('step3', 'debt'),
+            column('step3', 'interest_rate'),
+            version
+        )
+        operations = []
+        for i, doc in enumerate(docs):
+            if not result['valid'][i]:
+                counts['skipped'] += 1
+                continue
+            lang = doc.get('lang') or 'en'
+            if lang not in labels:
+                labels[lang] = {key: trans(key, lang=lang) for key in BADGE_KEYS}
+                labels[lang].update({key: trans(f'financial_health_status_{key}', lang=lang) for key in ('excellent', 'good', 'needs_improvement')})
+            score = int(result['score'][i])
+            status_key = result['status_key'][i]
+            operations.append(UpdateOne({'_id': doc['_id']}, {'$set': {
+                'step3.debt_to_income': float(result['debt_to_income'][i]),
+                'step3.savings_rate': float(result['savings_rate'][i]),
+                'step3.interest_burden': float(result['interest_burden'][i]),
+                'step3.score': score,
+                'step3.status': labels[lang][status_key],
+                'step3.status_key': status_key,
+                'step3.badges': [labels[lang][key] for key, earned in zip(BADGE_KEYS, result['badges'][i]) if earned],
+                'score': score,
+                'scoring_version': version
+            }}))
+        if operations:
+            counts['rescored'] += collection.bulk_write(operations, ordered=False).matched_count
+        logger.info(f"Re-scored {counts['rescored']} financial health assessments with formula v{version} so far")
+    return counts
+
+def migrate_json_fields(db, batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Convert the JSON string badges, insights, tips and learning progress fields
+    of JSON_FIELDS to native BSON arrays and sub-documents.
+
+    Documents still holding a string are read in _id order in batches and
+    written back with one unordered bulk write per batch; converted documents
+    no longer match, so an interrupted run resumes where it stopped. Strings
+    that are not valid JSON are replaced with an empty value.
+
+    Returns:
+        dict: Collection name mapped to the number of documents converted
+    """
+    converted = {}
+    for collection_name, fields in JSON_FIELDS.items():
+        collection = db[collection_name]
+        query = {'$or': [{field: {'$type': 'string'}} for field in fields]}
+        converted[collection_name] = 0
+        last_id = None
+        while True:
+            batch_query = {**query, '_id': {'$gt': last_id}} if last_id is not None else query
+            docs = list(collection.find(batch_query, {field: 1 for field in fields}).sort('_id', 1).limit(batch_size))
+            if not docs:
+                break
+            last_id = docs[-1]['_id']
+            operations = []
+            for doc in docs:
+                updates = {}
+                for field, empty in fields.items():
+                    value = doc.get(field)
+                    if not isinstance(value, str):
+                        continue
+                    try:
+                        updates[field] = decode_json_field(value, empty())
+                    except ValueError:
+                        logger.warning(f"Invalid JSON in {collection_name}.{field} of {doc['_id']}, replacing it with an empty value")
+                        updates[field] = empty()
+                operations.append(UpdateOne({'_id': doc['_id']}, {'$set': updates}))
+            converted[collection_name] += collection.bulk_write(operations, ordered=False).modified_count
+        if converted[collection_name]:
+            logger.info(f"Converted JSON string fields of {converted[collection_name]} {collection_name} documents to native values")
+    return converted
+
+# Regular tool_usage collection while its events are copied into the time-series one
+TOOL_USAGE_LEGACY = 'tool_usage_legacy'
+TOOL_USAGE_MIGRATION_ID = 'tool_usage_timeseries'
+
+def move_documents(source, target, batch_size=MIGRATION_BATCH_SIZE):
+    """Append every document of source to target in batches."""
+    batch = []
+    for doc in source.find().batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            target.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        target.insert_many(batch, ordered=False)
+
+def timeseries_tool_usage(doc):
+    """
+    Reshape a legacy tool usage document for the time-series collection.
+    Events written by build_tool_usage before the conversion already carry
+    'meta' and keep it; older ones have tool_name and action at the top level.
+    """
+    return {
+        '_id': doc['_id'],
+        'id': doc.get('id'),
+        'meta': doc.get('meta') or {'tool_name': doc.get('tool_name'), 'action': doc.get('action') or 'unknown'},
+        'user_id': doc.get('user_id'),
+        'session_id': doc.get('session_id'),
+        'created_at': doc['created_at']
+    }
+
+def migrate_tool_usage_timeseries(db, batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Convert tool_usage from a regular collection to a time-series collection.
+
+    The regular collection is renamed to tool_usage_legacy and the time-series
+    collection created in its place, so new events land there straight away.
+    Days that would expire right after the copy are archived from the legacy
+    collection first; the rest is copied in _id order with checkpoints in
+    job_state, so an interrupted run resumes after the last copied batch (at
+    most one batch may be copied twice). The legacy collection is dropped at the
+    end and the usage rollups rebuilt, since the rollup job may have counted
+    hours of the partly filled collection while the copy ran.
+
+    Returns:
+        int: Number of events copied
+    """
+    names = set(db.list_collection_names())
+    if not is_timeseries(db):
+        if TOOL_USAGE_COLLECTION in names:
+            if TOOL_USAGE_LEGACY in names:
+                # Events written after an interrupted run recreated a regular collection
+                move_documents(db[TOOL_USAGE_COLLECTION], db[TOOL_USAGE_LEGACY], batch_size)
+                db[TOOL_USAGE_COLLECTION].drop()
+            else:
+                db[TOOL_USAGE_COLLECTION].rename(TOOL_USAGE_LEGACY)
+        try:
+            create_tool_usage_collection(db)
+        except CollectionInvalid:
+            # An event was inserted between the rename and the create
+            move_documents(db[TOOL_USAGE_COLLECTION], db[TOOL_USAGE_LEGACY], batch_size)
+            db[TOOL_USAGE_COLLECTION].drop()
+            create_tool_usage_collection(db)
+    if TOOL_USAGE_LEGACY not in db.list_collection_names():
+        return 0
+
+    legacy = db[TOOL_USAGE_LEGACY]
+    archive_tool_usage(db, collection=TOOL_USAGE_LEGACY)
+    # Archived days would expire as soon as they were copied
+    query = {'created_at': {'$gte': archive_cutoff()} if retention_seconds() else {'$type': 'date'}}
+    state = db.job_state.find_one({'_id': TOOL_USAGE_MIGRATION_ID}) or {}
+    last_id = state.get('last_id')
+    copied = 0
+    while True:
+        batch_query = {**query, '_id': {'$gt': last_id}} if last_id is not None else query
+        docs = list(legacy.find(batch_query).sort('_id', 1).limit(batch_size))
+        if not docs:
+            break
+        db[TOOL_USAGE_COLLECTION].insert_many([timeseries_tool_usage(doc) for doc in docs], ordered=False)
+        last_id = docs[-1]['_id']
+        copied += len(docs)
+        db.job_state.update_one({'_id': TOOL_USAGE_MIGRATION_ID}, {'$set': {'last_id': last_id}}, upsert=True)
+        logger.info(f"Copied {copied} tool usage events into the time-series collection so far")
+    skipped = legacy.count_documents({'created_at': {'$not': {'$type': 'date'}}})
+    if skipped:
+        logger.warning(f"Dropped {skipped} legacy tool usage events without a created_at date")
+    legacy.drop()
+    db.job_state.delete_one({'_id': TOOL_USAGE_MIGRATION_ID})
+    refresh_rollups(db, rebuild=True)
+    logger.info(f"Converted {TOOL_USAGE_COLLECTION} to a time-series collection, copied {copied} events")
+    return copied
@@ -1,8 +1,198 @@
+import os
 import uuid
-from datetime import datetime, date
+import base64
+import threading
+from collections import OrderedDict
+from itertools import islice
+from datetime import datetime, date, time
+from time import monotonic
 import json
 from flask import current_app, session
 from flask_login import UserMixin
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError
+from bson import json_util
+
+def get_db(mongo):
+    """Return the Database for either a PyMongo instance or a Database object."""
+    return mongo if isinstance(mongo, Database) else mongo.db
+
+# Query helper functions
+# Record queries stream newest first on created_at alone, so the per-owner
+# (user_id/session_id, created_at) indexes of the manifest serve the sort
+# without an in-memory sort stage; no index ends in _id, so an _id tie-breaker
+# would force a blocking sort over all of the owner's records. The same holds
+# for time-series collections (tool_usage), which only serve a sort on their
+# time field. Admin event lists page with page_events, whose opaque token keeps
+# the last timestamp and the _ids already shown at it instead of skipping over
+# earlier rows.
+QUERY_BATCH_SIZE = int(os.environ.get('QUERY_BATCH_SIZE', 200))
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 50))
+RECORD_SORT = [('created_at', -1)]
+
+def _pack_token(payload):
+    return base64.urlsafe_b64encode(json_util.dumps(payload).encode('utf-8')).decode('ascii')
+
+def _unpack_token(token):
+    try:
+        return json_util.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except Exception as e:
+        raise ValueError(f"Invalid page token: {str(e)}")
+
+def build_projection(fields):
+    """Projection for the given fields plus the ones every record query needs."""
+    if fields is None:
+        return None
+    return {field: 1 for field in ('id', 'created_at', *fields)}
+
+def find_records(mongo, collection, filters, fields=None, limit=None):
+    """Batched cursor over a collection, newest first, for the record helpers below."""
+    cursor = get_db(mongo)[collection].find(filters, build_projection(fields))
+    cursor = cursor.sort(RECORD_SORT).batch_size(min(limit or QUERY_BATCH_SIZE, QUERY_BATCH_SIZE))
+    return cursor.limit(limit) if limit else cursor
+
+def check_record(collection, record):
+    """True for records with an 'id'; logs and rejects the rest."""
+    if 'id' in record:
+        return True
+    current_app.logger.warning(f"Skipping {collection} record without 'id': {record.get('_id')}")
+    return False
+
+def iter_records(mongo, collection, filters, fields=None, limit=None):
+    """
+    Yield records matching filters, newest first, without materializing the result.
+
+    Args:
+        mongo: PyMongo instance (or its Database)
+        collection (str): Collection name
+        filters (dict): Query filters
+        fields (list): Fields to return besides 'id' and 'created_at'; None returns whole documents
+        limit (int): Maximum number of records to read
+
+    Yields:
+        dict: Records without MongoDB's '_id'
+    """
+    for record in find_records(mongo, collection, filters, fields, limit):
+        if check_record(collection, record):
+            record.pop('_id', None)
+            yield record
+
+def event_keyset_filter(filters, after):
+    """Restrict filters to events at or before the token's timestamp that were not shown yet."""
+    if not after:
+        return filters
+    try:
+        created_at, seen_ids = _unpack_token(after)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid page token: {str(e)}")
+    if not isinstance(seen_ids, list):
+        raise ValueError("Invalid page token: not an event position")
+    return {'$and': [filters, {'created_at': {'$lte': created_at}, '_id': {'$nin': seen_ids}}]}
+
+def page_events(mongo, collection, filters, fields=None, limit=PAGE_SIZE, after=None):
+    """
+    Read one page of a time-series collection, newest first, sorted on
+    created_at only so the (meta..., created_at) indexes serve the sort.
+
+    Returns:
+        tuple: (records, next_token); next_token is None on the last page
+    """
+    cursor = get_db(mongo)[collection].find(event_keyset_filter(filters, after), build_projection(fields))
+    cursor = cursor.sort(RECORD_SORT).limit(limit).batch_size(min(limit, QUERY_BATCH_SIZE))
+    records = []
+    rows = list(cursor)
+    for record in rows:
+        if check_record(collection, record):
+            records.append({key: value for key, value in record.items() if key != '_id'})
+    next_token = None
+    if rows and len(rows) == limit:
+        last_created_at = rows[-1].get('created_at')
+        # Events sharing the last timestamp may continue on the next page
+        seen_ids = [row['_id'] for row in rows if row.get('created_at') == last_created_at]
+        if after:
+            previous_created_at, previous_ids = _unpack_token(after)
+            if previous_created_at == last_created_at:
+                seen_ids += previous_ids
+        next_token = _pack_token([last_created_at, seen_ids])
+    return records, next_token
+
+def latest_one(mongo, collection, filters, fields=None):
+    """Return the newest record matching filters, or None, in a single indexed lookup."""
+    record = get_db(mongo)[collection].find_one(filters, build_projection(fields), sort=RECORD_SORT)
+    if record is not None:
+        record.pop('_id', None)
+    return record
+
+# List and dict fields are stored as native BSON arrays and sub-documents.
+# Records written before that hold them as JSON strings until
+# migrate_json_fields has converted them; readers accept both.
+def decode_json_field(value, default):
+    """Decode a legacy JSON string field; raises ValueError if it is not valid JSON."""
+    return json.loads(value) if value else default
+
+def stored_value(record, field, default, label):
+    """Return a list or dict field of a record, decoding the legacy JSON string form."""
+    value = record.get(field)
+    if isinstance(value, str):
+        try:
+            return decode_json_field(value, default)
+        except ValueError:
+            current_app.logger.error(f"Invalid JSON in {field} for {label} ID {record.get('id', 'unknown')}")
+            return default
+    return default if value is None else value
+
+# Bulk creation
+# Rows are consumed lazily and written in unordered insert_many batches, so
+# one bad row neither stops the batch nor costs a round trip per document.
+INSERT_BATCH_SIZE = int(os.environ.get('INSERT_BATCH_SIZE', 1000))
+
+def create_many_records(mongo, collection, rows, build, batch_size=INSERT_BATCH_SIZE):
+    """
+    Validate and insert rows in bulk.
+
+    Args:
+        mongo: PyMongo instance (or its Database)
+        collection (str): Collection name
+        rows (iterable): Input dicts; generators are consumed one batch at a time
+        build (callable): Validates one row and returns the document to store, raising ValueError if invalid
+        batch_size (int): Documents per insert_many call
+
+    Returns:
+        dict: 'inserted' count and 'errors', a list of {'index', 'error'} for rows that
+        failed validation or were rejected by MongoDB, indexed by position in rows
+    """
+    db = get_db(mongo)
+    inserted = 0
+    errors = []
+    rows = iter(rows)
+    offset = 0
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        documents = []
+        positions = []
+        for position, row in enumerate(chunk, start=offset):
+            try:
+                documents.append(build(row))
+                positions.append(position)
+            except (ValueError, TypeError, KeyError) as e:
+                errors.append({'index': position, 'error': str(e)})
+        offset += len(chunk)
+        if not documents:
+            continue
+        try:
+            inserted += len(db[collection].insert_many(documents, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            inserted += e.details.get('nInserted', 0)
+            for write_error in e.details.get('writeErrors', []):
+                errors.append({'index': positions[write_error['index']], 'error': write_error.get('errmsg', '')})
+        except Exception as e:
+            current_app.logger.error(f"Failed to insert {len(documents)} {collection} records: {str(e)}")
+            raise
+    if errors:
+        current_app.logger.warning(f"Bulk insert into {collection}: {inserted} inserted, {len(errors)} rejected")
+    return {'inserted': inserted, 'errors': sorted(errors, key=lambda error: error['index'])}
 
 # User class for Flask-Login
 class User(UserMixin):
@@ -22,6 +212,52 @@ class User(UserMixin):
     def get_id(self):
         return self.id  # Flask-Login expects a string
 
+# User cache
+# Flask-Login loads the current user on every request; recently loaded user
+# documents are kept in memory for a short time so most requests skip MongoDB.
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+
+class UserCache:
+    """Size-bounded LRU cache of user documents keyed by string id, with a TTL."""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = max(0, int(maxsize))
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user_doc = entry
+            if expires_at < monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user_doc
+
+    def set(self, user_id, user_doc):
+        if not self.maxsize or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (monotonic() + self.ttl, user_doc)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
 # User helper functions
 def create_user(mongo, user_data):
     """Create a new user in the users collection."""
@@ -30,7 +266,7 @@ def create_user(mongo, user_data):
         if field not in user_data or user_data[field] is None:
             raise ValueError(f"Missing required field: {field}")
     user = {
-        'id': user_data.get('id', int(uuid.uuid4().int % 10000000000)),  # Integer ID
+        'id': str(user_data.get('id', uuid.uuid4().int % 10000000000)),  # String ID, matches Flask-Login and user_id fields
         'username': user_data['username'],
         'email': user_data['email'],
         'password_hash': user_data['password_hash'],
@@ -44,27 +280,27 @@ def create_user(mongo, user_data):
     }
     try:
         mongo.db.users.insert_one(user)
+        user.pop('_id', None)
+        user_cache.set(user['id'], user)
         return User(user)
     except Exception as e:
+        user_cache.invalidate(user['id'])
         current_app.logger.error(f"Failed to create user: {str(e)}", extra={'user_data': user_data})
         raise
 
 def get_user(mongo, user_id):
-    """Retrieve a user by ID."""
+    """Retrieve a user by ID, serving from the user cache when possible."""
+    user_id = str(user_id)
+    user = user_cache.get(user_id)
+    if user:
+        return User(user)
     try:
-        # Try querying as integer first
-        user = mongo.db.users.find_one({'id': int(user_id)}, {'_id': 0})
-        if user:
-            return User(user)
-        # Fallback to string query
-        user = mongo.db.users.find_one({'id': str(user_id)}, {'_id': 0})
+        user = mongo.db.users.find_one({'id': user_id}, {'_id': 0})
         if user:
+            user_cache.set(user_id, user)
             return User(user)
         current_app.logger.warning(f"No user found for id: {user_id}")
         return None
-    except ValueError:
-        current_app.logger.error(f"Invalid user_id format: {user_id}")
-        return None
     except Exception as e:
         current_app.logger.error(f"Failed to retrieve user {user_id}: {str(e)}")
         return None
@@ -78,17 +314,18 @@ def get_user_by_email(mongo, email):
 
 def update_user(mongo, user_id, updates):
     """Update user fields."""
+    user_id = str(user_id)
     try:
-        result = mongo.db.users.update_one({'id': int(user_id)}, {'$set': updates})
+        result = mongo.db.users.update_one({'id': user_id}, {'$set': updates})
         if result.matched_count == 0:
-            result = mongo.db.users.update_one({'id': str(user_id)}, {'$set': updates})
-            if result.matched_count == 0:
-                current_app.logger.warning(f"No user found for id: {user_id}")
-                return False
+            current_app.logger.warning(f"No user found for id: {user_id}")
+            return False
         return True
     except Exception as e:
         current_app.logger.error(f"Failed to update user {user_id}: {str(e)}", extra={'updates': updates})
         raise
+    finally:
+        user_cache.invalidate(user_id)
 
 def get_referrals(mongo, user_id):
     """Retrieve users referred by the given user ID."""
@@ -127,13 +364,13 @@ def delete_reset_token(mongo, token):
         raise
 
 # Course helper functions
-def create_course(mongo, course_data):
-    """Create a new course in the courses collection."""
+def build_course(course_data):
+    """Validate course data and build the document to store."""
     required_fields = ['id', 'title_key', 'title_en', 'title_ha', 'description_en', 'description_ha']
     for field in required_fields:
         if field not in course_data or course_data[field] is None:
             raise ValueError(f"Missing required field: {field}")
-    course = {
+    return {
         'id': str(course_data['id']),  # Ensure string ID
         'title_key': course_data['title_key'],
         'title_en': course_data['title_en'],
@@ -143,13 +380,21 @@ def create_course(mongo, course_data):
         'is_premium': course_data.get('is_premium', False),
         'created_at': course_data.get('created_at', datetime.utcnow())
     }
+
+def create_course(mongo, course_data):
+    """Create a new course in the courses collection."""
+    course = build_course(course_data)
     try:
-        mongo.db.courses.insert_one(course)
+        get_db(mongo).courses.insert_one(course)
         return course
     except Exception as e:
         current_app.logger.error(f"Failed to create course: {str(e)}", extra={'course_data': course_data})
         raise
 
+def create_courses_many(mongo, courses_data):
+    """Create courses in bulk; see create_many_records."""
+    return create_many_records(mongo, 'courses', courses_data, build_course)
+
 def get_course(mongo, course_id):
     """Retrieve a course by ID."""
     return mongo.db.courses.find_one({'id': str(course_id)}, {'_id': 0})
@@ -225,7 +470,7 @@ def create_financial_health(mongo, fh_data):
         'score': fh_data.get('score'),
         'status': fh_data.get('status'),
         'status_key': fh_data.get('status_key'),
-        'badges': json.dumps(fh_data.get('badges', [])),
+        'badges': list(fh_data.get('badges', [])),
         'step': fh_data.get('step')
     }
     try:
@@ -235,22 +480,13 @@ def create_financial_health(mongo, fh_data):
         current_app.logger.error(f"Failed to create financial health record: {str(e)}", extra={'fh_data': fh_data})
         raise
 
-def get_financial_health(mongo, filters):
-    """Retrieve financial health records by filters."""
-    records = mongo.db.financial_health.find(filters, {'_id': 0}).sort('created_at', -1)
-    valid_records = [r for r in records if 'id' in r]
-    for r in records:
-        if 'id' not in r:
-            current_app.logger.warning(f"Skipping financial health record without 'id': {r}")
-    return valid_records
+def get_financial_health(mongo, filters, fields=None, limit=None):
+    """Iterate financial health records by filters, newest first; see iter_records for the options."""
+    return iter_records(mongo, 'financial_health', filters, fields, limit)
 
 def to_dict_financial_health(fh):
     """Convert financial health document to dict."""
-    try:
-        badges = json.loads(fh['badges']) if fh.get('badges') else []
-    except json.JSONDecodeError:
-        current_app.logger.error(f"Invalid JSON in badges for FinancialHealth ID {fh.get('id', 'unknown')}")
-        badges = []
+    badges = stored_value(fh, 'badges', [], 'FinancialHealth')
     return {
         'id': fh.get('id', None),
         'user_id': fh.get('user_id', None),
@@ -275,13 +511,13 @@ def to_dict_financial_health(fh):
     }
 
 # Budget helper functions
-def create_budget(mongo, budget_data):
-    """Create a budget record."""
+def build_budget(budget_data):
+    """Validate budget data and build the document to store."""
     required_fields = ['session_id']
     for field in required_fields:
         if field not in budget_data or budget_data[field] is None:
             raise ValueError(f"Missing required field: {field}")
-    budget = {
+    return {
         'id': str(uuid.uuid4()),
         'user_id': budget_data.get('user_id'),
         'session_id': budget_data['session_id'],
@@ -299,21 +535,24 @@ def create_budget(mongo, budget_data):
         'miscellaneous': budget_data.get('miscellaneous', 0.0),
         'others': budget_data.get('others', 0.0)
     }
+
+def create_budget(mongo, budget_data):
+    """Create a budget record."""
+    budget = build_budget(budget_data)
     try:
-        mongo.db.budgets.insert_one(budget)
+        get_db(mongo).budgets.insert_one(budget)
         return budget
     except Exception as e:
         current_app.logger.error(f"Failed to create budget record: {str(e)}", extra={'budget_data': budget_data})
         raise
 
-def get_budgets(mongo, filters):
-    """Retrieve budget records by filters."""
-    records = mongo.db.budgets.find(filters, {'_id': 0}).sort('created_at', -1)
-    valid_records = [r for r in records if 'id' in r]
-    for r in records:
-        if 'id' not in r:
-            current_app.logger.warning(f"Skipping budget record without 'id': {r}")
-    return valid_records
+def create_budgets_many(mongo, budgets_data):
+    """Create budget records in bulk; see create_many_records."""
+    return create_many_records(mongo, 'budgets', budgets_data, build_budget)
+
+def get_budgets(mongo, filters, fields=None, limit=None):
+    """Iterate budget records by filters, newest first; see iter_records for the options."""
+    return iter_records(mongo, 'budgets', filters, fields, limit)
 
 def to_dict_budget(budget):
     """Convert budget document to dict."""
@@ -337,13 +576,29 @@ def to_dict_budget(budget):
     }
 
 # Bill helper functions
-def create_bill(mongo, bill_data):
-    """Create a bill record."""
+def to_due_date(value):
+    """Convert a date, datetime or 'YYYY-MM-DD' string to a midnight datetime stored as a BSON date."""
+    if isinstance(value, datetime):
+        return datetime.combine(value.date(), time.min)
+    if isinstance(value, date):
+        return datetime.combine(value, time.min)
+    return datetime.strptime(value, '%Y-%m-%d')
+
+def parse_due_date(value):
+    """Return a stored due date (BSON date or legacy string) as a date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def build_bill(bill_data):
+    """Validate bill data and build the document to store."""
     required_fields = ['session_id', 'bill_name', 'amount', 'due_date', 'frequency', 'category', 'status']
     for field in required_fields:
         if field not in bill_data or bill_data[field] is None:
             raise ValueError(f"Missing required field: {field}")
-    bill = {
+    return {
         'id': str(uuid.uuid4()),
         'user_id': bill_data.get('user_id'),
         'session_id': bill_data['session_id'],
@@ -352,28 +607,31 @@ def create_bill(mongo, bill_data):
         'first_name': bill_data.get('first_name'),
         'bill_name': bill_data['bill_name'],
         'amount': bill_data['amount'],
-        'due_date': bill_data['due_date'].strftime('%Y-%m-%d') if isinstance(bill_data['due_date'], date) else bill_data['due_date'],
+        'due_date': to_due_date(bill_data['due_date']),
         'frequency': bill_data['frequency'],
         'category': bill_data['category'],
         'status': bill_data['status'],
         'send_email': bill_data.get('send_email', False),
         'reminder_days': bill_data.get('reminder_days')
     }
+
+def create_bill(mongo, bill_data):
+    """Create a bill record."""
+    bill = build_bill(bill_data)
     try:
-        mongo.db.bills.insert_one(bill)
+        get_db(mongo).bills.insert_one(bill)
         return bill
     except Exception as e:
         current_app.logger.error(f"Failed to create bill record: {str(e)}", extra={'bill_data': bill_data})
         raise
 
-def get_bills(mongo, filters):
-    """Retrieve bill records by filters."""
-    records = mongo.db.bills.find(filters, {'_id': 0})
-    valid_records = [r for r in records if 'id' in r]
-    for r in records:
-        if 'id' not in r:
-            current_app.logger.warning(f"Skipping bill record without 'id': {r}")
-    return valid_records
+def create_bills_many(mongo, bills_data):
+    """Create bill records in bulk; see create_many_records."""
+    return create_many_records(mongo, 'bills', bills_data, build_bill)
+
+def get_bills(mongo, filters, fields=None, limit=None):
+    """Iterate bill records by filters, newest first; see iter_records for the options."""
+    return iter_records(mongo, 'bills', filters, fields, limit)
 
 def to_dict_bill(bill):
     """Convert bill document to dict."""
@@ -386,7 +644,7 @@ def to_dict_bill(bill):
         'first_name': bill.get('first_name', None),
         'bill_name': bill.get('bill_name', ''),
         'amount': bill.get('amount', 0.0),
-        'due_date': bill.get('due_date', ''),
+        'due_date': bill['due_date'].strftime('%Y-%m-%d') if isinstance(bill.get('due_date'), datetime) else bill.get('due_date', ''),
         'frequency': bill.get('frequency', ''),
         'category': bill.get('category', ''),
         'status': bill.get('status', ''),
@@ -416,7 +674,7 @@ def create_net_worth(mongo, nw_data):
         'total_assets': nw_data.get('total_assets'),
         'total_liabilities': nw_data.get('total_liabilities'),
         'net_worth': nw_data.get('net_worth'),
-        'badges': json.dumps(nw_data.get('badges', []))
+        'badges': list(nw_data.get('badges', []))
     }
     try:
         mongo.db.net_worth.insert_one(nw)
@@ -425,22 +683,13 @@ def create_net_worth(mongo, nw_data):
         current_app.logger.error(f"Failed to create net worth record: {str(e)}", extra={'nw_data': nw_data})
         raise
 
-def get_net_worth(mongo, filters):
-    """Retrieve net worth records by filters."""
-    records = mongo.db.net_worth.find(filters, {'_id': 0}).sort('created_at', -1)
-    valid_records = [r for r in records if 'id' in r]
-    for r in records:
-        if 'id' not in r:
-            current_app.logger.warning(f"Skipping net worth record without 'id': {r}")
-    return valid_records
+def get_net_worth(mongo, filters, fields=None, limit=None):
+    """Iterate net worth records by filters, newest first; see iter_records for the options."""
+    return iter_records(mongo, 'net_worth', filters, fields, limit)
 
 def to_dict_net_worth(nw):
     """Convert net worth document to dict."""
-    try:
-        badges = json.loads(nw['badges']) if nw.get('badges') else []
-    except json.JSONDecodeError:
-        current_app.logger.error(f"Invalid JSON in badges for NetWorth ID {nw.get('id', 'unknown')}")
-        badges = []
+    badges = stored_value(nw, 'badges', [], 'NetWorth')
     return {
         'id': nw.get('id', None),
         'user_id': nw.get('user_id', None),
@@ -486,7 +735,7 @@ def create_emergency_fund(mongo, ef_data):
         'savings_gap': ef_data.get('savings_gap'),
         'monthly_savings': ef_data.get('monthly_savings'),
         'percent_of_income': ef_data.get('percent_of_income'),
-        'badges': json.dumps(ef_data.get('badges', []))
+        'badges': list(ef_data.get('badges', []))
     }
     try:
         mongo.db.emergency_funds.insert_one(ef)
@@ -495,22 +744,13 @@ def create_emergency_fund(mongo, ef_data):
         current_app.logger.error(f"Failed to create emergency fund record: {str(e)}", extra={'ef_data': ef_data})
         raise
 
-def get_emergency_funds(mongo, filters):
-    """Retrieve emergency fund records by filters."""
-    records = mongo.db.emergency_funds.find(filters, {'_id': 0}).sort('created_at', -1)
-    valid_records = [r for r in records if 'id' in r]
-    for r in records:
-        if 'id' not in r:
-            current_app.logger.warning(f"Skipping emergency fund record without 'id': {r}")
-    return valid_records
+def get_emergency_funds(mongo, filters, fields=None, limit=None):
+    """Iterate emergency fund records by filters, newest first; see iter_records for the options."""
+    return iter_records(mongo, 'emergency_funds', filters, fields, limit)
 
 def to_dict_emergency_fund(ef):
     """Convert emergency fund document to dict."""
-    try:
-        badges = json.loads(ef['badges']) if ef.get('badges') else []
-    except json.JSONDecodeError:
-        current_app.logger.error(f"Invalid JSON in badges for EmergencyFund ID {ef.get('id', 'unknown')}")
-        badges = []
+    badges = stored_value(ef, 'badges', [], 'EmergencyFund')
     return {
         'id': ef.get('id', None),
         'user_id': ef.get('user_id', None),
@@ -546,8 +786,8 @@ def create_learning_progress(mongo, lp_data):
         'user_id': lp_data.get('user_id'),
         'session_id': lp_data['session_id'],
         'course_id': lp_data['course_id'],
-        'lessons_completed': json.dumps(lp_data.get('lessons_completed', [])),
-        'quiz_scores': json.dumps(lp_data.get('quiz_scores', {})),
+        'lessons_completed': list(lp_data.get('lessons_completed', [])),
+        'quiz_scores': dict(lp_data.get('quiz_scores', {})),
         'current_lesson': lp_data.get('current_lesson'),
         'created_at': lp_data.get('created_at', datetime.utcnow())
     }
@@ -558,24 +798,14 @@ def create_learning_progress(mongo, lp_data):
         current_app.logger.error(f"Failed to create learning progress record: {str(e)}", extra={'lp_data': lp_data})
         raise
 
-def get_learning_progress(mongo, filters):
-    """Retrieve learning progress records by filters."""
-    records = mongo.db.learning_progress.find(filters, {'_id': 0}).sort('created_at', -1)
-    valid_records = [r for r in records if 'id' in r]
-    for r in records:
-        if 'id' not in r:
-            current_app.logger.warning(f"Skipping learning progress record without 'id': {r}")
-    return valid_records
+def get_learning_progress(mongo, filters, fields=None, limit=None):
+    """Iterate learning progress records by filters, newest first; see iter_records for the options."""
+    return iter_records(mongo, 'learning_progress', filters, fields, limit)
 
 def to_dict_learning_progress(lp):
     """Convert learning progress document to dict."""
-    try:
-        lessons_completed = json.loads(lp['lessons_completed']) if lp.get('lessons_completed') else []
-        quiz_scores = json.loads(lp['quiz_scores']) if lp.get('quiz_scores') else {}
-    except json.JSONDecodeError:
-        current_app.logger.error(f"Invalid JSON in LearningProgress ID {lp.get('id', 'unknown')}")
-        lessons_completed = []
-        quiz_scores = {}
+    lessons_completed = stored_value(lp, 'lessons_completed', [], 'LearningProgress')
+    quiz_scores = stored_value(lp, 'quiz_scores', {}, 'LearningProgress')
     return {
         'id': lp.get('id', None),
         'user_id': lp.get('user_id', None),
@@ -604,9 +834,9 @@ def create_quiz_result(mongo, qr_data):
         'send_email': qr_data.get('send_email', False),
         'personality': qr_data.get('personality'),
         'score': qr_data.get('score'),
-        'badges': json.dumps(qr_data.get('badges', [])),
-        'insights': json.dumps(qr_data.get('insights', [])),
-        'tips': json.dumps(qr_data.get('tips', []))
+        'badges': list(qr_data.get('badges', [])),
+        'insights': list(qr_data.get('insights', [])),
+        'tips': list(qr_data.get('tips', []))
     }
     try:
         mongo.db.quiz_results.insert_one(qr)
@@ -615,26 +845,15 @@ def create_quiz_result(mongo, qr_data):
         current_app.logger.error(f"Failed to create quiz result record: {str(e)}", extra={'qr_data': qr_data})
         raise
 
-def get_quiz_results(mongo, filters):
-    """Retrieve quiz result records by filters."""
-    records = mongo.db.quiz_results.find(filters, {'_id': 0}).sort('created_at', -1)
-    valid_records = [r for r in records if 'id' in r]
-    for r in records:
-        if 'id' not in r:
-            current_app.logger.warning(f"Skipping quiz result record without 'id': {r}")
-    return valid_records
+def get_quiz_results(mongo, filters, fields=None, limit=None):
+    """Iterate quiz result records by filters, newest first; see iter_records for the options."""
+    return iter_records(mongo, 'quiz_results', filters, fields, limit)
 
 def to_dict_quiz_result(qr):
     """Convert quiz result document to dict."""
-    try:
-        badges = json.loads(qr['badges']) if qr.get('badges') else []
-        insights = json.loads(qr['insights']) if qr.get('insights') else []
-        tips = json.loads(qr['tips']) if qr.get('tips') else []
-    except json.JSONDecodeError:
-        current_app.logger.error(f"Invalid JSON in QuizResult ID {qr.get('id', 'unknown')}")
-        badges = []
-        insights = []
-        tips = []
+    badges = stored_value(qr, 'badges', [], 'QuizResult')
+    insights = stored_value(qr, 'insights', [], 'QuizResult')
+    tips = stored_value(qr, 'tips', [], 'QuizResult')
     return {
         'id': qr.get('id', None),
         'user_id': qr.get('user_id', None),
@@ -673,14 +892,9 @@ def create_feedback(mongo, feedback_data):
         current_app.logger.error(f"Failed to create feedback record: {str(e)}", extra={'feedback_data': feedback_data})
         raise
 
-def get_feedback(mongo, filters):
-    """Retrieve feedback records by filters."""
-    records = mongo.db.feedback.find(filters, {'_id': 0})
-    valid_records = [r for r in records if 'id' in r]
-    for r in records:
-        if 'id' not in r:
-            current_app.logger.warning(f"Skipping feedback record without 'id': {r}")
-    return valid_records
+def get_feedback(mongo, filters, fields=None, limit=None):
+    """Iterate feedback records by filters, newest first; see iter_records for the options."""
+    return iter_records(mongo, 'feedback', filters, fields, limit)
 
 def to_dict_feedback(feedback):
     """Convert feedback document to dict."""
@@ -694,54 +908,226 @@ def to_dict_feedback(feedback):
         'comment': feedback.get('comment', None)
     }
 
+# ScoreDistribution helper functions
+# Scores are whole numbers from 0 to 100, so each distribution is a fixed 101-bucket histogram
+SCORE_BUCKETS = 101
+SCORE_DISTRIBUTION_CACHE_TTL = 60
+score_distribution_cache = {}
+
+def score_bucket(score):
+    """Map a score to its histogram bucket."""
+    return max(0, min(SCORE_BUCKETS - 1, int(round(float(score)))))
+
+def build_score_summary(counts, total, score_sum):
+    """Precompute suffix sums so rank and percentile lookups are O(1)."""
+    higher = [0] * (SCORE_BUCKETS + 1)
+    for bucket in range(SCORE_BUCKETS - 1, -1, -1):
+        higher[bucket] = higher[bucket + 1] + counts[bucket]
+    return {'counts': counts, 'higher': higher, 'total': total, 'sum': score_sum}
+
+def rebuild_score_distribution(mongo, name, collection, filters=None):
+    """Recompute a score histogram from the source collection and store it."""
+    db = get_db(mongo)
+    counts = [0] * SCORE_BUCKETS
+    total = 0
+    score_sum = 0
+    try:
+        pipeline = [
+            {'$match': {**(filters or {}), 'score': {'$type': 'number'}}},
+            {'$group': {'_id': {'$round': ['$score', 0]}, 'count': {'$sum': 1}}}
+        ]
+        for row in db[collection].aggregate(pipeline):
+            bucket = score_bucket(row['_id'])
+            counts[bucket] += row['count']
+            total += row['count']
+            score_sum += bucket * row['count']
+        db.score_distributions.replace_one(
+            {'_id': name},
+            {'_id': name, 'counts': counts, 'total': total, 'sum': score_sum, 'updated_at': datetime.utcnow()},
+            upsert=True
+        )
+        score_distribution_cache[name] = (datetime.utcnow(), build_score_summary(counts, total, score_sum))
+        current_app.logger.info(f"Rebuilt score distribution {name} from {total} records")
+        return counts
+    except Exception as e:
+        current_app.logger.error(f"Failed to rebuild score distribution {name}: {str(e)}")
+        raise
+
+def update_score_distribution(mongo, name, new_score, old_score=None):
+    """Move one record into the bucket for new_score, out of old_score's bucket if given."""
+    new_bucket = score_bucket(new_score)
+    inc = {f'counts.{new_bucket}': 1, 'sum': new_bucket}
+    if old_score is None:
+        inc['total'] = 1
+    else:
+        old_bucket = score_bucket(old_score)
+        if old_bucket == new_bucket:
+            return
+        inc[f'counts.{old_bucket}'] = -1
+        inc['sum'] = new_bucket - old_bucket
+    try:
+        result = get_db(mongo).score_distributions.update_one({'_id': name}, {'$inc': inc, '$set': {'updated_at': datetime.utcnow()}})
+        if result.matched_count:
+            cached = score_distribution_cache.get(name)
+            if cached:
+                counts = list(cached[1]['counts'])
+                counts[new_bucket] += 1
+                if old_score is not None:
+                    counts[score_bucket(old_score)] -= 1
+                score_distribution_cache[name] = (cached[0], build_score_summary(counts, cached[1]['total'] + inc.get('total', 0), cached[1]['sum'] + inc['sum']))
+        else:
+            # No stored distribution yet; it is built from source records on the next read
+            score_distribution_cache.pop(name, None)
+    except Exception as e:
+        current_app.logger.error(f"Failed to update score distribution {name}: {str(e)}")
+        raise
+
+def get_score_distribution(mongo, name, collection, filters=None):
+    """Return a cached score histogram summary, building it on first use."""
+    cached = score_distribution_cache.get(name)
+    if cached and (datetime.utcnow() - cached[0]).total_seconds() < SCORE_DISTRIBUTION_CACHE_TTL:
+        return cached[1]
+    doc = get_db(mongo).score_distributions.find_one({'_id': name})
+    if doc is None or len(doc.get('counts', [])) != SCORE_BUCKETS:
+        rebuild_score_distribution(mongo, name, collection, filters)
+        return score_distribution_cache[name][1]
+    summary = build_score_summary(doc['counts'], doc.get('total', 0), doc.get('sum', 0))
+    score_distribution_cache[name] = (datetime.utcnow(), summary)
+    return summary
+
+def score_rank(summary, score):
+    """Return (rank, percentile, average) for a score against a distribution summary."""
+    total = summary['total']
+    if not total:
+        return 0, 0.0, 0
+    bucket = score_bucket(score)
+    rank = summary['higher'][bucket + 1] + 1
+    below = total - summary['higher'][bucket]
+    percentile = below / total * 100
+    average = summary['sum'] / total
+    return rank, percentile, average
+
+# Dashboard helper functions
+# (key, collection, sort newest first, limit) for each tool shown on the general dashboard
+DASHBOARD_SOURCES = [
+    ('financial_health', 'financial_health', True, 1),
+    ('budget', 'budgets', True, 1),
+    ('bills', 'bills', False, None),
+    ('net_worth', 'net_worth', True, 1),
+    ('emergency_fund', 'emergency_funds', True, 1),
+    ('learning_progress', 'learning_progress', True, None),
+    ('quiz', 'quiz_results', True, 1)
+]
+
+def get_dashboard_records(mongo, filters):
+    """
+    Retrieve the dashboard records for every tool in a single aggregation.
+
+    Each tool contributes only its latest record (all bills and learning
+    progress rows) through $unionWith, so the dashboard costs one round trip.
+
+    Returns:
+        dict: Tool key mapped to a list of raw documents, newest first.
+    """
+    def branch(key, sort, limit):
+        stages = [{'$match': {**filters, 'id': {'$exists': True}}}]
+        if sort:
+            stages.append({'$sort': {'created_at': -1}})
+        if limit:
+            stages.append({'$limit': limit})
+        stages.append({'$project': {'_id': 0}})
+        stages.append({'$addFields': {'dashboard_tool': key}})
+        return stages
+
+    first_key, first_collection, first_sort, first_limit = DASHBOARD_SOURCES[0]
+    pipeline = branch(first_key, first_sort, first_limit)
+    for key, collection, sort, limit in DASHBOARD_SOURCES[1:]:
+        pipeline.append({'$unionWith': {'coll': collection, 'pipeline': branch(key, sort, limit)}})
+    results = {key: [] for key, _, _, _ in DASHBOARD_SOURCES}
+    try:
+        for record in get_db(mongo)[first_collection].aggregate(pipeline):
+            results[record.pop('dashboard_tool')].append(record)
+        return results
+    except Exception as e:
+        current_app.logger.error(f"Failed to retrieve dashboard records: {str(e)}", extra={'filters': filters})
+        raise
+
 # ToolUsage helper functions
-def create_tool_usage(mongo, tool_usage_data):
-    """Create a tool usage record."""
+# tool_usage is a time-series collection: created_at is the timeField and
+# 'meta' ({tool_name, action}) the metaField, so events of one tool action
+# share buckets. Documents written before the conversion keep tool_name and
+# action at the top level; to_dict_tool_usage reads both shapes.
+def build_tool_usage(tool_usage_data):
+    """Validate tool usage data and build the document to store."""
     required_fields = ['tool_name', 'session_id']
     for field in required_fields:
         if field not in tool_usage_data or tool_usage_data[field] is None:
             raise ValueError(f"Missing required field: {field}")
-    tool_usage = {
+    return {
         'id': str(uuid.uuid4()),
-        'tool_name': tool_usage_data['tool_name'],
+        'meta': {
+            'tool_name': tool_usage_data['tool_name'],
+            'action': tool_usage_data.get('action', 'unknown')
+        },
         'user_id': tool_usage_data.get('user_id'),
         'session_id': tool_usage_data['session_id'],
-        'action': tool_usage_data.get('action', 'unknown'),
         'created_at': tool_usage_data.get('created_at', datetime.utcnow())
     }
+
+def tool_usage_filters(tool_name=None, action=None, start=None, end=None):
+    """Build a tool_usage query for an optional tool, action and [start, end) created_at range."""
+    filters = {}
+    if tool_name:
+        filters['meta.tool_name'] = tool_name
+    if action:
+        filters['meta.action'] = action
+    if start or end:
+        filters['created_at'] = {}
+        if start:
+            filters['created_at']['$gte'] = start
+        if end:
+            filters['created_at']['$lt'] = end
+    return filters
+
+def create_tool_usage(mongo, tool_usage_data):
+    """Create a tool usage record."""
+    tool_usage = build_tool_usage(tool_usage_data)
     try:
-        mongo.db.tool_usage.insert_one(tool_usage)
+        get_db(mongo).tool_usage.insert_one(tool_usage)
         return tool_usage
     except Exception as e:
         current_app.logger.error(f"Failed to create tool usage record: {str(e)}", extra={'tool_usage_data': tool_usage_data})
         raise
 
-def get_tool_usage(mongo, filters):
-    """Retrieve tool usage records by filters."""
-    records = mongo.db.tool_usage.find(filters, {'_id': 0})
-    valid_records = [r for r in records if 'id' in r]
-    for r in records:
-        if 'id' not in r:
-            current_app.logger.warning(f"Skipping tool usage record without 'id': {r}")
-    return valid_records
+def create_tool_usage_many(mongo, tool_usage_data):
+    """Create tool usage records in bulk; see create_many_records."""
+    return create_many_records(mongo, 'tool_usage', tool_usage_data, build_tool_usage)
+
+def get_tool_usage(mongo, filters, fields=None, limit=None):
+    """Iterate tool usage records by filters, newest first; see iter_records for the options."""
+    return iter_records(mongo, 'tool_usage', filters, fields, limit)
 
 def to_dict_tool_usage(tu):
     """Convert tool usage document to dict."""
+    meta = tu.get('meta') or {}
     return {
         'id': tu.get('id', None),
-        'tool_name': tu.get('tool_name', ''),
+        'tool_name': meta.get('tool_name', tu.get('tool_name', '')),
         'user_id': tu.get('user_id', None),
         'session_id': tu.get('session_id', None),
-        'action': tu.get('action', 'unknown'),
+        'action': meta.get('action', tu.get('action', 'unknown')),
         'created_at': (tu['created_at'].isoformat() + "Z") if isinstance(tu.get('created_at'), datetime) else tu.get('created_at', '')
     }
 
 def log_tool_usage(mongo, tool_name, user_id=None, session_id=None, action=None, details=None):
     """
     Log tool usage to the MongoDB tool_usage collection.
+
+    Records are queued on the app's buffered tool usage sink and written in
+    batches; without a sink the record is inserted immediately.
     
     Args:
-        mongo: PyMongo instance
+        mongo: PyMongo instance (or its Database)
         tool_name (str): Name of the tool (e.g., 'financial_health', 'budget')
         user_id (str): ID of the authenticated user (None if unauthenticated)
         session_id (str): Session ID for tracking unauthenticated users
@@ -750,12 +1136,17 @@ def log_tool_usage(mongo, tool_name, user_id=None, session_id=None, action=None,
     """
     session_id = session_id or session.get('sid', str(uuid.uuid4()))  # Generate new session_id if none exists
     try:
-        create_tool_usage(mongo, {
+        tool_usage_data = {
             'tool_name': tool_name,
             'user_id': user_id,
             'session_id': session_id,
             'action': action or 'unknown'
-        })
+        }
+        sink = current_app.config.get('TOOL_USAGE_SINK')
+        if sink is not None:
+            sink.enqueue(build_tool_usage(tool_usage_data))
+        else:
+            create_tool_usage(mongo, tool_usage_data)
         current_app.logger.info(f"Logged tool usage: {tool_name} for session {session_id}", extra={'details': details})
     except Exception as e:
         current_app.logger.error(f"Failed to log tool usage: {str(e)}", extra={'tool_name': tool_name, 'session_id': session_id, 'details': details})
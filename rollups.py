@@ -0,0 +1,201 @@
+import os
+import logging
+from datetime import datetime, timedelta
+from time import monotonic
+
+# Set up logging
+logger = logging.getLogger('ficore_app')
+
+# Pre-aggregated counters for the admin overview, refreshed by a scheduler job:
+#   usage_rollups: one document per (hour, tool_name, action) with its event count
+#   daily_rollups: one document per UTC day ('YYYY-MM-DD') with new_users,
+#                  referrals, feedback_count and rating_sum
+#   usage_facets:  one document per tool_name with the actions seen for it,
+#                  used for the admin filter drop-downs
+# Each run recomputes whole hours and days from the watermark onwards and
+# replaces them, so reruns and overlapping runs are harmless.
+USAGE_ROLLUPS = 'usage_rollups'
+DAILY_ROLLUPS = 'daily_rollups'
+USAGE_FACETS = 'usage_facets'
+ROLLUP_JOB_ID = 'usage_rollups'
+ROLLUP_INTERVAL = int(os.environ.get('USAGE_ROLLUP_INTERVAL', 300))
+# Events can reach MongoDB late (the tool usage sink buffers them), so each run
+# goes back this far before the previous watermark
+ROLLUP_LATENESS = timedelta(seconds=int(os.environ.get('USAGE_ROLLUP_LATENESS', 600)))
+UNDATED_DAY = 'undated'
+# Facet lists are served from memory for this long before the catalog is read again
+FACET_CACHE_TTL = int(os.environ.get('USAGE_FACET_CACHE_TTL', 300))
+facet_cache = {}
+
+def floor_hour(moment):
+    """Truncate a datetime to the start of its hour."""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def day_key(created_at='$created_at'):
+    """Aggregation expression for the 'YYYY-MM-DD' day of a date, 'undated' for anything else."""
+    return {'$cond': [
+        {'$eq': [{'$type': created_at}, 'date']},
+        {'$dateToString': {'format': '%Y-%m-%d', 'date': created_at}},
+        UNDATED_DAY
+    ]}
+
+def since_filter(since):
+    """Match documents created at or after since; everything when since is None."""
+    return {'created_at': {'$gte': since}} if since is not None else {}
+
+def rollup_tool_usage(db, since):
+    """Recompute hourly tool usage rollups for every hour from since (a whole hour) onwards."""
+    db.tool_usage.aggregate([
+        {'$match': {'created_at': {'$gte': since} if since is not None else {'$type': 'date'}}},
+        {'$group': {
+            '_id': {
+                'hour': {'$dateTrunc': {'date': '$created_at', 'unit': 'hour'}},
+                # Documents from before the time-series conversion keep these at the top level
+                'tool_name': {'$ifNull': ['$meta.tool_name', '$tool_name']},
+                'action': {'$ifNull': ['$meta.action', '$action', 'unknown']}
+            },
+            'count': {'$sum': 1}
+        }},
+        {'$project': {
+            'hour': '$_id.hour',
+            'tool_name': '$_id.tool_name',
+            'action': '$_id.action',
+            'count': 1,
+            'updated_at': '$$NOW'
+        }},
+        {'$merge': {'into': USAGE_ROLLUPS, 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+    ], allowDiskUse=True)
+
+def rollup_facets(db, since):
+    """Add the actions of the rollup hours from since onwards to the per-tool facet catalog."""
+    db[USAGE_ROLLUPS].aggregate([
+        {'$match': {'hour': {'$gte': since}} if since is not None else {}},
+        {'$group': {'_id': '$tool_name', 'actions': {'$addToSet': '$action'}}},
+        {'$set': {'updated_at': '$$NOW'}},
+        {'$merge': {
+            'into': USAGE_FACETS,
+            'on': '_id',
+            'whenMatched': [{'$set': {
+                'actions': {'$setUnion': ['$actions', '$$new.actions']},
+                'updated_at': '$$new.updated_at'
+            }}],
+            'whenNotMatched': 'insert'
+        }}
+    ])
+    facet_cache.clear()
+
+def action_facets(db, tool_name=None):
+    """
+    Sorted actions recorded for a tool, or for all tools, from the facet catalog.
+
+    The catalog is kept by the rollup job and cached in memory for
+    FACET_CACHE_TTL seconds, so the admin filters never scan tool_usage.
+    """
+    cached = facet_cache.get('catalog')
+    if cached is None or cached[0] < monotonic():
+        catalog = {doc['_id']: doc.get('actions', []) for doc in db[USAGE_FACETS].find({}, {'actions': 1})}
+        cached = (monotonic() + FACET_CACHE_TTL, catalog)
+        facet_cache['catalog'] = cached
+    catalog = cached[1]
+    if tool_name:
+        actions = catalog.get(tool_name, [])
+    else:
+        actions = {action for tool_actions in catalog.values() for action in tool_actions}
+    return sorted(action for action in actions if action)
+
+def rollup_daily(db, since):
+    """Recompute daily user, referral and feedback counters for every day from since (a whole day) onwards."""
+    merge = {'$merge': {'into': DAILY_ROLLUPS, 'on': '_id', 'whenMatched': 'merge', 'whenNotMatched': 'insert'}}
+    db.users.aggregate([
+        {'$match': since_filter(since)},
+        {'$group': {
+            '_id': day_key(),
+            'new_users': {'$sum': 1},
+            'referrals': {'$sum': {'$cond': [{'$ifNull': ['$referred_by_id', False]}, 1, 0]}}
+        }},
+        {'$set': {'updated_at': '$$NOW'}},
+        merge
+    ], allowDiskUse=True)
+    db.feedback.aggregate([
+        {'$match': since_filter(since)},
+        {'$group': {
+            '_id': day_key(),
+            'feedback_count': {'$sum': 1},
+            'rating_sum': {'$sum': '$rating'}
+        }},
+        {'$set': {'updated_at': '$$NOW'}},
+        merge
+    ], allowDiskUse=True)
+
+def refresh_rollups(db, rebuild=False):
+    """
+    Bring the rollup collections up to date with the raw collections.
+
+    Args:
+        db: MongoDB Database
+        rebuild (bool): Recompute everything instead of resuming from the watermark
+
+    Returns:
+        datetime: Start of the recomputed range, None after a full rebuild
+    """
+    now = datetime.utcnow()
+    state = None if rebuild else db.job_state.find_one({'_id': ROLLUP_JOB_ID})
+    watermark = (state or {}).get('watermark')
+    since = floor_hour(watermark - ROLLUP_LATENESS) if watermark else None
+    if since is None:
+        db[USAGE_ROLLUPS].delete_many({})
+        db[DAILY_ROLLUPS].delete_many({})
+        db[USAGE_FACETS].delete_many({})
+    rollup_tool_usage(db, since)
+    rollup_facets(db, since)
+    rollup_daily(db, since.replace(hour=0) if since is not None else None)
+    db.job_state.update_one(
+        {'_id': ROLLUP_JOB_ID},
+        {'$set': {'watermark': now, 'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+    logger.info(f"Refreshed usage rollups from {since.isoformat() if since else 'the beginning'}")
+    return since
+
+def overview_metrics(db, top_tools=3, top_actions=5):
+    """
+    Read the admin overview totals from the rollup collections.
+
+    Returns:
+        dict: total_users, total_referrals, avg_feedback_rating, tool_usage_total,
+        top_tools as (tool_name, count) and action_breakdown as {tool_name: [(action, count)]}
+    """
+    daily = list(db[DAILY_ROLLUPS].aggregate([
+        {'$group': {
+            '_id': None,
+            'new_users': {'$sum': '$new_users'},
+            'referrals': {'$sum': '$referrals'},
+            'feedback_count': {'$sum': '$feedback_count'},
+            'rating_sum': {'$sum': '$rating_sum'}
+        }}
+    ]))
+    daily = daily[0] if daily else {}
+    usage_by_tool = list(db[USAGE_ROLLUPS].aggregate([
+        {'$group': {'_id': '$tool_name', 'count': {'$sum': '$count'}}},
+        {'$sort': {'count': -1}}
+    ]))
+    top = [(row['_id'], row['count']) for row in usage_by_tool[:top_tools]]
+    action_breakdown = {tool_name: [] for tool_name, _ in top}
+    if top:
+        for row in db[USAGE_ROLLUPS].aggregate([
+            {'$match': {'tool_name': {'$in': list(action_breakdown)}}},
+            {'$group': {'_id': {'tool_name': '$tool_name', 'action': '$action'}, 'count': {'$sum': '$count'}}},
+            {'$sort': {'count': -1}}
+        ]):
+            actions = action_breakdown[row['_id']['tool_name']]
+            if len(actions) < top_actions:
+                actions.append((row['_id']['action'], row['count']))
+    feedback_count = daily.get('feedback_count', 0)
+    return {
+        'total_users': daily.get('new_users', 0),
+        'total_referrals': daily.get('referrals', 0),
+        'avg_feedback_rating': (daily.get('rating_sum', 0) / feedback_count) if feedback_count else 0.0,
+        'tool_usage_total': sum(row['count'] for row in usage_by_tool),
+        'top_tools': top,
+        'action_breakdown': action_breakdown
+    }
@@ -2,8 +2,15 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.jobstores.memory import MemoryJobStore
 from datetime import datetime, date, timedelta
 from flask import current_app, url_for
-from mailersend_email import send_email, trans, EMAIL_CONFIG
+from mailersend_email import send_email, trans, EMAIL_CONFIG, email_batch
+from migrations import migrate_bill_due_dates
+from models import parse_due_date
+from email_outbox import dispatch_outbox
+from rollups import refresh_rollups, ROLLUP_INTERVAL
+from tool_usage_store import archive_tool_usage
+from translations import flush_missing, MISSING_FLUSH_INTERVAL
 import time
+from functools import wraps
 import psutil
 import os
 
@@ -42,117 +49,180 @@ def update_overdue_status():
         try:
             mongo = current_app.extensions['mongo']
             db = mongo.db
-            bills_collection = db.bills
-            today = date.today()
-            bills = bills_collection.find({'status': {'$in': ['pending', 'unpaid']}})
-            updated_count = 0
-            for bill in bills:
-                bill_due_date = bill['due_date']
-                if isinstance(bill_due_date, str):
-                    bill_due_date = datetime.strptime(bill_due_date, '%Y-%m-%d').date()
-                if bill_due_date < today:
-                    bills_collection.update_one(
-                        {'_id': bill['_id']},
-                        {'$set': {'status': 'overdue'}}
-                    )
-                    updated_count += 1
+            migrate_bill_due_dates(db)
+            today = datetime.combine(date.today(), datetime.min.time())
+            result = db.bills.update_many(
+                {'status': {'$in': ['pending', 'unpaid']}, 'due_date': {'$lt': today}},
+                {'$set': {'status': 'overdue'}}
+            )
+            updated_count = result.modified_count
             current_app.logger.info(f"Updated {updated_count} overdue bill statuses")
         except Exception as e:
             current_app.logger.exception(f"Error in update_overdue_status: {str(e)}")
             raise
 
+# Recipients handled per batch and per run; the watermark carries the rest to the next run
+REMINDER_BATCH_SIZE = int(os.environ.get('BILL_REMINDER_BATCH_SIZE', 50))
+REMINDER_MAX_PER_RUN = int(os.environ.get('BILL_REMINDER_MAX_PER_RUN', 200))
+REMINDER_MAX_DAYS = 30  # Upper bound of the reminder_days field on the bill form
+
+def reminder_candidates(db, today, watermark, limit):
+    """Group bills due for a reminder by recipient, for recipients after the watermark."""
+    window_start = datetime.combine(today, datetime.min.time())
+    window_end = window_start + timedelta(days=REMINDER_MAX_DAYS)
+    pipeline = [
+        {'$match': {
+            'send_email': True,
+            'user_email': {'$gt': watermark},
+            '$or': [
+                {'status': {'$in': ['pending', 'overdue']}},
+                {'due_date': {'$gte': window_start, '$lte': window_end}}
+            ]
+        }},
+        {'$sort': {'user_email': 1}},
+        {'$group': {
+            '_id': '$user_email',
+            'first_name': {'$first': '$first_name'},
+            'bills': {'$push': {
+                'bill_name': '$bill_name',
+                'amount': '$amount',
+                'due_date': '$due_date',
+                'category': '$category',
+                'status': '$status',
+                'reminder_days': '$reminder_days'
+            }}
+        }},
+        {'$sort': {'_id': 1}},
+        {'$limit': limit}
+    ]
+    return list(db.bills.aggregate(pipeline, allowDiskUse=True))
+
+def reminder_bills(bills, today, lang):
+    """Keep bills that are pending, overdue or inside their own reminder window."""
+    selected = []
+    for bill in bills:
+        try:
+            bill_due_date = parse_due_date(bill['due_date'])
+        except (ValueError, TypeError, KeyError):
+            continue
+        reminder_window = today + timedelta(days=bill.get('reminder_days') or 7)
+        if bill['status'] in ['pending', 'overdue'] or today <= bill_due_date <= reminder_window:
+            selected.append({
+                'bill_name': bill['bill_name'],
+                'amount': bill['amount'],
+                'due_date': bill_due_date.strftime('%Y-%m-%d'),
+                'category': trans(f"bill_category_{bill['category']}", lang=lang),
+                'status': trans(f"bill_status_{bill['status']}", lang=lang)
+            })
+    return selected
+
 @log_job_metrics('send_bill_reminders')
 def send_bill_reminders():
-    """Send reminders for upcoming and overdue bills in batches."""
+    """Send reminders for upcoming and overdue bills, resuming from the last processed recipient."""
     with current_app.app_context():
         try:
             mongo = current_app.extensions['mongo']
             db = mongo.db
-            bills_collection = db.bills
-            bill_reminders_collection = db.bill_reminders
-            users_collection = db.users
             today = date.today()
-            user_bills = {}
-            max_emails_per_run = 10  # Limit to 10 emails per job execution
+            state = db.job_state.find_one({'_id': 'bill_reminders'}) or {}
+            watermark = state.get('watermark')
+            if watermark is None:
+                if state.get('completed_on') == today.isoformat():
+                    current_app.logger.info("Bill reminders already sent to all recipients today")
+                    return
+                watermark = ''
             email_count = 0
-
-            bills = bills_collection.find().limit(100)  # Process up to 100 bills per run
-            for bill in bills:
-                email = bill['user_email']
-                user = users_collection.find_one({'email': email}, {'lang': 1})
-                lang = user.get('lang', 'en') if user else 'en'
-                if bill.get('send_email') and email:
-                    reminder_window = today + timedelta(days=bill.get('reminder_days', 7))
-                    bill_due_date = bill['due_date']
-                    if isinstance(bill_due_date, str):
-                        bill_due_date = datetime.strptime(bill_due_date, '%Y-%m-%d').date()
-                    if (bill['status'] in ['pending', 'overdue'] or 
-                        (today <= bill_due_date <= reminder_window)):
-                        if email not in user_bills:
-                            user_bills[email] = {
-                                'first_name': bill.get('first_name', 'User'),
-                                'bills': [],
-                                'lang': lang
+            processed = 0
+            finished = False
+            config = EMAIL_CONFIG["bill_reminder"]
+            base_url = current_app.config.get('BASE_URL', 'http://localhost:5000')
+            with current_app.test_request_context(base_url=base_url), email_batch():
+                while processed < REMINDER_MAX_PER_RUN:
+                    limit = min(REMINDER_BATCH_SIZE, REMINDER_MAX_PER_RUN - processed)
+                    groups = reminder_candidates(db, today, watermark, limit)
+                    if not groups:
+                        finished = True
+                        break
+                    emails = [group['_id'] for group in groups]
+                    langs = {user['email']: user.get('lang', 'en') for user in db.users.find({'email': {'$in': emails}}, {'email': 1, 'lang': 1})}
+                    for group in groups:
+                        email = group['_id']
+                        lang = langs.get(email, 'en')
+                        bills = reminder_bills(group['bills'], today, lang)
+                        if not email or not bills:
+                            continue
+                        try:
+                            reminder_data = {
+                                'email': email,
+                                'first_name': group.get('first_name') or 'User',
+                                'bills': bills,
+                                'lang': lang,
+                                'sent_at': datetime.utcnow(),
+                                'cta_url': url_for('bill.dashboard', _external=True),
+                                'unsubscribe_url': url_for('bill.unsubscribe', email=email, _external=True)
                             }
-                        user_bills[email]['bills'].append({
-                            'bill_name': bill['bill_name'],
-                            'amount': bill['amount'],
-                            'due_date': bill_due_date.strftime('%Y-%m-%d'),
-                            'category': trans(f"bill_category_{bill['category']}", lang=lang),
-                            'status': trans(f"bill_status_{bill['status']}", lang=lang)
-                        })
-
-            for email, data in user_bills.items():
-                if email_count >= max_emails_per_run:
-                    current_app.logger.info(f"Reached max emails ({max_emails_per_run}), stopping")
-                    break
-                try:
-                    config = EMAIL_CONFIG["bill_reminder"]
-                    subject = trans(config["subject_key"], lang=data['lang'])
-                    reminder_data = {
-                        'email': email,
-                        'first_name': data['first_name'],
-                        'bills': data['bills'],
-                        'lang': data['lang'],
-                        'sent_at': datetime.utcnow(),
-                        'cta_url': url_for('bill.dashboard', _external=True),
-                        'unsubscribe_url': url_for('bill.unsubscribe', email=email, _external=True)
-                    }
-                    send_email(
-                        app=current_app,
-                        logger=current_app.logger,
-                        to_email=email,
-                        subject=subject,
-                        template_name=config["template"],
-                        data=reminder_data,
-                        lang=data['lang']
-                    )
-                    bill_reminders_collection.insert_one(reminder_data)
-                    current_app.logger.info(f"Sent bill reminder email to {email} and saved to bill_reminders")
-                    email_count += 1
-                except Exception as e:
-                    current_app.logger.error(f"Failed to send reminder email to {email}: {str(e)}")
-            current_app.logger.info(f"Sent {email_count} bill reminder emails")
+                            send_email(
+                                app=current_app,
+                                logger=current_app.logger,
+                                to_email=email,
+                                subject=trans(config["subject_key"], lang=lang),
+                                template_key="bill_reminder",
+                                data=reminder_data,
+                                lang=lang,
+                                job_id='bill_reminders'
+                            )
+                            db.bill_reminders.insert_one(reminder_data)
+                            email_count += 1
+                        except Exception as e:
+                            current_app.logger.error(f"Failed to send reminder email to {email}: {str(e)}")
+                    processed += len(groups)
+                    watermark = emails[-1]
+                    # Checkpoint after every batch so a crash or restart resumes here
+                    db.job_state.update_one({'_id': 'bill_reminders'}, {'$set': {'watermark': watermark, 'updated_at': datetime.utcnow()}}, upsert=True)
+                    if len(groups) < limit:
+                        finished = True
+                        break
+            if finished:
+                db.job_state.update_one(
+                    {'_id': 'bill_reminders'},
+                    {'$set': {'watermark': None, 'completed_on': today.isoformat(), 'updated_at': datetime.utcnow()}},
+                    upsert=True
+                )
+            current_app.logger.info(f"Sent {email_count} bill reminder emails to {processed} recipients, {'cycle complete' if finished else f'resuming after {watermark}'}")
         except Exception as e:
             current_app.logger.error(f"Error in send_bill_reminders: {str(e)}", exc_info=True)
             raise
 
-@log_job_metrics('cleanup_sessions')
-def cleanup_sessions():
-    """Remove expired sessions from the sessions collection."""
+@log_job_metrics('usage_rollups')
+def update_usage_rollups():
+    """Fold new tool usage, users and feedback into the admin overview rollups."""
     with current_app.app_context():
         try:
-            mongo = current_app.extensions['mongo']
-            db = mongo.db
-            sessions_collection = db.sessions
-            result = sessions_collection.delete_many({
-                'expiration': {'$lt': datetime.utcnow()}
-            })
-            current_app.logger.info(f"Deleted {result.deleted_count} expired sessions")
+            refresh_rollups(current_app.extensions['mongo'].db)
         except Exception as e:
-            current_app.logger.error(f"Error in cleanup_sessions: {str(e)}", exc_info=True)
+            current_app.logger.error(f"Error in update_usage_rollups: {str(e)}", exc_info=True)
             raise
 
+@log_job_metrics('tool_usage_archive')
+def archive_expiring_tool_usage():
+    """Archive tool usage days that are about to leave the hot-retention window."""
+    with current_app.app_context():
+        try:
+            written = archive_tool_usage(current_app.extensions['mongo'].db)
+            if written:
+                current_app.logger.info(f"Archived {len(written)} days of tool usage")
+        except Exception as e:
+            current_app.logger.error(f"Error in archive_expiring_tool_usage: {str(e)}", exc_info=True)
+            raise
+
+def run_in_app_context(app, func):
+    """Wrap a job so it runs inside the application context on the scheduler thread."""
+    @wraps(func)
+    def job():
+        with app.app_context():
+            return func()
+    return job
+
 def init_scheduler(app, mongo):
     """Initialize the background scheduler."""
     with app.app_context():
@@ -162,7 +232,7 @@ def init_scheduler(app, mongo):
             }
             scheduler = BackgroundScheduler(jobstores=jobstores)
             scheduler.add_job(
-                func=update_overdue_status,
+                func=run_in_app_context(app, update_overdue_status),
                 trigger='interval',
                 days=1,
                 id='overdue_status',
@@ -170,24 +240,55 @@ def init_scheduler(app, mongo):
                 replace_existing=True
             )
             scheduler.add_job(
-                func=send_bill_reminders,
+                func=run_in_app_context(app, send_bill_reminders),
                 trigger='interval',
-                days=1,
+                hours=1,
                 id='bill_reminders',
-                name='Send bill reminders daily',
+                name='Send bill reminders, resuming hourly until all recipients are covered',
                 replace_existing=True
             )
             scheduler.add_job(
-                func=cleanup_sessions,
+                func=run_in_app_context(app, log_job_metrics('email_outbox')(dispatch_outbox)),
                 trigger='interval',
-                days=1,
-                id='cleanup_sessions',
-                name='Clean up expired sessions daily',
+                seconds=int(os.environ.get('EMAIL_OUTBOX_INTERVAL', 15)),
+                id='email_outbox',
+                name='Send queued emails from the outbox',
+                max_instances=1,
+                coalesce=True,
+                replace_existing=True
+            )
+            scheduler.add_job(
+                func=run_in_app_context(app, update_usage_rollups),
+                trigger='interval',
+                seconds=ROLLUP_INTERVAL,
+                next_run_time=datetime.now(),
+                id='usage_rollups',
+                name='Refresh admin overview usage rollups',
+                max_instances=1,
+                coalesce=True,
+                replace_existing=True
+            )
+            scheduler.add_job(
+                func=run_in_app_context(app, archive_expiring_tool_usage),
+                trigger='interval',
+                hours=int(os.environ.get('TOOL_USAGE_ARCHIVE_INTERVAL_HOURS', 6)),
+                id='tool_usage_archive',
+                name='Archive tool usage before it expires',
+                max_instances=1,
+                coalesce=True,
+                replace_existing=True
+            )
+            scheduler.add_job(
+                func=flush_missing,
+                trigger='interval',
+                seconds=MISSING_FLUSH_INTERVAL,
+                id='missing_translations',
+                name='Log a summary of missing translation keys',
                 replace_existing=True
             )
             scheduler.start()
             app.config['SCHEDULER'] = scheduler
-            app.logger.info("Bill reminder, overdue status, and session cleanup scheduler started successfully")
+            app.logger.info("Bill reminder, overdue status, email outbox, and usage rollup scheduler started successfully")
             return scheduler
         except Exception as e:
             app.logger.error(f"Failed to initialize scheduler: {str(e)}", exc_info=True)
@@ -0,0 +1,114 @@
+import os
+import re
+import time
+import pickle
+import hashlib
+import logging
+from flask import request
+from flask.sessions import SessionInterface
+from guest_session import HybridSessionInterface
+
+# Set up logging
+logger = logging.getLogger('ficore_app')
+
+# Requests that never need a server-side session: probes, crawler files and assets
+SESSIONLESS_PATHS = {'/health', '/favicon.ico', '/robots.txt', '/sitemap.xml'}
+SESSIONLESS_PATHS.update(p.strip() for p in os.environ.get('SESSIONLESS_PATHS', '').split(',') if p.strip())
+SESSIONLESS_PREFIXES = ('/static/',)
+SESSIONLESS_METHODS = {'HEAD', 'OPTIONS'}
+
+# Unchanged sessions are still saved this often so the cookie and the
+# 'expiration' used by the sessions TTL index keep sliding forward
+SESSION_REFRESH_INTERVAL = int(os.environ.get('SESSION_REFRESH_INTERVAL', 24 * 60 * 60))
+REFRESHED_AT_KEY = '_refreshed_at'
+
+# User agents of crawlers, link previewers, uptime monitors and health checkers
+BOT_USER_AGENT = re.compile(
+    r'bot|crawl|spider|slurp|bingpreview|facebookexternalhit|embedly|whatsapp|'
+    r'pingdom|uptimerobot|statuscake|site24x7|monitor|kube-probe|googlehc|'
+    r'elb-healthchecker|go-http-client|python-requests|curl|wget|headless',
+    re.IGNORECASE
+)
+
+def is_bot(user_agent):
+    """Return True for empty or well-known automated user agents."""
+    return not user_agent or BOT_USER_AGENT.search(user_agent) is not None
+
+def is_sessionless_request(req=None):
+    """
+    Decide whether a request should be served without creating or saving a session.
+
+    The result is cached on the WSGI environ so the check runs once per request.
+    """
+    req = req or request
+    cached = req.environ.get('ficore.sessionless')
+    if cached is None:
+        cached = (
+            req.method in SESSIONLESS_METHODS
+            or req.path in SESSIONLESS_PATHS
+            or req.path.startswith(SESSIONLESS_PREFIXES)
+            or is_bot(req.user_agent.string)
+        )
+        req.environ['ficore.sessionless'] = cached
+    return cached
+
+def session_fingerprint(session):
+    """Digest of the session payload, used to detect changes between open and save."""
+    try:
+        payload = pickle.dumps(sorted(session.items()), protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+class SessionAvoidingInterface(SessionInterface):
+    """
+    Wraps the configured session interface. Sessions are never persisted for
+    sessionless requests, and are only written back when their contents changed
+    or the refresh interval has passed, whatever session.modified says.
+    """
+
+    def __init__(self, base):
+        self.base = base
+
+    def __getattr__(self, name):
+        return getattr(self.base, name)
+
+    def open_session(self, app, req):
+        session = self.base.open_session(app, req)
+        if session is not None:
+            session.fingerprint = session_fingerprint(session) if session else None
+        return session
+
+    def is_dirty(self, session):
+        fingerprint = getattr(session, 'fingerprint', None)
+        if fingerprint is None:
+            # New session, or one that could not be fingerprinted
+            return True
+        refreshed_at = session.get(REFRESHED_AT_KEY, 0)
+        if time.time() - refreshed_at >= SESSION_REFRESH_INTERVAL:
+            return True
+        return session_fingerprint(session) != fingerprint
+
+    def save_session(self, app, session, response):
+        if is_sessionless_request():
+            return
+        if not self.is_dirty(session):
+            return
+        if session:
+            session[REFRESHED_AT_KEY] = int(time.time())
+        return self.base.save_session(app, session, response)
+
+def install_session_policy(app):
+    """
+    Wrap app.session_interface with the session-avoidance and dirty-check policy,
+    keeping anonymous sessions in a signed cookie unless SESSION_GUEST_COOKIE is 'false'.
+    """
+    interface = app.session_interface
+    if isinstance(interface, SessionAvoidingInterface):
+        return interface
+    if os.environ.get('SESSION_GUEST_COOKIE', 'true').lower() == 'true':
+        interface = HybridSessionInterface(interface)
+        logger.info(f"Guest sessions stored in the '{interface.cookie_name}' cookie up to {interface.budget} bytes")
+    app.session_interface = SessionAvoidingInterface(interface)
+    logger.info(f"Session avoidance enabled for paths: {sorted(SESSIONLESS_PATHS)}")
+    return app.session_interface
@@ -0,0 +1,98 @@
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('pymongo')
+pytest.importorskip('flask')
+pytest.importorskip('numpy')
+
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from models import build_tool_usage
+from migrations import (
+    timeseries_tool_usage, migrate_financial_health_assessments, migrate_user_ids,
+    FINANCIAL_HEALTH_MIGRATION_ID
+)
+
+@pytest.fixture
+def db():
+    """Throwaway database on TEST_MONGO_URI; skips when no server is reachable."""
+    client = MongoClient(os.environ.get('TEST_MONGO_URI', 'mongodb://localhost:27017'), serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command('ping')
+    except PyMongoError:
+        client.close()
+        pytest.skip('MongoDB is not reachable')
+    name = f"ficore_test_{uuid.uuid4().hex[:12]}"
+    yield client[name]
+    client.drop_database(name)
+    client.close()
+
+def test_timeseries_tool_usage_keeps_meta_of_new_events():
+    doc = {'_id': ObjectId(), **build_tool_usage({'tool_name': 'budget', 'action': 'step1_view', 'session_id': 's1'})}
+    event = timeseries_tool_usage(doc)
+    assert event['meta'] == {'tool_name': 'budget', 'action': 'step1_view'}
+    assert event['session_id'] == 's1'
+    assert event['created_at'] == doc['created_at']
+
+def test_timeseries_tool_usage_moves_top_level_fields_of_legacy_events():
+    created_at = datetime(2024, 1, 1)
+    doc = {'_id': ObjectId(), 'id': 'a', 'tool_name': 'quiz', 'action': None, 'user_id': 'u1', 'session_id': 's1', 'created_at': created_at}
+    event = timeseries_tool_usage(doc)
+    assert event['meta'] == {'tool_name': 'quiz', 'action': 'unknown'}
+    assert event['user_id'] == 'u1'
+    assert event['created_at'] == created_at
+
+def test_migrate_financial_health_assessments_folds_step_records(db):
+    created_at = datetime(2024, 1, 1)
+    db.financial_health_scores.insert_many([
+        {'_id': 'a1', 'step': 1, 'session_id': 's1', 'first_name': 'Ada', 'created_at': created_at},
+        {'_id': 'a2', 'step': 2, 'session_id': 's1', 'income': 1000.0, 'created_at': created_at},
+        {
+            '_id': 'a3', 'step': 3, 'user_id': 'u1', 'session_id': 's1', 'first_name': 'Ada', 'email': 'ada@example.com',
+            'user_type': 'individual', 'send_email': False, 'income': 1000.0, 'expenses': 600.0, 'debt': 200.0,
+            'interest_rate': 10.0, 'debt_to_income': 20.0, 'savings_rate': 40.0, 'interest_burden': 0.17,
+            'score': 85, 'status': 'Excellent', 'status_key': 'excellent', 'badges': [], 'created_at': created_at
+        }
+    ])
+    assert migrate_financial_health_assessments(db) == 1
+    docs = list(db.financial_health_scores.find())
+    assert [doc['_id'] for doc in docs] == ['a3']
+    assessment = docs[0]
+    assert assessment['state'] == 'completed'
+    assert assessment['latest'] is True
+    assert assessment['score'] == 85
+    assert assessment['completed_at'] == created_at
+    assert assessment['step1'] == {'first_name': 'Ada', 'email': 'ada@example.com', 'user_type': 'individual', 'send_email': False}
+    assert assessment['step2'] == {'income': 1000.0, 'expenses': 600.0}
+    assert assessment['step3']['debt'] == 200.0
+    assert assessment['step3']['score'] == 85
+    assert 'step' not in assessment and 'income' not in assessment
+    assert db.job_state.find_one({'_id': FINANCIAL_HEALTH_MIGRATION_ID}) is not None
+
+def test_migrate_financial_health_assessments_runs_once(db):
+    migrate_financial_health_assessments(db)
+    db.financial_health_scores.insert_one({'_id': 'late', 'step': 3, 'score': 50, 'created_at': datetime(2024, 1, 1)})
+    assert migrate_financial_health_assessments(db) == 0
+    assert db.financial_health_scores.find_one({'_id': 'late'})['step'] == 3
+    assert migrate_financial_health_assessments(db, force=True) == 1
+
+def test_migrate_user_ids_converts_ids_to_strings(db):
+    db.users.create_index('id')
+    db.users.insert_many([
+        {'id': 7, 'email': 'a@example.com'},
+        {'id': 8, 'email': 'b@example.com', 'referred_by_id': 7},
+        {'id': 'already', 'email': 'c@example.com', 'referred_by_id': None}
+    ])
+    assert migrate_user_ids(db) == 2
+    users = {user['email']: user for user in db.users.find()}
+    assert users['a@example.com']['id'] == '7'
+    assert users['b@example.com']['id'] == '8'
+    assert users['b@example.com']['referred_by_id'] == '7'
+    assert users['c@example.com']['id'] == 'already'
+    assert users['c@example.com']['referred_by_id'] is None
+    assert [info['key'] for info in db.users.index_information().values()] == [[('_id', 1)]]
+    assert migrate_user_ids(db) == 0
@@ -0,0 +1,140 @@
+import os
+import logging
+from datetime import datetime, timedelta, time
+from pymongo.errors import CollectionInvalid
+from exports import iter_tool_usage_batches, ndjson_chunks, gzip_chunks
+
+# Set up logging
+logger = logging.getLogger('ficore_app')
+
+# tool_usage is a time-series collection with created_at as timeField and
+# 'meta' ({tool_name, action}) as metaField. MongoDB removes events once they
+# are older than the hot-retention window; each day is archived to a gzipped
+# NDJSON file a few days before that happens.
+TOOL_USAGE_COLLECTION = 'tool_usage'
+TOOL_USAGE_RETENTION_DAYS = int(os.environ.get('TOOL_USAGE_RETENTION_DAYS', 90))  # 0 keeps events forever
+TOOL_USAGE_GRANULARITY = os.environ.get('TOOL_USAGE_GRANULARITY', 'minutes')
+TOOL_USAGE_ARCHIVE_DIR = os.environ.get('TOOL_USAGE_ARCHIVE_DIR', os.path.join('archive', 'tool_usage'))
+TOOL_USAGE_ARCHIVE_MARGIN_DAYS = int(os.environ.get('TOOL_USAGE_ARCHIVE_MARGIN_DAYS', 3))
+ARCHIVE_JOB_ID = 'tool_usage_archive'
+
+def retention_seconds():
+    """expireAfterSeconds for tool_usage, or None when retention is disabled."""
+    return TOOL_USAGE_RETENTION_DAYS * 24 * 60 * 60 if TOOL_USAGE_RETENTION_DAYS > 0 else None
+
+def collection_info(db, name):
+    """Return the listCollections entry for a collection, or None if it does not exist."""
+    return next(db.list_collections(filter={'name': name}), None)
+
+def is_timeseries(db, name=TOOL_USAGE_COLLECTION):
+    """True if the collection exists and is a time-series collection."""
+    info = collection_info(db, name)
+    return info is not None and info.get('type') == 'timeseries'
+
+def create_tool_usage_collection(db):
+    """Create tool_usage as a time-series collection with the configured retention."""
+    options = {
+        'timeseries': {
+            'timeField': 'created_at',
+            'metaField': 'meta',
+            'granularity': TOOL_USAGE_GRANULARITY
+        }
+    }
+    if retention_seconds():
+        options['expireAfterSeconds'] = retention_seconds()
+    db.create_collection(TOOL_USAGE_COLLECTION, **options)
+    logger.info(f"Created time-series collection {TOOL_USAGE_COLLECTION} with {TOOL_USAGE_RETENTION_DAYS or 'unlimited'} days retention")
+
+def ensure_tool_usage_collection(db):
+    """
+    Create tool_usage as a time-series collection if it does not exist yet, and
+    keep its retention in line with TOOL_USAGE_RETENTION_DAYS. Must run before
+    indexes are reconciled, which would otherwise create a regular collection.
+
+    Returns:
+        bool: True if tool_usage is a time-series collection
+    """
+    info = collection_info(db, TOOL_USAGE_COLLECTION)
+    if info is None:
+        try:
+            create_tool_usage_collection(db)
+        except CollectionInvalid:
+            # Another worker created it first
+            pass
+        return is_timeseries(db)
+    if info.get('type') != 'timeseries':
+        logger.warning(f"{TOOL_USAGE_COLLECTION} is a regular collection; run 'flask migrate-tool-usage-timeseries' to convert it")
+        return False
+    current = info.get('options', {}).get('expireAfterSeconds')
+    wanted = retention_seconds()
+    if current != wanted:
+        db.command('collMod', TOOL_USAGE_COLLECTION, expireAfterSeconds=wanted if wanted else 'off')
+        logger.info(f"Changed {TOOL_USAGE_COLLECTION} retention from {current} to {wanted} seconds")
+    return True
+
+def archive_cutoff(now=None):
+    """Start of the first day that is not due for archiving; earlier days expire within the margin."""
+    now = now or datetime.utcnow()
+    cutoff_day = (now - timedelta(days=TOOL_USAGE_RETENTION_DAYS - TOOL_USAGE_ARCHIVE_MARGIN_DAYS)).date()
+    return datetime.combine(cutoff_day, time.min)
+
+def archive_path(day):
+    """Archive file of one UTC day."""
+    return os.path.join(TOOL_USAGE_ARCHIVE_DIR, f"tool_usage-{day.isoformat()}.ndjson.gz")
+
+def archive_day(db, day, collection=TOOL_USAGE_COLLECTION):
+    """
+    Write one UTC day of tool usage to a gzipped NDJSON file.
+
+    The file is written under a temporary name and renamed when complete, so a
+    crash never leaves a truncated archive behind. Days without events are skipped.
+
+    Returns:
+        str: Path of the archive, or None if the day had no events
+    """
+    start = datetime.combine(day, time.min)
+    filters = {'created_at': {'$gte': start, '$lt': start + timedelta(days=1)}}
+    if db[collection].find_one(filters, {'_id': 1}) is None:
+        return None
+    path = archive_path(day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.partial"
+    with open(partial, 'wb') as archive:
+        for chunk in gzip_chunks(ndjson_chunks(iter_tool_usage_batches(db, filters, collection=collection)), level=9):
+            archive.write(chunk)
+    os.replace(partial, path)
+    return path
+
+def archive_tool_usage(db, now=None, collection=TOOL_USAGE_COLLECTION):
+    """
+    Archive every day that will expire within TOOL_USAGE_ARCHIVE_MARGIN_DAYS
+    and has not been archived yet. Progress is checkpointed per day in
+    job_state, so an interrupted run resumes with the next day.
+
+    Returns:
+        list: Paths of the archives written
+    """
+    if not retention_seconds():
+        return []
+    cutoff_day = archive_cutoff(now).date()
+    state = db.job_state.find_one({'_id': ARCHIVE_JOB_ID}) or {}
+    if state.get('archived_through'):
+        day = datetime.strptime(state['archived_through'], '%Y-%m-%d').date() + timedelta(days=1)
+    else:
+        oldest = db[collection].find_one({'created_at': {'$type': 'date'}}, {'created_at': 1}, sort=[('created_at', 1)])
+        if oldest is None:
+            return []
+        day = oldest['created_at'].date()
+    written = []
+    while day < cutoff_day:
+        path = archive_day(db, day, collection)
+        if path:
+            written.append(path)
+            logger.info(f"Archived {collection} events of {day.isoformat()} to {path}")
+        db.job_state.update_one(
+            {'_id': ARCHIVE_JOB_ID},
+            {'$set': {'archived_through': day.isoformat(), 'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+        day += timedelta(days=1)
+    return written
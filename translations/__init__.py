@@ -1,6 +1,13 @@
+import os
+import sys
+import json
+import time
 import logging
-from flask import session, has_request_context, g, request  
-from typing import Dict, Optional, Union
+import importlib
+import threading
+from types import MappingProxyType
+from flask import session, has_request_context, request
+from typing import Dict, List, Optional, Union
 
 # Set up logger to match app.py
 root_logger = logging.getLogger('ficore_app')
@@ -24,36 +31,26 @@ class SessionAdapter(logging.LoggerAdapter):
 
 logger = SessionAdapter(root_logger, {})
 
-# Import translation modules
-try:
-    from .translations_core import CORE_TRANSLATIONS as translations_core
-    from .translations_quiz import QUIZ_TRANSLATIONS as translations_quiz
-    from .translations_mailersend import MAILERSEND_TRANSLATIONS as translations_mailersend
-    from .translations_bill import BILL_TRANSLATIONS as translations_bill
-    from .translations_budget import BUDGET_TRANSLATIONS as translations_budget
-    from .translations_dashboard import DASHBOARD_TRANSLATIONS as translations_dashboard
-    from .translations_emergency_fund import EMERGENCY_FUND_TRANSLATIONS as translations_emergency_fund
-    from .translations_financial_health import FINANCIAL_HEALTH_TRANSLATIONS as translations_financial_health
-    from .translations_net_worth import NET_WORTH_TRANSLATIONS as translations_net_worth
-    from .translations_learning_hub import LEARNING_HUB_TRANSLATIONS as translations_learning_hub
-except ImportError as e:
-    logger.error(f"Failed to import translation module: {str(e)}", exc_info=True)
-    raise
-
-# Map module names to translation dictionaries
-translation_modules = {
-    'core': translations_core,
-    'quiz': translations_quiz,
-    'mailersend': translations_mailersend,
-    'bill': translations_bill,
-    'budget': translations_budget,
-    'dashboard': translations_dashboard,
-    'emergency_fund': translations_emergency_fund,
-    'financial_health': translations_financial_health,
-    'net_worth': translations_net_worth,
-    'learning_hub': translations_learning_hub
+# Translation modules shipped with the app: module name -> (python module, catalog attribute).
+# Each catalog is {lang: {key: text}} and is imported on first use.
+TRANSLATION_SOURCES = {
+    'core': ('translations_core', 'CORE_TRANSLATIONS'),
+    'quiz': ('translations_quiz', 'QUIZ_TRANSLATIONS'),
+    'mailersend': ('translations_mailersend', 'MAILERSEND_TRANSLATIONS'),
+    'bill': ('translations_bill', 'BILL_TRANSLATIONS'),
+    'budget': ('translations_budget', 'BUDGET_TRANSLATIONS'),
+    'dashboard': ('translations_dashboard', 'DASHBOARD_TRANSLATIONS'),
+    'emergency_fund': ('translations_emergency_fund', 'EMERGENCY_FUND_TRANSLATIONS'),
+    'financial_health': ('translations_financial_health', 'FINANCIAL_HEALTH_TRANSLATIONS'),
+    'net_worth': ('translations_net_worth', 'NET_WORTH_TRANSLATIONS'),
+    'learning_hub': ('translations_learning_hub', 'LEARNING_HUB_TRANSLATIONS')
 }
 
+# Language packs are JSON files named <lang>.json holding flat {key: text} entries.
+# Dropping e.g. yo.json or ig.json here adds the language; entries also override module text.
+PACKS_DIR = os.environ.get('TRANSLATION_PACKS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'packs'))
+DEFAULT_LANGUAGE = 'en'
+
 # Map key prefixes to module names
 KEY_PREFIX_TO_MODULE = {
     'core_': 'core',
@@ -72,19 +69,162 @@ KEY_PREFIX_TO_MODULE = {
 # Quiz-specific keys without prefixes
 QUIZ_SPECIFIC_KEYS = {'Yes', 'No', 'See Results'}
 
-# Log loaded translations
-for module_name, translations in translation_modules.items():
-    for lang in ['en', 'ha']:
-        lang_dict = translations.get(lang, {})
-        logger.info(f"Loaded {len(lang_dict)} translations for module '{module_name}', lang='{lang}'")
+def module_for_key(key: str) -> str:
+    """Return the module a key is routed to by its prefix."""
+    for prefix, mod in KEY_PREFIX_TO_MODULE.items():
+        if key.startswith(prefix):
+            return mod
+    return 'core'
+
+loader_lock = threading.RLock()
+module_catalogs: Dict[str, Dict[str, Dict[str, str]]] = {}
+language_tables: Dict[str, MappingProxyType] = {}
+quiz_tables: Dict[str, MappingProxyType] = {}
+known_languages: List[str] = []
+
+def load_module(module_name: str) -> Dict[str, Dict[str, str]]:
+    """Import a translation module on first use and return its {lang: {key: text}} catalog."""
+    catalog = module_catalogs.get(module_name)
+    if catalog is None:
+        with loader_lock:
+            catalog = module_catalogs.get(module_name)
+            if catalog is None:
+                python_module, attribute = TRANSLATION_SOURCES[module_name]
+                try:
+                    catalog = getattr(importlib.import_module(f'.{python_module}', __name__), attribute)
+                except (ImportError, AttributeError) as e:
+                    logger.error(f"Failed to import translation module '{module_name}': {str(e)}", exc_info=True)
+                    raise
+                module_catalogs[module_name] = catalog
+    return catalog
+
+def load_pack(lang: str) -> Dict[str, str]:
+    """Read the JSON language pack for lang, if one exists."""
+    path = os.path.join(PACKS_DIR, f'{lang}.json')
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            pack = json.load(f)
+        return {str(key): str(value) for key, value in pack.items()}
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to load language pack {path}: {str(e)}")
+        return {}
+
+def available_languages() -> List[str]:
+    """Languages provided by the core catalog plus any language packs."""
+    if not known_languages:
+        with loader_lock:
+            if not known_languages:
+                languages = set(load_module('core'))
+                if os.path.isdir(PACKS_DIR):
+                    languages.update(name[:-5] for name in os.listdir(PACKS_DIR) if name.endswith('.json'))
+                languages.discard(DEFAULT_LANGUAGE)
+                known_languages.extend([DEFAULT_LANGUAGE] + sorted(languages))
+    return known_languages
+
+def module_entries(module_name: str, lang: str) -> Dict[str, str]:
+    """Entries of one (module, lang) catalog that are routed to that module."""
+    return {
+        sys.intern(key): value
+        for key, value in load_module(module_name).get(lang, {}).items()
+        if module_for_key(key) == module_name
+    }
+
+def get_table(lang: str) -> Optional[MappingProxyType]:
+    """
+    Return the read-only {key: text} table for lang, compiling it on first use.
+
+    Keys are interned so every language shares them; English text is
+    pre-merged as the fallback. Returns None for unknown languages.
+    """
+    table = language_tables.get(lang)
+    if table is not None:
+        return table
+    if lang not in available_languages():
+        return None
+    with loader_lock:
+        table = language_tables.get(lang)
+        if table is None:
+            compiled = dict(get_table(DEFAULT_LANGUAGE)) if lang != DEFAULT_LANGUAGE else {}
+            for module_name in TRANSLATION_SOURCES:
+                compiled.update(module_entries(module_name, lang))
+            compiled.update((sys.intern(key), value) for key, value in load_pack(lang).items())
+            table = MappingProxyType(compiled)
+            language_tables[lang] = table
+            logger.info(f"Compiled {len(compiled)} translations for lang='{lang}'")
+    return table
+
+def get_quiz_table(lang: str) -> MappingProxyType:
+    """Quiz pages translate a few unprefixed keys from the quiz module instead of core."""
+    table = quiz_tables.get(lang)
+    if table is None:
+        quiz = load_module('quiz')
+        entries = {}
+        for key in QUIZ_SPECIFIC_KEYS:
+            value = quiz.get(lang, {}).get(key, quiz.get(DEFAULT_LANGUAGE, {}).get(key))
+            if value is not None:
+                entries[key] = value
+        table = MappingProxyType(entries)
+        quiz_tables[lang] = table
+    return table
+
+def preload_translations() -> None:
+    """
+    Compile every available language up front.
+
+    Call before workers fork (gunicorn preload_app) so the tables are built
+    once in the master and shared copy-on-write by the workers.
+    """
+    for lang in available_languages():
+        get_table(lang)
+
+# Missing keys are counted in memory and summarized periodically instead of logged per call
+MISSING_FLUSH_INTERVAL = int(os.environ.get('MISSING_TRANSLATION_FLUSH_INTERVAL', 300))
+missing_counts: Dict[tuple, int] = {}
+missing_unreported = set()
+missing_lock = threading.Lock()
+last_missing_flush = time.monotonic()
+
+def record_missing(key: str, lang: str) -> None:
+    """Count a missing (key, lang) pair; the first occurrence is queued for the next summary."""
+    with missing_lock:
+        count = missing_counts.get((key, lang), 0)
+        missing_counts[(key, lang)] = count + 1
+        if count == 0:
+            missing_unreported.add((key, lang))
+    if time.monotonic() - last_missing_flush >= MISSING_FLUSH_INTERVAL:
+        flush_missing()
+
+def flush_missing() -> None:
+    """Log one summary line for keys that went missing since the last flush."""
+    global last_missing_flush
+    with missing_lock:
+        last_missing_flush = time.monotonic()
+        new_keys = sorted(missing_unreported)
+        missing_unreported.clear()
+        total = len(missing_counts)
+    if new_keys:
+        listed = ', '.join(f"{key} ({lang})" for key, lang in new_keys[:50])
+        more = f" and {len(new_keys) - 50} more" if len(new_keys) > 50 else ''
+        logger.warning(f"{len(new_keys)} new missing translations ({total} total): {listed}{more}")
+
+def missing_translations() -> List[Dict[str, Union[str, int]]]:
+    """Return missing translation keys with hit counts, most frequent first."""
+    with missing_lock:
+        items = list(missing_counts.items())
+    return [
+        {'key': key, 'lang': lang, 'module': module_for_key(key), 'count': count}
+        for (key, lang), count in sorted(items, key=lambda item: (-item[1], item[0]))
+    ]
 
 def trans(key: str, lang: Optional[str] = None, **kwargs: str) -> str:
     """
-    Translate a key using the appropriate module's translation dictionary.
+    Translate a key using the precompiled translation table.
     
     Args:
         key: The translation key (e.g., 'core_submit', 'quiz_yes', 'Yes').
-        lang: Language code ('en', 'ha'). Defaults to session['lang'] or 'en'.
+        lang: Language code (see available_languages()). Defaults to session['lang'] or 'en'.
         **kwargs: String formatting parameters for the translated string.
     
     Returns:
@@ -93,52 +233,31 @@ def trans(key: str, lang: Optional[str] = None, **kwargs: str) -> str:
     
     Notes:
         - Uses session['lang'] if lang is None and request context exists.
-        - Logs warnings for missing translations.
-        - Uses g.logger if available, else the default logger.
+        - Counts missing translations; see missing_translations().
+        - Keys without kwargs are returned straight from the table.
     """
-    current_logger = g.get('logger', logger) if has_request_context() else logger
-    session_id = session.get('sid', 'no-session-id') if has_request_context() else 'no-session-id'
-
-    # Default to session language or 'en'
     if lang is None:
-        lang = session.get('lang', 'en') if has_request_context() else 'en'
-    if lang not in ['en', 'ha']:
-        current_logger.warning(f"Invalid language '{lang}', falling back to 'en'", extra={'session_id': session_id})
-        lang = 'en'
+        lang = session.get('lang', DEFAULT_LANGUAGE) if has_request_context() else DEFAULT_LANGUAGE
+    table = language_tables.get(lang) or get_table(lang)
+    if table is None:
+        logger.warning(f"Invalid language '{lang}', falling back to '{DEFAULT_LANGUAGE}'")
+        lang = DEFAULT_LANGUAGE
+        table = get_table(lang)
 
-    # Determine module based on key prefix or specific keys
-    module_name = 'core'
-    for prefix, mod in KEY_PREFIX_TO_MODULE.items():
-        if key.startswith(prefix):
-            module_name = mod
-            break
+    translation = table.get(key)
     if key in QUIZ_SPECIFIC_KEYS and has_request_context() and '/quiz/' in request.path:
-        module_name = 'quiz'
-
-    module = translation_modules.get(module_name, translation_modules['core'])
-    lang_dict = module.get(lang, {})
-
-    # Get translation
-    translation = lang_dict.get(key)
-
-    # Fallback to English, then key
+        translation = get_quiz_table(lang).get(key, translation)
     if translation is None:
-        en_dict = module.get('en', {})
-        translation = en_dict.get(key, key)
-        if translation == key:
-            current_logger.warning(
-                f"Missing translation for key='{key}' in module '{module_name}', lang='{lang}'",
-                extra={'session_id': session_id}
-            )
-
-    # Apply string formatting
+        record_missing(key, lang)
+        translation = key
+
+    # Fast path: no formatting arguments
+    if not kwargs:
+        return translation
     try:
-        return translation.format(**kwargs) if kwargs else translation
-    except (KeyError, ValueError) as e:
-        current_logger.error(
-            f"Formatting failed for key '{key}', lang='{lang}', kwargs={kwargs}, error={str(e)}",
-            extra={'session_id': session_id}
-        )
+        return translation.format(**kwargs)
+    except (KeyError, ValueError, IndexError) as e:
+        logger.error(f"Formatting failed for key '{key}', lang='{lang}', kwargs={kwargs}, error={str(e)}")
         return translation
 
 def get_translations(lang: Optional[str] = None) -> Dict[str, callable]:
@@ -146,18 +265,18 @@ def get_translations(lang: Optional[str] = None) -> Dict[str, callable]:
     Return a dictionary with a trans callable for the specified language.
 
     Args:
-        lang: Language code ('en', 'ha'). Defaults to session['lang'] or 'en'.
+        lang: Language code (see available_languages()). Defaults to session['lang'] or 'en'.
 
     Returns:
         A dictionary with a 'trans' function that translates keys for the specified language.
     """
     if lang is None:
         lang = session.get('lang', 'en') if has_request_context() else 'en'
-    if lang not in ['en', 'ha']:
-        logger.warning(f"Invalid language '{lang}', falling back to 'en'")
-        lang = 'en'
+    if lang not in available_languages():
+        logger.warning(f"Invalid language '{lang}', falling back to '{DEFAULT_LANGUAGE}'")
+        lang = DEFAULT_LANGUAGE
     return {
         'trans': lambda key, **kwargs: trans(key, lang=lang, **kwargs)
     }
 
-__all__ = ['trans']
+__all__ = ['trans', 'available_languages', 'preload_translations', 'missing_translations', 'flush_missing']
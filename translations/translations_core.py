@@ -29,6 +29,10 @@ CORE_TRANSLATIONS = {
         # Module: core
          'admin_usage_logs': 'Usage Logs',
         'admin_export_csv': 'Export CSV',
+        'admin_export_ndjson': 'Export NDJSON (gzip)',
+        'admin_export_parquet': 'Export Parquet',
+        'admin_first_page': 'First page',
+        'admin_next_page': 'Older logs',
         'admin_id': 'ID',
         'admin_user_id': 'User ID',
         'admin_session_id': 'Session ID',
@@ -996,6 +1000,10 @@ CORE_TRANSLATIONS = {
         # Module: tool
         'admin_usage_logs': 'Log ɗin Amfani',
         'admin_export_csv': 'Fitar da CSV',
+        'admin_export_ndjson': 'Fitar da NDJSON (gzip)',
+        'admin_export_parquet': 'Fitar da Parquet',
+        'admin_first_page': 'Shafin farko',
+        'admin_next_page': 'Tsofaffin bayanai',
         'admin_id': 'ID',
         'admin_user_id': 'ID na Mai Amfani',
         'admin_session_id': 'ID na Zama',
@@ -0,0 +1,121 @@
+import os
+import threading
+import logging
+from collections import deque
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError
+
+# Set up logging
+logger = logging.getLogger('ficore_app')
+
+def parse_write_concern(value):
+    """Convert a write concern setting ('0', '1', 'majority') to a WriteConcern."""
+    value = str(value or '1').strip()
+    if value.isdigit():
+        return WriteConcern(w=int(value))
+    return WriteConcern(w=value)
+
+class ToolUsageSink:
+    """Buffers tool usage events in memory and writes them to MongoDB in batches."""
+
+    def __init__(self, collection, batch_size=100, flush_interval=5.0, max_queue=10000):
+        self.collection = collection
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.1, float(flush_interval))
+        self.queue = deque()
+        self.max_queue = max(self.batch_size, int(max_queue))
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def enqueue(self, record):
+        """Queue a tool usage document; the background thread writes it later."""
+        with self._lock:
+            if len(self.queue) >= self.max_queue:
+                self.queue.popleft()
+                self.dropped += 1
+            self.queue.append(record)
+            pending = len(self.queue)
+        self._ensure_thread()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write all queued events using unordered insert_many calls."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self.queue:
+                        break
+                    batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+                try:
+                    self.collection.insert_many(batch, ordered=False)
+                    written += len(batch)
+                except BulkWriteError as e:
+                    errors = e.details.get('writeErrors', [])
+                    written += len(batch) - len(errors)
+                    logger.error(f"Tool usage batch partially failed: {len(errors)} of {len(batch)} records rejected")
+                except Exception as e:
+                    with self._lock:
+                        self.queue.extendleft(reversed(batch))
+                    logger.error(f"Failed to flush {len(batch)} tool usage records: {str(e)}")
+                    break
+        if self.dropped:
+            logger.warning(f"Tool usage queue overflowed, dropped {self.dropped} records")
+            self.dropped = 0
+        return written
+
+    def shutdown(self):
+        """Stop the background thread and write out whatever is still queued."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 5)
+        written = self.flush()
+        logger.info(f"Tool usage sink shut down, flushed {written} records")
+
+    def _ensure_thread(self):
+        # Started lazily so each forked worker gets its own flusher thread
+        if self._stopped.is_set():
+            return
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='tool-usage-sink', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Unexpected error in tool usage sink: {str(e)}", exc_info=True)
+
+def init_usage_sink(app, mongo):
+    """Create the buffered tool usage sink from app config and environment."""
+    app.config.setdefault('TOOL_USAGE_BATCH_SIZE', int(os.environ.get('TOOL_USAGE_BATCH_SIZE', 100)))
+    app.config.setdefault('TOOL_USAGE_FLUSH_INTERVAL', float(os.environ.get('TOOL_USAGE_FLUSH_INTERVAL', 5)))
+    app.config.setdefault('TOOL_USAGE_MAX_QUEUE', int(os.environ.get('TOOL_USAGE_MAX_QUEUE', 10000)))
+    app.config.setdefault('TOOL_USAGE_WRITE_CONCERN', os.environ.get('TOOL_USAGE_WRITE_CONCERN', '1'))
+    collection = mongo.db.tool_usage.with_options(
+        write_concern=parse_write_concern(app.config['TOOL_USAGE_WRITE_CONCERN'])
+    )
+    sink = ToolUsageSink(
+        collection,
+        batch_size=app.config['TOOL_USAGE_BATCH_SIZE'],
+        flush_interval=app.config['TOOL_USAGE_FLUSH_INTERVAL'],
+        max_queue=app.config['TOOL_USAGE_MAX_QUEUE']
+    )
+    app.config['TOOL_USAGE_SINK'] = sink
+    logger.info(f"Tool usage sink initialized: batch_size={sink.batch_size}, flush_interval={sink.flush_interval}s, write_concern={app.config['TOOL_USAGE_WRITE_CONCERN']}")
+    return sink
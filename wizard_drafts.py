@@ -0,0 +1,164 @@
+import os
+import uuid
+import logging
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from flask import session, g
+from flask_login import current_user
+from extensions import mongo
+
+# Set up logging
+logger = logging.getLogger('ficore_app')
+
+# Unfinished wizard drafts are removed by the TTL index on expires_at
+WIZARD_DRAFT_TTL = timedelta(hours=int(os.environ.get('WIZARD_DRAFT_TTL_HOURS', 24)))
+
+# Session key holding the draft id of each tool, e.g. {'budget': '<uuid>'}
+DRAFTS_SESSION_KEY = 'wizard_drafts'
+
+# Fields kept for each wizard step; everything else in form.data (csrf_token,
+# submit, back buttons) is dropped before the step is stored. The financial
+# health wizard writes its steps straight into its assessment document instead.
+WIZARD_FIELDS = {
+    'budget': {
+        'step1': ('first_name', 'email', 'send_email'),
+        'step2': ('income',),
+        'step3': ('housing', 'food', 'transport', 'dependents', 'miscellaneous', 'others'),
+        'step4': ('savings_goal',)
+    },
+    'bill': {
+        'step1': ('first_name', 'email', 'bill_name', 'amount', 'due_date'),
+        'step2': ('frequency', 'category', 'status', 'send_email', 'reminder_days'),
+        'edit': ('bill_id',)
+    },
+    'net_worth': {
+        'step1': ('first_name', 'email', 'send_email'),
+        'step2': ('cash_savings', 'investments', 'property'),
+        'step3': ('loans',)
+    },
+    'emergency_fund': {
+        'step1': ('first_name', 'email', 'email_opt_in'),
+        'step2': ('monthly_expenses', 'monthly_income'),
+        'step3': ('current_savings', 'risk_tolerance_level', 'dependents')
+    },
+    'quiz': {
+        'step1': ('first_name', 'email', 'lang', 'send_email'),
+        'step2a': tuple(f'question_{i}' for i in range(1, 6)),
+        'step2b': tuple(f'question_{i}' for i in range(6, 11))
+    }
+}
+
+def draft_owner():
+    """Owner key of drafts: the signed-in user, otherwise the session id."""
+    if current_user.is_authenticated:
+        return f"user:{current_user.id}"
+    return f"sid:{session.get('sid')}"
+
+def compact_value(value):
+    """Convert form values to types that store compactly in BSON."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def compact_step(tool, step, data):
+    """Keep only the whitelisted fields of a step."""
+    fields = WIZARD_FIELDS[tool][step]
+    return {field: compact_value(data[field]) for field in fields if field in data}
+
+def _cache():
+    if 'wizard_drafts' not in g:
+        g.wizard_drafts = {}
+    return g.wizard_drafts
+
+def load_draft(tool):
+    """Return the current draft document for a tool, or None. Cached per request."""
+    cache = _cache()
+    if tool in cache:
+        return cache[tool]
+    draft = None
+    draft_id = session.get(DRAFTS_SESSION_KEY, {}).get(tool)
+    if draft_id:
+        try:
+            draft = mongo.db.wizard_drafts.find_one({'_id': draft_id, 'tool': tool})
+        except Exception as e:
+            logger.error(f"Failed to load {tool} wizard draft {draft_id}: {str(e)}")
+    cache[tool] = draft
+    return draft
+
+def get_step(tool, step):
+    """Return a copy of the stored data for one step, or an empty dict."""
+    draft = load_draft(tool)
+    return dict((draft or {}).get('steps', {}).get(step) or {})
+
+def has_steps(tool, *steps):
+    """True when every given step has been stored in the draft."""
+    stored = (load_draft(tool) or {}).get('steps', {})
+    return all(step in stored for step in steps)
+
+def save_step(tool, step, data):
+    """
+    Store one wizard step in the tool's draft, creating the draft if needed.
+
+    Args:
+        tool (str): Tool name, a key of WIZARD_FIELDS
+        step (str): Step name, e.g. 'step1'
+        data (dict): Step data; fields outside the whitelist are dropped
+
+    Returns:
+        dict: The compacted step data
+    """
+    return save_steps(tool, {step: data})[step]
+
+def save_steps(tool, steps):
+    """Store several steps of a tool's draft in a single write."""
+    for step in steps:
+        if tool not in WIZARD_FIELDS or step not in WIZARD_FIELDS[tool]:
+            raise ValueError(f"Unknown wizard step: {tool}.{step}")
+    compact = {step: compact_step(tool, step, data) for step, data in steps.items()}
+    drafts = dict(session.get(DRAFTS_SESSION_KEY, {}))
+    draft_id = drafts.get(tool)
+    if not draft_id:
+        draft_id = str(uuid.uuid4())
+        drafts[tool] = draft_id
+        session[DRAFTS_SESSION_KEY] = drafts
+    now = datetime.utcnow()
+    try:
+        mongo.db.wizard_drafts.update_one(
+            {'_id': draft_id},
+            {
+                '$set': {
+                    **{f'steps.{step}': data for step, data in compact.items()},
+                    'tool': tool,
+                    'owner': draft_owner(),
+                    'updated_at': now,
+                    'expires_at': now + WIZARD_DRAFT_TTL
+                },
+                '$setOnInsert': {'created_at': now}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Failed to save {tool} wizard steps {list(compact)} to draft {draft_id}: {str(e)}")
+        raise
+    draft = _cache().get(tool) or {'_id': draft_id, 'tool': tool, 'steps': {}}
+    draft.setdefault('steps', {}).update(compact)
+    _cache()[tool] = draft
+    return compact
+
+def clear_draft(tool):
+    """Delete the tool's draft and forget its id in the session."""
+    drafts = dict(session.get(DRAFTS_SESSION_KEY, {}))
+    draft_id = drafts.pop(tool, None)
+    _cache()[tool] = None
+    if not draft_id:
+        return
+    if drafts:
+        session[DRAFTS_SESSION_KEY] = drafts
+    else:
+        session.pop(DRAFTS_SESSION_KEY, None)
+    try:
+        mongo.db.wizard_drafts.delete_one({'_id': draft_id})
+    except Exception as e:
+        logger.warning(f"Failed to delete {tool} wizard draft {draft_id}, it will expire: {str(e)}")